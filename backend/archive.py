@@ -0,0 +1,241 @@
+"""
+冷热分层：完成时间早于 ARCHIVE_AFTER_YEARS 年前 1 月 1 日的已完成记录，由后台任务分批从 items 移入 items_archive，
+热表只保留待办和近几年的记录，待办、当年/去年的列表与统计只扫热表。默认不归档（ARCHIVE_AFTER_YEARS=0）。
+
+对接口透明：
+- 读：tiers() 返回需要查询的层，总是先查热表 Item；该用户有归档记录、且（按年份查询时）年份不晚于其最晚归档年份时
+  再查 ArchivedItem。每层各执行一条走本表索引的查询，由 fetch() 在 Python 中合并、分页，不经过 UNION 视图
+  （MySQL 会把视图物化成不走索引的临时表）。SQLite 全文索引只覆盖热表，归档层的搜索用 LIKE。
+- 写：修改、删除、加图前用 hot_item() 取记录；记录在归档表时先在同一事务内移回热表，之后后台任务会按规则再次归档。
+- 移动前后 id、updated_at 不变，增量同步不会把搬迁当作修改；图片行（item_images）始终留在原表，
+  所以 item_images.item_id 不能对 items 建外键（迁移 0005 已去掉），由 ORM 级联删除图片，`--check` 检查孤儿图片行。
+- 新记录的 id 由 models.next_item_id 从 id_sequences 单调分配，热表的记录被归档或删除后 id 也不会被重新使用。
+
+用法（在 backend/ 下）：
+    python archive.py                 # 立即归档全部到期记录
+    python archive.py --restore-all   # 把归档记录全部移回热表（停用分层前执行）
+    python archive.py --check         # 统计所属记录在两张表中都不存在的图片行
+"""
+import argparse
+import asyncio
+import logging
+import os
+import sys
+from datetime import datetime
+from typing import Optional
+
+from sqlalchemy import delete, exists, func, insert, literal, select
+
+from models import ArchivedItem, Item, ItemImage
+
+logger = logging.getLogger("uvicorn.error")
+
+# 完成时间早于 (今年 - N) 年 1 月 1 日的记录归档；按整年划分，归档表不会含有近 N 年的记录。0 表示不归档
+ARCHIVE_AFTER_YEARS = int(os.environ.get("ARCHIVE_AFTER_YEARS", 0))
+# 每批移动的记录数，每批一个事务
+ARCHIVE_BATCH_SIZE = int(os.environ.get("ARCHIVE_BATCH_SIZE", 500))
+# 批次之间的休眠，避免后台搬迁占满数据库
+ARCHIVE_BATCH_SLEEP = float(os.environ.get("ARCHIVE_BATCH_SLEEP", 0.5))
+# 后台搬迁间隔（秒），0 表示不在 API 进程内启动
+ARCHIVE_INTERVAL_SECONDS = int(os.environ.get("ARCHIVE_INTERVAL_SECONDS", 86400))
+
+_HOT = Item.__table__
+_COLD = ArchivedItem.__table__
+# 两张表共有的列（不含 items 的生成列）
+COLUMNS = [c.name for c in _HOT.columns if c.computed is None]
+
+
+def cutoff(now: Optional[datetime] = None) -> Optional[datetime]:
+    """归档分界：完成时间早于该时间的已完成记录归档；未启用时返回 None"""
+    if ARCHIVE_AFTER_YEARS <= 0:
+        return None
+    now = now or datetime.utcnow()
+    return datetime(now.year - ARCHIVE_AFTER_YEARS, 1, 1)
+
+
+def tiers(db, user_id: str, year: Optional[int] = None) -> list:
+    """读查询要查的层：[Item] 或 [Item, ArchivedItem]（判断走 (user_id, finish_time) 索引）"""
+    newest = (
+        db.query(func.max(ArchivedItem.finish_time))
+        .filter(ArchivedItem.user_id == user_id)
+        .scalar()
+    )
+    if newest is None or (year is not None and year > newest.year):
+        return [Item]
+    return [Item, ArchivedItem]
+
+
+def _sort_key(value, item_id):
+    # 与数据库一致：NULL 在升序最前、降序最后；排序值相同时按 id
+    return (value is not None, value if value is not None else 0, item_id)
+
+
+def fetch(db, models: list, where, order, *, desc: bool = True, options=None,
+          limit: Optional[int] = None, offset: int = 0) -> list:
+    """在每一层分别查询后按 order 合并，返回 ORM 对象列表。
+    where(M) 返回该层的过滤条件列表，order(M) 返回排序列，options(M) 返回加载选项。
+    分页时每层只取前 offset + limit 行的 (排序值, id)，合并出本页后再按 id 取整行"""
+    options = options or (lambda M: ())
+
+    def query(M, *cols):
+        col = order(M)
+        return db.query(*cols).filter(*where(M)).order_by(col.desc() if desc else col.asc())
+
+    if len(models) == 1:
+        M = models[0]
+        q = query(M, M).options(*options(M))
+        if limit is not None:
+            q = q.offset(offset).limit(limit)
+        return q.all()
+    if limit is None:
+        rows = [r for M in models for r in query(M, M).options(*options(M)).all()]
+        rows.sort(key=lambda r: _sort_key(getattr(r, order(type(r)).key), r.id), reverse=desc)
+        return rows
+    keys = []
+    for M in models:
+        keys += [(v, i, M) for v, i in query(M, order(M), M.id).limit(offset + limit).all()]
+    keys.sort(key=lambda k: _sort_key(k[0], k[1]), reverse=desc)
+    keys = keys[offset:offset + limit]
+    found = {}
+    for M in models:
+        ids = [i for _, i, m in keys if m is M]
+        if ids:
+            found.update(((M, r.id), r) for r in db.query(M).options(*options(M)).filter(M.id.in_(ids)).all())
+    return [found[(M, i)] for _, i, M in keys if (M, i) in found]
+
+
+def get(db, item_id: int, user_id: str, options=None):
+    """按 id 取一条记录用于读取：先查热表，没有再查归档表（都是主键查找）"""
+    options = options or (lambda M: ())
+    for M in (Item, ArchivedItem):
+        item = db.query(M).options(*options(M)).filter(M.id == item_id, M.user_id == user_id).first()
+        if item is not None:
+            return item
+    return None
+
+
+def orphan_images(db) -> int:
+    """所属记录在 items 和 items_archive 中都不存在的图片行数（代替外键的一致性检查）"""
+    return db.query(func.count(ItemImage.id)).filter(
+        ~exists().where(_HOT.c.id == ItemImage.item_id),
+        ~exists().where(_COLD.c.id == ItemImage.item_id),
+    ).scalar()
+
+
+def _move(db, src, dst, where, **extra) -> int:
+    """把 src 中满足 where 的行复制到 dst 再删除（调用方提交事务），返回行数"""
+    cols = [src.c[name] for name in COLUMNS]
+    cols += [literal(v).label(k) for k, v in extra.items()]
+    db.execute(insert(dst).from_select(COLUMNS + list(extra), select(*cols).where(*where)))
+    return db.execute(delete(src).where(*where)).rowcount
+
+
+class ArchiveConflict(RuntimeError):
+    """归档记录的 id 在热表中已被占用，不能移回"""
+
+
+def restore(db, item_id: int, user_id: str) -> bool:
+    """把一条归档记录移回热表（不提交），返回是否移动；热表已有同 id 的记录时抛 ArchiveConflict，不做合并"""
+    where = [_COLD.c.id == item_id, _COLD.c.user_id == user_id]
+    if db.execute(select(_COLD.c.id).where(*where)).first() is None:
+        return False
+    if db.execute(select(_HOT.c.id).where(_HOT.c.id == item_id)).first() is not None:
+        logger.error("archive: items_archive id=%s conflicts with an existing row in items", item_id)
+        raise ArchiveConflict(f"记录 id={item_id} 同时存在于 items 和 items_archive")
+    return _move(db, _COLD, _HOT, where) > 0
+
+
+def hot_item(db, item_id: int, user_id: str) -> Optional[Item]:
+    """取热表中的记录用于修改；记录已归档时先移回热表"""
+    q = db.query(Item).filter(Item.id == item_id, Item.user_id == user_id)
+    item = q.first()
+    if item is None and restore(db, item_id, user_id):
+        item = q.first()
+    return item
+
+
+def archive_batch(batch_size: int = ARCHIVE_BATCH_SIZE) -> int:
+    """归档一批到期记录，返回移动的行数"""
+    from database import SessionLocal
+
+    cut = cutoff()
+    if cut is None:
+        return 0
+    db = SessionLocal()
+    try:
+        ids = db.execute(
+            select(_HOT.c.id)
+            .where(_HOT.c.is_completed == True, _HOT.c.finish_time < cut)
+            .limit(batch_size)
+        ).scalars().all()
+        if not ids:
+            return 0
+        moved = _move(db, _HOT, _COLD, [_HOT.c.id.in_(ids)], archived_at=datetime.utcnow())
+        db.commit()
+        return moved
+    finally:
+        db.close()
+
+
+def restore_batch(batch_size: int = ARCHIVE_BATCH_SIZE) -> int:
+    """把一批归档记录移回热表，返回移动的行数"""
+    from database import SessionLocal
+
+    db = SessionLocal()
+    try:
+        ids = db.execute(select(_COLD.c.id).limit(batch_size)).scalars().all()
+        if not ids:
+            return 0
+        moved = _move(db, _COLD, _HOT, [_COLD.c.id.in_(ids)])
+        db.commit()
+        return moved
+    finally:
+        db.close()
+
+
+async def archive_loop():
+    """API 进程内的后台搬迁：启动后先等一个间隔，每轮分批移动直到没有到期记录"""
+    while True:
+        await asyncio.sleep(ARCHIVE_INTERVAL_SECONDS)
+        try:
+            total = 0
+            while True:
+                moved = await asyncio.to_thread(archive_batch)
+                total += moved
+                if moved < ARCHIVE_BATCH_SIZE:
+                    break
+                await asyncio.sleep(ARCHIVE_BATCH_SLEEP)
+            if total:
+                logger.info("archive: moved %d items to items_archive", total)
+        except Exception as e:
+            # 多个 worker 同时搬迁同一批时后提交的会主键冲突，下一轮再继续
+            logger.warning("archive background run failed: %s", e)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="把到期的已完成记录移入归档表")
+    parser.add_argument("--restore-all", action="store_true", help="把归档记录全部移回热表")
+    parser.add_argument("--check", action="store_true", help="统计孤儿图片行（所属记录在两张表中都不存在）")
+    args = parser.parse_args()
+    if args.check:
+        from database import SessionLocal
+
+        db = SessionLocal()
+        try:
+            n = orphan_images(db)
+        finally:
+            db.close()
+        print(f"孤儿图片行 {n} 条")
+        sys.exit(1 if n else 0)
+    step = restore_batch if args.restore_all else archive_batch
+    total = 0
+    while True:
+        moved = step()
+        total += moved
+        if moved < ARCHIVE_BATCH_SIZE:
+            break
+    print(f"{'移回热表' if args.restore_all else '归档'} {total} 条记录")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,391 @@
+"""
+增量快照备份：每次备份在 BACKUP_DIR 下生成一个完整可恢复的快照目录，未变化的部分硬链接到上一个快照，
+耗时和占用空间与变化量成正比。
+
+快照内容：
+- uploads/：UPLOAD_DIR 中的原图。大小和修改时间与上一快照相同的文件直接硬链接，只复制新文件；
+  派生数据（.webp_cache、.cover_cache 等以 . 开头的目录）不备份，恢复后按需重新生成。
+- db/<表名>/<起始 id>.jsonl.gz：按 id 每 BACKUP_CHUNK_ROWS 行一个分块导出。每块的指纹为
+  (行数, id 之和, 最大 updated_at)，加上 CONTENT_COLUMNS 中各列的长度之和（这些列修改时不更新 updated_at），
+  与上一快照相同且最大 updated_at 早于其水位线的分块直接硬链接，
+  只重新导出有增删改的分块。year_snapshots（年度回顾快照）、id_sequences 和 SQLite 全文索引不备份，恢复后重建。
+- manifest.json：各文件的 sha256、分块指纹和本次的水位线，最后写入；没有 manifest 的目录视为未完成。
+
+一致性：数据库在一个一致性快照事务中导出（MySQL START TRANSACTION WITH CONSISTENT SNAPSHOT，SQLite 读事务）；
+上传目录在导出前后各扫描一次，导出期间新上传的图片也会包含在内。
+
+用法（在 backend/ 下）：
+    python backup.py create --dest /backups/logfolio         # 也可用 BACKUP_DIR 环境变量
+    python backup.py list
+    python backup.py verify 20261019T030000Z                 # 并行校验全部文件的 sha256
+    python backup.py prune --keep 7
+    python backup.py restore 20261019T030000Z --target sqlite:///restore.db --upload-dir /srv/restore/uploads
+"""
+import argparse
+import base64
+import gzip
+import hashlib
+import json
+import os
+import shutil
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+
+from sqlalchemy import LargeBinary, DateTime, create_engine, func, literal, select
+
+from config import DATABASE_URL, UPLOAD_DIR
+from database import Base, _create_engine
+from models import ArchivedItem, Category, IdSequence, Item, ItemImage, Tombstone, YearSnapshot, sync_item_sequence  # noqa: F401
+
+BACKUP_DIR = os.environ.get("BACKUP_DIR", "")
+# 数据库导出分块的 id 跨度
+BACKUP_CHUNK_ROWS = int(os.environ.get("BACKUP_CHUNK_ROWS", 5000))
+# 复制 / 校验文件的并行线程数
+BACKUP_WORKERS = int(os.environ.get("BACKUP_WORKERS", 4))
+# prune 默认保留的快照数
+BACKUP_KEEP = int(os.environ.get("BACKUP_KEEP", 7))
+
+# 可重建的派生数据，不备份
+SKIP_TABLES = {"year_snapshots", "id_sequences"}
+# 分块指纹使用的版本列，默认 updated_at
+VERSION_COLUMNS = {"tombstones": "deleted_at"}
+# 修改时不更新版本列的列（如 uploads.backfill_placeholders 补占位图时保留 updated_at），指纹另加其长度之和
+CONTENT_COLUMNS = {"item_images": ("placeholder",)}
+# updated_at 为秒级精度（MySQL DATETIME），水位线往前留出的余量
+WATERMARK_OVERLAP = timedelta(seconds=2)
+
+MANIFEST = "manifest.json"
+
+
+def _sha256(path: str) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def _copy_hash(src: str, dst: str) -> str:
+    """复制文件并同时计算 sha256，只读一遍源文件"""
+    h = hashlib.sha256()
+    with open(src, "rb") as fi, open(dst, "wb") as fo:
+        for block in iter(lambda: fi.read(1 << 20), b""):
+            h.update(block)
+            fo.write(block)
+    shutil.copystat(src, dst)
+    return h.hexdigest()
+
+
+def _link_or_copy(src: str, dst: str):
+    try:
+        os.link(src, dst)
+    except OSError:
+        # 跨文件系统等无法硬链接时退回复制
+        shutil.copy2(src, dst)
+
+
+def snapshots(dest: str) -> list:
+    """已完成的快照名，按时间正序"""
+    if not os.path.isdir(dest):
+        return []
+    return sorted(n for n in os.listdir(dest) if os.path.isfile(os.path.join(dest, n, MANIFEST)))
+
+
+def load_manifest(snap_dir: str) -> dict:
+    with open(os.path.join(snap_dir, MANIFEST), encoding="utf-8") as f:
+        return json.load(f)
+
+
+# ---- 上传目录 ----
+
+def _scan_uploads() -> dict:
+    """{文件名: (大小, 修改时间 ns)}，跳过以 . 开头的派生数据目录和文件"""
+    out = {}
+    with os.scandir(UPLOAD_DIR) as it:
+        for e in it:
+            if e.name.startswith(".") or not e.is_file(follow_symlinks=False):
+                continue
+            st = e.stat()
+            out[e.name] = (st.st_size, st.st_mtime_ns)
+    return out
+
+
+def _backup_uploads(pool, files: dict, prev_dir, prev_files: dict, out_dir: str, result: dict) -> int:
+    """把 files 中尚未备份的文件放入 out_dir：未变化的硬链接上一快照，其余并行复制；返回复制的文件数"""
+    jobs = {}
+    for name, (size, mtime_ns) in files.items():
+        if name in result:
+            continue
+        prev = prev_files.get(name)
+        if prev and prev[0] == size and prev[1] == mtime_ns and os.path.isfile(os.path.join(prev_dir, "uploads", name)):
+            _link_or_copy(os.path.join(prev_dir, "uploads", name), os.path.join(out_dir, name))
+            result[name] = prev
+        else:
+            jobs[name] = (size, mtime_ns, pool.submit(_copy_hash, os.path.join(UPLOAD_DIR, name), os.path.join(out_dir, name)))
+    for name, (size, mtime_ns, fut) in jobs.items():
+        try:
+            result[name] = [size, mtime_ns, fut.result()]
+        except FileNotFoundError:
+            # 扫描后被删除
+            pass
+    return len(jobs)
+
+
+# ---- 数据库 ----
+
+@contextmanager
+def _snapshot_conn(engine):
+    """只读的一致性快照连接：期间所有查询看到同一时刻的数据"""
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        if conn.dialect.name == "mysql":
+            conn.exec_driver_sql("SET SESSION TRANSACTION ISOLATION LEVEL REPEATABLE READ")
+            conn.exec_driver_sql("START TRANSACTION WITH CONSISTENT SNAPSHOT, READ ONLY")
+        else:
+            conn.exec_driver_sql("BEGIN")
+        try:
+            yield conn
+        finally:
+            conn.exec_driver_sql("ROLLBACK")
+
+
+def _tables() -> list:
+    return [t for t in Base.metadata.sorted_tables if t.name not in SKIP_TABLES]
+
+
+def _encode(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, bytes):
+        return base64.b64encode(value).decode()
+    return value
+
+
+def _export_chunk(conn, table, cols, start: int, path: str) -> str:
+    stmt = (
+        select(*cols)
+        .where(table.c.id >= start, table.c.id < start + BACKUP_CHUNK_ROWS)
+        .order_by(table.c.id)
+    )
+    with gzip.open(path, "wt", encoding="utf-8") as f:
+        for row in conn.execute(stmt):
+            f.write(json.dumps({k: _encode(v) for k, v in row._mapping.items()}, ensure_ascii=False) + "\n")
+    return _sha256(path)
+
+
+def _backup_table(conn, table, prev_dir, prev: dict, prev_watermark, out_dir: str) -> tuple:
+    """导出一张表，返回 (manifest 条目, 重新导出的分块数)"""
+    cols = [c for c in table.columns if c.computed is None]
+    col_names = [c.name for c in cols]
+    version = table.c.get(VERSION_COLUMNS.get(table.name, "updated_at"))
+    start_expr = table.c.id - table.c.id % BACKUP_CHUNK_ROWS
+    content = [func.coalesce(func.sum(func.length(table.c[name])), 0) for name in CONTENT_COLUMNS.get(table.name, ())]
+    aggregates = select(
+        start_expr, func.count(), func.sum(table.c.id),
+        func.max(version) if version is not None else literal(None),
+        *content,
+    ).group_by(start_expr)
+    # 列有变化（如迁移新增列）时整表重新导出
+    reusable = prev.get("chunks", {}) if prev.get("columns") == col_names else {}
+    os.makedirs(os.path.join(out_dir, table.name), exist_ok=True)
+    chunks, exported = {}, 0
+    for start, count, id_sum, newest, *lengths in conn.execute(aggregates).all():
+        fp = [count, int(id_sum), newest.isoformat() if newest else None, *(int(n) for n in lengths)]
+        rel = f"{table.name}/{start:012d}.jsonl.gz"
+        path = os.path.join(out_dir, rel)
+        old = reusable.get(str(start))
+        if old and old["fp"] == fp and prev_watermark and (newest is None or newest < prev_watermark):
+            _link_or_copy(os.path.join(prev_dir, "db", old["file"]), path)
+            chunks[str(start)] = {"fp": fp, "file": rel, "sha256": old["sha256"]}
+        else:
+            chunks[str(start)] = {"fp": fp, "file": rel, "sha256": _export_chunk(conn, table, cols, start, path)}
+            exported += 1
+    return {"columns": col_names, "chunks": chunks}, exported
+
+
+# ---- 命令 ----
+
+def create(dest: str, source_url: str = DATABASE_URL, full: bool = False) -> str:
+    """创建一个快照，返回快照目录"""
+    previous = snapshots(dest)
+    prev_dir = os.path.join(dest, previous[-1]) if previous and not full else None
+    prev = load_manifest(prev_dir) if prev_dir else {}
+    prev_watermark = datetime.fromisoformat(prev["watermark"]) if prev.get("watermark") else None
+
+    name = datetime.utcnow().strftime("%Y%m%dT%H%M%SZ")
+    snap_dir = os.path.join(dest, name)
+    if os.path.exists(snap_dir):
+        sys.exit(f"快照已存在: {snap_dir}")
+    uploads_dir = os.path.join(snap_dir, "uploads")
+    db_dir = os.path.join(snap_dir, "db")
+    os.makedirs(uploads_dir)
+    os.makedirs(db_dir)
+    t0 = time.time()
+
+    engine = create_engine(source_url, pool_pre_ping=True)
+    uploads = {}
+    with ThreadPoolExecutor(max_workers=BACKUP_WORKERS) as pool:
+        copied = _backup_uploads(pool, _scan_uploads(), prev_dir, prev.get("uploads", {}), uploads_dir, uploads)
+        tables, exported = {}, 0
+        with _snapshot_conn(engine) as conn:
+            # 快照事务开始后的修改不在本次导出中，下次以此为水位线
+            watermark = datetime.utcnow() - WATERMARK_OVERLAP
+            for table in _tables():
+                tables[table.name], n = _backup_table(
+                    conn, table, prev_dir, prev.get("tables", {}).get(table.name, {}), prev_watermark, db_dir,
+                )
+                exported += n
+        # 导出期间新上传的图片
+        copied += _backup_uploads(pool, _scan_uploads(), prev_dir, prev.get("uploads", {}), uploads_dir, uploads)
+    engine.dispose()
+
+    manifest = {
+        "name": name,
+        "created_at": datetime.utcnow().isoformat(),
+        "watermark": watermark.isoformat(),
+        "base": os.path.basename(prev_dir) if prev_dir else None,
+        "tables": tables,
+        "uploads": uploads,
+    }
+    tmp = os.path.join(snap_dir, MANIFEST + ".tmp")
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False)
+    os.replace(tmp, os.path.join(snap_dir, MANIFEST))
+    chunks = sum(len(t["chunks"]) for t in tables.values())
+    print(
+        f"快照 {name}: 图片 {len(uploads)} 个（复制 {copied}），数据分块 {chunks} 个（导出 {exported}），"
+        f"用时 {time.time() - t0:.1f}s"
+    )
+    return snap_dir
+
+
+def verify(snap_dir: str) -> list:
+    """并行校验快照中全部文件的 sha256，返回有问题的文件"""
+    manifest = load_manifest(snap_dir)
+    expected = {os.path.join(snap_dir, "uploads", n): v[2] for n, v in manifest["uploads"].items()}
+    for t in manifest["tables"].values():
+        for chunk in t["chunks"].values():
+            expected[os.path.join(snap_dir, "db", chunk["file"])] = chunk["sha256"]
+
+    def check(path):
+        if not os.path.isfile(path):
+            return f"缺失: {path}"
+        return None if _sha256(path) == expected[path] else f"校验失败: {path}"
+
+    with ThreadPoolExecutor(max_workers=BACKUP_WORKERS) as pool:
+        return [p for p in pool.map(check, expected) if p]
+
+
+def _decode_row(table, row: dict) -> dict:
+    out = {}
+    for k, v in row.items():
+        col = table.c.get(k)
+        if col is None or col.computed is not None:
+            continue
+        if v is not None and isinstance(col.type, DateTime):
+            v = datetime.fromisoformat(v)
+        elif v is not None and isinstance(col.type, LargeBinary):
+            v = base64.b64decode(v)
+        out[k] = v
+    return out
+
+
+def restore(snap_dir: str, target_url: str, upload_dir: str, replace: bool = False, link: bool = False):
+    """把快照恢复到 target_url 和 upload_dir；派生图、年度回顾快照在访问时重新生成"""
+    import copy_db
+    import migrations
+
+    manifest = load_manifest(snap_dir)
+    t0 = time.time()
+    dst = _create_engine(target_url)
+    copy_db.prepare_target(dst, replace)
+    for table in _tables():
+        entry = manifest["tables"].get(table.name)
+        if not entry:
+            continue
+        n = 0
+        for start in sorted(entry["chunks"], key=int):
+            with gzip.open(os.path.join(snap_dir, "db", entry["chunks"][start]["file"]), "rt", encoding="utf-8") as f:
+                rows = [_decode_row(table, json.loads(line)) for line in f]
+            if rows:
+                with dst.begin() as conn:
+                    conn.execute(table.insert(), rows)
+                n += len(rows)
+        print(f"{table.name}: {n} 行")
+    # 记录迁移版本；SQLite 目标库在这里重建全文索引、创建视图
+    migrations.run(dst)
+    with dst.begin() as conn:
+        sync_item_sequence(conn)
+
+    os.makedirs(upload_dir, exist_ok=True)
+    place = _link_or_copy if link else shutil.copy2
+
+    def put(name):
+        src, out = os.path.join(snap_dir, "uploads", name), os.path.join(upload_dir, name)
+        if not os.path.exists(out):
+            place(src, out)
+
+    with ThreadPoolExecutor(max_workers=BACKUP_WORKERS) as pool:
+        list(pool.map(put, manifest["uploads"]))
+    print(f"恢复完成: 图片 {len(manifest['uploads'])} 个，用时 {time.time() - t0:.1f}s")
+
+
+def prune(dest: str, keep: int) -> list:
+    """只保留最近 keep 个快照；硬链接的文件在最后一个引用它的快照删除后才释放空间"""
+    old = snapshots(dest)[:-keep] if keep > 0 else []
+    for name in old:
+        shutil.rmtree(os.path.join(dest, name))
+    return old
+
+
+def main():
+    parser = argparse.ArgumentParser(description="数据库与上传目录的增量快照备份")
+    parser.add_argument("--dest", default=BACKUP_DIR, help="快照目录，默认 BACKUP_DIR 环境变量")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    p = sub.add_parser("create", help="创建快照")
+    p.add_argument("--source", default=DATABASE_URL, help="源库连接串（可指向只读副本），默认 config.DATABASE_URL")
+    p.add_argument("--full", action="store_true", help="不复用上一快照，全部重新复制")
+    p.add_argument("--verify", action="store_true", help="创建后校验")
+    sub.add_parser("list", help="列出快照")
+    p = sub.add_parser("verify", help="校验快照文件的 sha256")
+    p.add_argument("name")
+    p = sub.add_parser("prune", help="删除旧快照")
+    p.add_argument("--keep", type=int, default=BACKUP_KEEP)
+    p = sub.add_parser("restore", help="从快照恢复")
+    p.add_argument("name")
+    p.add_argument("--target", required=True, help="目标库连接串")
+    p.add_argument("--upload-dir", required=True, help="恢复图片的目录")
+    p.add_argument("--replace", action="store_true", help="目标库已有数据时先清空")
+    p.add_argument("--link", action="store_true", help="图片硬链接到快照而不是复制（需同一文件系统）")
+    args = parser.parse_args()
+
+    if not args.dest:
+        sys.exit("请用 --dest 或 BACKUP_DIR 指定快照目录")
+    if args.cmd == "create":
+        snap_dir = create(args.dest, args.source, args.full)
+        if args.verify:
+            bad = verify(snap_dir)
+            for line in bad:
+                print(line)
+            sys.exit(1 if bad else 0)
+    elif args.cmd == "list":
+        for name in snapshots(args.dest):
+            m = load_manifest(os.path.join(args.dest, name))
+            print(f"{name}  图片 {len(m['uploads'])}  基于 {m['base'] or '-'}")
+    elif args.cmd == "verify":
+        bad = verify(os.path.join(args.dest, args.name))
+        for line in bad:
+            print(line)
+        print("校验失败" if bad else "校验通过")
+        sys.exit(1 if bad else 0)
+    elif args.cmd == "prune":
+        for name in prune(args.dest, args.keep):
+            print(f"已删除快照 {name}")
+    elif args.cmd == "restore":
+        restore(os.path.join(args.dest, args.name), args.target, args.upload_dir, args.replace, args.link)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,310 @@
+"""
+本地 Bangumi 条目库：导入 Bangumi 公开数据包（bangumi/Archive 的 subject.jsonlines，或整个 zip），
+封面搜索和批量导入脚本可以先查本地，命中时不再请求 Bangumi / Jikan，未命中才走上游。
+
+存储为独立的 SQLite 文件（BANGUMI_CATALOG_PATH），与业务库无关，可直接拷贝到其它机器。
+检索用 FTS5：中文/日文按字二元组（bigram）切分，拉丁字母按单词切分，标题、中文名、日文原名和别名都建索引；
+单个汉字的查询退回到 LIKE。
+
+导入逐行流式读取，按批写入，内存占用与数据包大小无关；每条记录保存内容摘要，
+重复导入新版数据包时只写入有变化的条目（增量刷新），加 --prune 可删除新数据包中已不存在的条目。
+
+用法（在 backend/ 下）：
+    python bangumi_catalog.py ingest bangumi-archive.zip        # 或 subject.jsonlines
+    python bangumi_catalog.py search 进击的巨人
+    python bangumi_catalog.py stats
+"""
+import argparse
+import hashlib
+import io
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+import zipfile
+from typing import Iterator, Optional
+
+from titles import title_key
+
+BANGUMI_CATALOG_PATH = os.environ.get(
+    "BANGUMI_CATALOG_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "bangumi_catalog.db")
+)
+# 默认只导入书籍（漫画）、动画、游戏
+DEFAULT_TYPES = (1, 2, 4)
+TYPE_LABELS = {1: "漫画", 2: "动漫", 4: "游戏"}
+BATCH_SIZE = 2000
+
+# 封面地址：Bangumi API 的条目图片接口会重定向到 lain.bgm.tv，数据包里没有封面 URL
+COVER_URL = "https://api.bgm.tv/v0/subjects/{id}/image?type=large"
+
+_CJK_RE = re.compile(r"[぀-ヿ㐀-䶿一-鿿가-힯豈-﫿]+")
+_WORD_RE = re.compile(r"[0-9a-z]+")
+_ALIAS_RE = re.compile(r"\|别名\s*=\s*\{(.*?)\}", re.S)
+_ALIAS_ITEM_RE = re.compile(r"\[(?:[^|\]]*\|)?([^\]]+)\]")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS subjects (
+    id INTEGER PRIMARY KEY,
+    type INTEGER NOT NULL,
+    name TEXT NOT NULL,
+    name_cn TEXT NOT NULL,
+    aliases TEXT NOT NULL,
+    date TEXT,
+    score REAL,
+    rank INTEGER,
+    nsfw INTEGER NOT NULL DEFAULT 0,
+    digest TEXT NOT NULL,
+    seen_at INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS ix_subjects_seen ON subjects (seen_at);
+CREATE VIRTUAL TABLE IF NOT EXISTS subjects_fts USING fts5(terms, tokenize = 'unicode61');
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+"""
+
+_local = threading.local()
+
+
+def _normalize(text: str) -> str:
+    return unicodedata.normalize("NFKC", text or "").lower()
+
+
+def tokenize(text: str) -> list:
+    """把文本切成检索词：CJK 连续片段取相邻二字，拉丁字母/数字取整词"""
+    text = _normalize(text)
+    terms = []
+    for run in _CJK_RE.findall(text):
+        if len(run) == 1:
+            terms.append(run)
+        else:
+            terms.extend(run[i:i + 2] for i in range(len(run) - 1))
+    terms.extend(_WORD_RE.findall(_CJK_RE.sub(" ", text)))
+    return terms
+
+
+def _aliases(infobox: str) -> list:
+    m = _ALIAS_RE.search(infobox or "")
+    if not m:
+        return []
+    return [a.strip() for a in _ALIAS_ITEM_RE.findall(m.group(1)) if a.strip()]
+
+
+def connect(path: str = None, readonly: bool = False) -> sqlite3.Connection:
+    path = path or BANGUMI_CATALOG_PATH
+    if readonly:
+        conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True, check_same_thread=False)
+    else:
+        conn = sqlite3.connect(path)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.executescript(SCHEMA)
+    return conn
+
+
+def available() -> bool:
+    """本地条目库文件是否存在"""
+    return os.path.isfile(BANGUMI_CATALOG_PATH)
+
+
+def _reader() -> Optional[sqlite3.Connection]:
+    """当前线程的只读连接；文件不存在时返回 None"""
+    conn = getattr(_local, "conn", None)
+    if conn is None:
+        if not available():
+            return None
+        conn = _local.conn = connect(readonly=True)
+    return conn
+
+
+def _iter_dump(path: str) -> Iterator[dict]:
+    """逐行读取数据包（.jsonlines 或包含 subject.jsonlines 的 zip）"""
+    if path.endswith(".zip"):
+        with zipfile.ZipFile(path) as zf:
+            member = next((n for n in zf.namelist() if n.endswith("subject.jsonlines")), None)
+            if member is None:
+                raise SystemExit(f"zip 中没有 subject.jsonlines: {path}")
+            with zf.open(member) as raw:
+                for line in io.TextIOWrapper(raw, encoding="utf-8"):
+                    if line.strip():
+                        yield json.loads(line)
+        return
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+
+def _row(s: dict, seen_at: int) -> tuple:
+    name = (s.get("name") or "").strip()
+    name_cn = (s.get("name_cn") or "").strip()
+    aliases = "\n".join(_aliases(s.get("infobox")))
+    values = (
+        int(s["id"]), int(s.get("type") or 0), name, name_cn, aliases,
+        s.get("date") or None, s.get("score") or None, s.get("rank") or None, 1 if s.get("nsfw") else 0,
+    )
+    digest = hashlib.sha1(repr(values).encode("utf-8")).hexdigest()[:16]
+    return values + (digest, seen_at)
+
+
+def _flush(conn: sqlite3.Connection, batch: list) -> int:
+    """写入一批条目，只处理新增或摘要变化的，返回写入条数"""
+    ids = [r[0] for r in batch]
+    marks = ",".join("?" * len(ids))
+    known = dict(conn.execute(f"SELECT id, digest FROM subjects WHERE id IN ({marks})", ids).fetchall())
+    changed = [r for r in batch if known.get(r[0]) != r[9]]
+    conn.execute(f"UPDATE subjects SET seen_at = ? WHERE id IN ({marks})", [batch[0][10]] + ids)
+    if changed:
+        conn.executemany(
+            "INSERT INTO subjects (id, type, name, name_cn, aliases, date, score, rank, nsfw, digest, seen_at) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?) "
+            "ON CONFLICT(id) DO UPDATE SET type=excluded.type, name=excluded.name, name_cn=excluded.name_cn, "
+            "aliases=excluded.aliases, date=excluded.date, score=excluded.score, rank=excluded.rank, "
+            "nsfw=excluded.nsfw, digest=excluded.digest, seen_at=excluded.seen_at",
+            changed,
+        )
+        conn.executemany("DELETE FROM subjects_fts WHERE rowid = ?", [(r[0],) for r in changed])
+        conn.executemany(
+            "INSERT INTO subjects_fts (rowid, terms) VALUES (?, ?)",
+            [(r[0], " ".join(tokenize(" ".join((r[2], r[3], r[4]))))) for r in changed],
+        )
+    conn.commit()
+    return len(changed)
+
+
+def ingest(dump_path: str, types=DEFAULT_TYPES, prune: bool = False, path: str = None) -> dict:
+    """导入数据包，返回统计 {read, written, pruned, elapsed}"""
+    started = time.time()
+    seen_at = int(started)
+    conn = connect(path)
+    read = written = 0
+    batch = []
+    try:
+        for s in _iter_dump(dump_path):
+            if types and s.get("type") not in types:
+                continue
+            batch.append(_row(s, seen_at))
+            read += 1
+            if len(batch) >= BATCH_SIZE:
+                written += _flush(conn, batch)
+                batch = []
+        if batch:
+            written += _flush(conn, batch)
+        pruned = 0
+        if prune:
+            stale = [r[0] for r in conn.execute("SELECT id FROM subjects WHERE seen_at < ?", (seen_at,))]
+            for i in range(0, len(stale), BATCH_SIZE):
+                chunk = [(sid,) for sid in stale[i:i + BATCH_SIZE]]
+                conn.executemany("DELETE FROM subjects WHERE id = ?", chunk)
+                conn.executemany("DELETE FROM subjects_fts WHERE rowid = ?", chunk)
+            conn.commit()
+            pruned = len(stale)
+        conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('ingested_at', ?)", (str(seen_at),))
+        conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('source', ?)", (os.path.basename(dump_path),))
+        conn.commit()
+        conn.execute("INSERT INTO subjects_fts (subjects_fts) VALUES ('optimize')")
+        conn.commit()
+    finally:
+        conn.close()
+    return {"read": read, "written": written, "pruned": pruned, "elapsed": round(time.time() - started, 1)}
+
+
+def _to_item(row) -> dict:
+    sid, stype, name, name_cn = row[:4]
+    return {
+        "type": TYPE_LABELS.get(stype, "动漫"),
+        "title": name_cn or name,
+        "title_japanese": name if not name_cn else "",
+        "url": COVER_URL.format(id=sid),
+        "subject_id": sid,
+    }
+
+
+def search(q: str, types=DEFAULT_TYPES, limit: int = 24, offset: int = 0, include_nsfw: bool = False) -> list:
+    """按标题/中文名/日文名/别名检索，返回与封面搜索相同格式的条目；条目库不存在时返回空列表"""
+    conn = _reader()
+    if conn is None:
+        return []
+    terms = tokenize(q)
+    if not terms:
+        return []
+    type_marks = ",".join("?" * len(types))
+    nsfw = "" if include_nsfw else " AND s.nsfw = 0"
+    norm = _normalize(q).strip()
+    if len(terms) == 1 and len(terms[0]) == 1:
+        # 单个汉字无法用二元组检索，退回 LIKE
+        like = f"%{terms[0]}%"
+        rows = conn.execute(
+            "SELECT s.id, s.type, s.name, s.name_cn FROM subjects s "
+            f"WHERE (s.name_cn LIKE ? OR s.name LIKE ?) AND s.type IN ({type_marks}){nsfw} "
+            "ORDER BY s.rank IS NULL, s.rank LIMIT ? OFFSET ?",
+            [like, like, *types, limit, offset],
+        ).fetchall()
+        return [_to_item(r) for r in rows]
+    match = " AND ".join('"' + t.replace('"', '""') + '"' for t in dict.fromkeys(terms))
+    rows = conn.execute(
+        "SELECT s.id, s.type, s.name, s.name_cn FROM subjects_fts f JOIN subjects s ON s.id = f.rowid "
+        f"WHERE subjects_fts MATCH ? AND s.type IN ({type_marks}){nsfw} "
+        # 完全同名优先，其次相关度，再按 Bangumi 排名
+        "ORDER BY (lower(s.name_cn) = ? OR lower(s.name) = ?) DESC, bm25(subjects_fts), s.rank IS NULL, s.rank "
+        "LIMIT ? OFFSET ?",
+        [match, *types, norm, norm, limit, offset],
+    ).fetchall()
+    return [_to_item(r) for r in rows]
+
+
+def match(title: str, types=DEFAULT_TYPES, candidates: int = 20) -> Optional[dict]:
+    """无人确认的自动选择（批量导入）用：在 search 的前 candidates 个结果中，取第一个中文名、原名或别名与 title
+    归一化后（titles.title_key）相同的条目；没有同名条目时返回 None。二元组检索只要求包含全部检索词，排在前面的不一定是同一部作品"""
+    key = title_key(title)
+    if not key:
+        return None
+    for item in search(title, types, limit=candidates):
+        row = _reader().execute(
+            "SELECT name, name_cn, aliases FROM subjects WHERE id = ?", (item["subject_id"],)
+        ).fetchone()
+        if row and key in {title_key(n) for n in (row[0], row[1], *row[2].split("\n"))}:
+            return item
+    return None
+
+
+def stats(path: str = None) -> dict:
+    conn = connect(path)
+    try:
+        total = conn.execute("SELECT COUNT(*) FROM subjects").fetchone()[0]
+        by_type = dict(conn.execute("SELECT type, COUNT(*) FROM subjects GROUP BY type").fetchall())
+        meta = dict(conn.execute("SELECT key, value FROM meta").fetchall())
+    finally:
+        conn.close()
+    return {"subjects": total, "by_type": by_type, **meta}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="本地 Bangumi 条目库（导入公开数据包、离线检索）")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    p_ingest = sub.add_parser("ingest", help="导入 / 增量刷新数据包")
+    p_ingest.add_argument("dump", help="bangumi/Archive 的 zip 或 subject.jsonlines")
+    p_ingest.add_argument("--types", default=",".join(map(str, DEFAULT_TYPES)), help="导入的条目类型，默认 1,2,4（书籍/动画/游戏）")
+    p_ingest.add_argument("--prune", action="store_true", help="删除新数据包中已不存在的条目")
+    p_search = sub.add_parser("search", help="检索")
+    p_search.add_argument("q")
+    p_search.add_argument("--limit", type=int, default=10)
+    sub.add_parser("stats", help="条目统计")
+    args = parser.parse_args()
+
+    if args.cmd == "ingest":
+        types = tuple(int(t) for t in args.types.split(",") if t.strip())
+        r = ingest(args.dump, types=types, prune=args.prune)
+        print(f"读取 {r['read']} 条，写入 {r['written']} 条，删除 {r['pruned']} 条，耗时 {r['elapsed']}s")
+    elif args.cmd == "search":
+        t0 = time.perf_counter()
+        results = search(args.q, limit=args.limit)
+        for item in results:
+            print(f"{item['subject_id']:>8}  [{item['type']}] {item['title']}  {item['title_japanese']}")
+        print(f"{len(results)} 条，{(time.perf_counter() - t0) * 1000:.1f}ms")
+    else:
+        print(json.dumps(stats(), ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1 @@
+# Benchmark / load-testing tools
@@ -0,0 +1,179 @@
+"""
+图片引擎对比：对同一批原图分别用 Pillow / libvips 生成派生图，输出每种转换的耗时（p50/p95、张/秒）和峰值内存。
+
+每个（引擎, 转换, 图片）在单独的子进程中执行：先转换一次，用该次之后的 ru_maxrss 减去引擎加载后的基线作为
+单次转换的峰值内存增量；再在同一进程中重复 --repeat 次计时。未安装 pyvips 的环境只测 Pillow。
+
+不指定 --corpus 时生成一批手机原图尺寸（4032×3024）的 JPEG / PNG（装了 pillow-heif 时还有 HEIC）。
+
+用法（在 backend/ 下）：
+    python -m bench.image_engine                              # 合成图片，测全部可用引擎
+    python -m bench.image_engine --corpus ~/photos -r 5       # 用真实照片目录
+    python -m bench.image_engine -e vips -o webp320,placeholder --json /tmp/vips.json
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import resource
+import statistics
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+CORPUS_SUFFIXES = (".jpg", ".jpeg", ".png", ".heic", ".heif", ".webp")
+
+# 转换名 -> (方法, 宽度, 格式)；与 serve_webp / 占位图 / 入库缩小的实际调用一致
+OPS = {
+    "webp320": ("render_variant", 320, "webp"),
+    "webp960": ("render_variant", 960, "webp"),
+    "jpeg640": ("render_variant", 640, "jpeg"),
+    "avif320": ("render_variant", 320, "avif"),
+    "placeholder": ("render_placeholder", None, None),
+}
+DEFAULT_OPS = "webp320,webp960,jpeg640,placeholder"
+
+
+def _maxrss_mb() -> float:
+    # Linux 上 ru_maxrss 单位为 KB
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def _convert(engine_name: str, op: str, path: str, repeat: int):
+    """子进程中执行：返回 (耗时列表 ms, 峰值 RSS MB, 峰值增量 MB, 输出字节数)；引擎不可用时返回 None"""
+    import imaging
+
+    engine = imaging.load_engine(engine_name)
+    if engine.name != engine_name:
+        return None
+    method, width, fmt = OPS[op]
+    fn = getattr(engine, method)
+    args = (path,) if width is None and fmt is None else (path, width, fmt)
+    baseline = _maxrss_mb()
+    t0 = time.perf_counter()
+    out = fn(*args)
+    times = [(time.perf_counter() - t0) * 1000]
+    peak = _maxrss_mb()
+    for _ in range(repeat - 1):
+        t0 = time.perf_counter()
+        fn(*args)
+        times.append((time.perf_counter() - t0) * 1000)
+    return times, peak, peak - baseline, len(out)
+
+
+def make_corpus(out_dir: str, count: int) -> list:
+    """生成 count 组手机原图尺寸的合成照片（带噪点，压缩率接近真实照片）"""
+    from PIL import Image
+
+    try:
+        from pillow_heif import register_heif_opener
+        register_heif_opener()
+        heic = True
+    except ImportError:
+        heic = False
+    size = (4032, 3024)
+    paths = []
+    for n in range(count):
+        noise = Image.effect_noise(size, 40 + n * 5)
+        grad = Image.linear_gradient("L").resize(size)
+        img = Image.merge("RGB", (noise, grad, grad.transpose(Image.FLIP_LEFT_RIGHT)))
+        for ext, opts in ((".jpg", {"quality": 92}), (".png", {"compress_level": 6}), (".heic", {"quality": 80})):
+            if ext == ".heic" and not heic:
+                continue
+            path = os.path.join(out_dir, f"photo_{n:02d}{ext}")
+            img.save(path, **opts)
+            paths.append(path)
+    return paths
+
+
+def _pct(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p))]
+
+
+def bench_engine(pool, engine: str, ops: list, paths: list, repeat: int):
+    """按（转换, 输入格式）汇总一个引擎的结果；引擎不可用时返回 None"""
+    rows = []
+    for op in ops:
+        for ext in sorted({os.path.splitext(p)[1].lower() for p in paths}):
+            times, peaks, deltas, sizes = [], [], [], []
+            for path in [p for p in paths if p.lower().endswith(ext)]:
+                try:
+                    r = pool.submit(_convert, engine, op, path, repeat).result()
+                except Exception as e:
+                    print(f"  {engine} {op} {os.path.basename(path)} 失败: {e}", file=sys.stderr)
+                    continue
+                if r is None:
+                    return None
+                times.extend(r[0])
+                peaks.append(r[1])
+                deltas.append(r[2])
+                sizes.append(r[3])
+            if not times:
+                continue
+            rows.append({
+                "engine": engine, "op": op, "input": ext.lstrip("."), "n": len(times),
+                "p50_ms": round(statistics.median(times), 1), "p95_ms": round(_pct(times, 0.95), 1),
+                "per_sec": round(1000 / statistics.mean(times), 2),
+                "peak_rss_mb": round(max(peaks), 1), "peak_delta_mb": round(max(deltas), 1),
+                "out_kb": round(statistics.mean(sizes) / 1024, 1),
+            })
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Pillow / libvips 图片引擎耗时与峰值内存对比")
+    parser.add_argument("--corpus", help="原图目录（jpg/png/heic/webp），默认生成合成图片")
+    parser.add_argument("--count", type=int, default=3, help="合成图片组数（默认: 3）")
+    parser.add_argument("-e", "--engines", default="pillow,vips")
+    parser.add_argument("-o", "--ops", default=DEFAULT_OPS, help=f"转换列表，可选 {','.join(OPS)}")
+    parser.add_argument("-r", "--repeat", type=int, default=3, help="每张图片重复次数（默认: 3）")
+    parser.add_argument("--json", help="把结果写入 JSON 文件")
+    args = parser.parse_args()
+
+    ops = [o for o in args.ops.split(",") if o]
+    unknown = [o for o in ops if o not in OPS]
+    if unknown:
+        parser.error(f"未知转换: {', '.join(unknown)}")
+
+    tmp = None
+    if args.corpus:
+        paths = sorted(
+            os.path.join(args.corpus, f) for f in os.listdir(args.corpus) if f.lower().endswith(CORPUS_SUFFIXES)
+        )
+    else:
+        tmp = tempfile.TemporaryDirectory(prefix="image_bench_")
+        print("生成合成图片...", flush=True)
+        paths = make_corpus(tmp.name, args.count)
+    if not paths:
+        print("没有可用的图片", file=sys.stderr)
+        sys.exit(1)
+    print(f"{len(paths)} 张图片：" + ", ".join(sorted({os.path.splitext(p)[1].lower() for p in paths})))
+
+    results = []
+    ctx = multiprocessing.get_context("spawn")
+    # 每个任务一个新进程，ru_maxrss 只反映这一张图片的转换
+    with ProcessPoolExecutor(max_workers=1, mp_context=ctx, max_tasks_per_child=1) as pool:
+        for engine in [e for e in args.engines.split(",") if e]:
+            rows = bench_engine(pool, engine, ops, paths, args.repeat)
+            if rows is None:
+                print(f"{engine}: 引擎不可用，跳过")
+            results.extend(rows or [])
+
+    header = f"{'engine':<8}{'op':<13}{'input':<7}{'n':>4}{'p50 ms':>10}{'p95 ms':>10}{'img/s':>8}{'peak MB':>10}{'+MB':>8}{'out KB':>9}"
+    print(header)
+    print("-" * len(header))
+    for r in results:
+        print(f"{r['engine']:<8}{r['op']:<13}{r['input']:<7}{r['n']:>4}{r['p50_ms']:>10}{r['p95_ms']:>10}"
+              f"{r['per_sec']:>8}{r['peak_rss_mb']:>10}{r['peak_delta_mb']:>8}{r['out_kb']:>9}")
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+        print(f"结果已写入 {args.json}")
+    if tmp:
+        tmp.cleanup()
+
+
+if __name__ == "__main__":
+    main()
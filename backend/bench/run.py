@@ -0,0 +1,220 @@
+"""
+API 压测：对正在运行的 Logfolio API 按场景并发请求，输出每个场景的 req/s 和 p50/p95/p99 延迟。
+
+先用 bench.seed 生成数据；/api/anime-search 场景需让 API 指向 bench.stub_upstream（见该文件说明）。
+
+用法（在 backend/ 下）：
+    python -m bench.run                                   # 跑全部场景
+    python -m bench.run -s items_page,todos -c 16 -d 20   # 指定场景、并发、每场景秒数
+    python -m bench.run --save-baseline bench/baseline.json
+    python -m bench.run --compare bench/baseline.json     # 回归模式：超出容忍度时退出码为 1
+"""
+import argparse
+import asyncio
+import json
+import random
+import sys
+import time
+
+import httpx
+
+from bench.seed import BENCH_USER_PREFIX, BENCH_IMAGE_PREFIX, TITLE_WORDS
+
+
+class Context:
+    """压测上下文：用户列表、各用户分类 id、年份范围"""
+
+    def __init__(self, users: int, images: int, years: list, rng: random.Random):
+        self.users = [f"{BENCH_USER_PREFIX}{u:03d}" for u in range(users)]
+        self.images = images
+        self.years = years
+        self.categories = {}
+        self.rng = rng
+
+    def user(self) -> str:
+        return self.rng.choice(self.users)
+
+
+def _items_page(ctx):
+    return "/api/items/", {"limit": 20, "offset": ctx.rng.randrange(0, 200, 20)}
+
+
+def _items_search(ctx):
+    return "/api/items/", {"limit": 20, "search": ctx.rng.choice(TITLE_WORDS)}
+
+
+def _todos(ctx):
+    return "/api/items/todos", None
+
+
+def _achievement_wall(ctx, user):
+    return "/api/items/achievement-wall", {"category_id": ctx.rng.choice(ctx.categories[user])}
+
+
+def _annual_gallery(ctx):
+    return f"/api/items/annual-gallery/{ctx.rng.choice(ctx.years)}", None
+
+
+def _year_statistics(ctx):
+    return f"/api/items/statistics/year/{ctx.rng.choice(ctx.years)}", None
+
+
+def _bootstrap(ctx):
+    return "/api/bootstrap/", {"year": ctx.rng.choice(ctx.years), "limit": 20}
+
+
+def _serve_webp(ctx):
+    return f"/api/serve-webp/{BENCH_IMAGE_PREFIX}{ctx.rng.randrange(ctx.images):04d}.jpg", {"w": 320}
+
+
+def _anime_search(ctx):
+    return "/api/anime-search", {"q": ctx.rng.choice(TITLE_WORDS), "type": "all", "source": "both"}
+
+
+# 场景名 -> (生成请求路径和参数的函数, 是否需要用户分类 id)
+SCENARIOS = {
+    "items_page": (_items_page, False),
+    "items_search": (_items_search, False),
+    "todos": (_todos, False),
+    "achievement_wall": (_achievement_wall, True),
+    "annual_gallery": (_annual_gallery, False),
+    "year_statistics": (_year_statistics, False),
+    "bootstrap": (_bootstrap, False),
+    "serve_webp": (_serve_webp, False),
+    "anime_search": (_anime_search, False),
+}
+
+
+def percentile(sorted_values: list, pct: float) -> float:
+    if not sorted_values:
+        return 0.0
+    k = min(len(sorted_values) - 1, max(0, round(pct / 100 * len(sorted_values)) - 1))
+    return sorted_values[k]
+
+
+async def _load_categories(client: httpx.AsyncClient, ctx: Context):
+    for user in ctx.users:
+        r = await client.get("/api/categories/", headers={"X-User-ID": user})
+        r.raise_for_status()
+        ctx.categories[user] = [c["id"] for c in r.json()] or [0]
+
+
+async def run_scenario(client: httpx.AsyncClient, ctx: Context, name: str, concurrency: int, duration: float) -> dict:
+    build, needs_user = SCENARIOS[name]
+    latencies = []
+    errors = 0
+    deadline = time.perf_counter() + duration
+
+    async def worker():
+        nonlocal errors
+        while time.perf_counter() < deadline:
+            user = ctx.user()
+            path, params = build(ctx, user) if needs_user else build(ctx)
+            t0 = time.perf_counter()
+            try:
+                r = await client.get(path, params=params, headers={"X-User-ID": user, "Accept": "image/webp,application/json"})
+                await r.aread()
+                if r.status_code >= 400:
+                    errors += 1
+            except httpx.HTTPError:
+                errors += 1
+            latencies.append((time.perf_counter() - t0) * 1000)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    latencies.sort()
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "rps": round(len(latencies) / elapsed, 2) if elapsed else 0.0,
+        "p50_ms": round(percentile(latencies, 50), 2),
+        "p95_ms": round(percentile(latencies, 95), 2),
+        "p99_ms": round(percentile(latencies, 99), 2),
+    }
+
+
+def compare(results: dict, baseline: dict, tolerance: float) -> list:
+    """对比基线，返回回归描述列表：p95 变慢或吞吐下降超过 tolerance 视为回归"""
+    regressions = []
+    for name, cur in results.items():
+        base = (baseline.get("scenarios") or {}).get(name)
+        if not base:
+            continue
+        if base["p95_ms"] and cur["p95_ms"] > base["p95_ms"] * (1 + tolerance):
+            regressions.append(f"{name}: p95 {base['p95_ms']}ms -> {cur['p95_ms']}ms")
+        if base["rps"] and cur["rps"] < base["rps"] * (1 - tolerance):
+            regressions.append(f"{name}: req/s {base['rps']} -> {cur['rps']}")
+        if cur["errors"] > base.get("errors", 0):
+            regressions.append(f"{name}: errors {base.get('errors', 0)} -> {cur['errors']}")
+    return regressions
+
+
+async def main_async(args) -> int:
+    names = [s.strip() for s in args.scenarios.split(",") if s.strip()] if args.scenarios else list(SCENARIOS)
+    unknown = [n for n in names if n not in SCENARIOS]
+    if unknown:
+        raise SystemExit(f"未知场景: {unknown}，可选: {list(SCENARIOS)}")
+    this_year = time.localtime().tm_year
+    ctx = Context(args.users, args.images, list(range(this_year - args.years + 1, this_year + 1)), random.Random(args.seed))
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    results = {}
+    async with httpx.AsyncClient(base_url=args.base_url, timeout=30.0, limits=limits) as client:
+        if any(SCENARIOS[n][1] for n in names):
+            await _load_categories(client, ctx)
+        for name in names:
+            if args.warmup > 0:
+                await run_scenario(client, ctx, name, args.concurrency, args.warmup)
+            res = await run_scenario(client, ctx, name, args.concurrency, args.duration)
+            results[name] = res
+            print(f"{name:<18} {res['rps']:>9.1f} req/s  p50 {res['p50_ms']:>8.1f}ms  "
+                  f"p95 {res['p95_ms']:>8.1f}ms  p99 {res['p99_ms']:>8.1f}ms  "
+                  f"n={res['requests']} err={res['errors']}")
+    report = {
+        "base_url": args.base_url,
+        "concurrency": args.concurrency,
+        "duration": args.duration,
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "scenarios": results,
+    }
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+    if args.save_baseline:
+        with open(args.save_baseline, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"基线已保存: {args.save_baseline}")
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.tolerance)
+        if regressions:
+            print("\n性能回归（容忍度 {:.0%}）：".format(args.tolerance))
+            for r in regressions:
+                print("  " + r)
+            return 1
+        print("\n与基线相比无回归（容忍度 {:.0%}）".format(args.tolerance))
+    return 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Logfolio API 压测")
+    parser.add_argument("--base-url", "-b", default="http://127.0.0.1:8000", help="API 地址（不含 /api）")
+    parser.add_argument("--scenarios", "-s", default="", help=f"逗号分隔的场景，默认全部：{','.join(SCENARIOS)}")
+    parser.add_argument("--concurrency", "-c", type=int, default=8, help="并发数")
+    parser.add_argument("--duration", "-d", type=float, default=10.0, help="每个场景压测秒数")
+    parser.add_argument("--warmup", type=float, default=2.0, help="每个场景正式计时前的预热秒数")
+    parser.add_argument("--users", type=int, default=20, help="与 bench.seed 的 --users 一致")
+    parser.add_argument("--images", type=int, default=40, help="与 bench.seed 的 --images 一致")
+    parser.add_argument("--years", type=int, default=5, help="与 bench.seed 的 --years 一致")
+    parser.add_argument("--seed", type=int, default=42, help="请求参数的随机种子")
+    parser.add_argument("--output", "-o", help="结果写入 JSON 文件")
+    parser.add_argument("--save-baseline", help="把本次结果保存为基线 JSON")
+    parser.add_argument("--compare", help="与基线 JSON 对比（回归模式）")
+    parser.add_argument("--tolerance", type=float, default=0.15, help="回归容忍度，默认 15%%")
+    args = parser.parse_args()
+    sys.exit(asyncio.run(main_async(args)))
+
+
+if __name__ == "__main__":
+    main()
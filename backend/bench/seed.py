@@ -0,0 +1,120 @@
+"""
+压测数据生成：按固定随机种子生成用户、分类、记录和图片，写入 config.DATABASE_URL 指向的库（SQLite 或本地 MySQL）。
+
+图片只生成一小批真实尺寸的 JPEG 放到 UPLOAD_DIR，记录之间复用，避免占用大量磁盘；
+每条记录的图片数按 0 张 20%、1 张 60%、2~5 张 20% 分布，接近真实账号。
+
+用法（在 backend/ 下，先 python init_db.py 建表）：
+    python -m bench.seed --users 20 --items-per-user 800
+"""
+import argparse
+import os
+import random
+import time
+from datetime import datetime, timedelta
+
+from config import UPLOAD_DIR
+from database import SessionLocal
+from models import Category, Item, ItemImage
+from image_order import RANK_GAP
+
+CATEGORY_NAMES = ["动漫", "漫画", "游戏", "电影", "书籍", "旅行"]
+TITLE_WORDS = ["进击", "巨人", "鬼灭", "之刃", "命运", "石之门", "星际", "旅行", "魔法", "少女", "钢之", "炼金术师",
+               "Sword", "Art", "Online", "Steins", "Gate", "Cowboy", "Bebop", "Evangelion", "の", "物語", "ラブ", "ライブ"]
+BENCH_USER_PREFIX = "bench_user_"
+BENCH_IMAGE_PREFIX = "bench_"
+
+
+def _make_images(count: int, rng: random.Random) -> list:
+    """生成 count 张 1000~1600px 的封面风格 JPEG，返回文件名列表（已存在则复用）"""
+    from PIL import Image, ImageDraw
+
+    os.makedirs(UPLOAD_DIR, exist_ok=True)
+    names = []
+    for n in range(count):
+        name = f"{BENCH_IMAGE_PREFIX}{n:04d}.jpg"
+        path = os.path.join(UPLOAD_DIR, name)
+        names.append(name)
+        if os.path.isfile(path):
+            continue
+        w = rng.randint(1000, 1200)
+        h = int(w * rng.uniform(1.3, 1.5))
+        img = Image.effect_noise((w, h), rng.randint(20, 60)).convert("RGB")
+        draw = ImageDraw.Draw(img)
+        for _ in range(12):
+            x0, y0 = rng.randint(0, w), rng.randint(0, h)
+            color = tuple(rng.randint(0, 255) for _ in range(3))
+            draw.rectangle([x0, y0, x0 + rng.randint(50, w // 2), y0 + rng.randint(50, h // 2)], fill=color)
+        img.save(path, "JPEG", quality=88)
+    return names
+
+
+def _image_count(rng: random.Random) -> int:
+    r = rng.random()
+    if r < 0.2:
+        return 0
+    if r < 0.8:
+        return 1
+    return rng.randint(2, 5)
+
+
+def seed(users: int, items_per_user: int, todo_ratio: float, images: int, years: int, seed_value: int):
+    rng = random.Random(seed_value)
+    image_names = _make_images(images, rng)
+    now = datetime.utcnow()
+    start = datetime(now.year - years + 1, 1, 1)
+    span = (now - start).total_seconds()
+    db = SessionLocal()
+    started = time.time()
+    try:
+        for u in range(users):
+            user_id = f"{BENCH_USER_PREFIX}{u:03d}"
+            cats = []
+            for name in CATEGORY_NAMES:
+                c = Category(name=name, user_id=user_id, user_defined=True, created_at=start)
+                db.add(c)
+                cats.append(c)
+            db.flush()
+            for n in range(items_per_user):
+                created = start + timedelta(seconds=rng.random() * span)
+                done = rng.random() >= todo_ratio
+                item = Item(
+                    title=" ".join(rng.sample(TITLE_WORDS, rng.randint(1, 4))) + f" {n}",
+                    user_id=user_id,
+                    category_id=rng.choice(cats).id,
+                    created_at=created,
+                    is_completed=done,
+                    finish_time=created + timedelta(days=rng.randint(0, 30)) if done and rng.random() < 0.9 else None,
+                    due_time=created + timedelta(days=rng.randint(1, 60)) if not done and rng.random() < 0.6 else None,
+                    notes="压测数据 " * rng.randint(0, 20) or None,
+                )
+                for k in range(_image_count(rng)):
+                    item.images.append(ItemImage(
+                        image_url=f"/api/uploads/{rng.choice(image_names)}",
+                        upload_time=created,
+                        sort_order=(k + 1) * RANK_GAP,
+                    ))
+                db.add(item)
+                if n % 500 == 499:
+                    db.flush()
+            db.commit()
+            print(f"[{u + 1}/{users}] {user_id}: {items_per_user} 条记录")
+    finally:
+        db.close()
+    print(f"完成，耗时 {time.time() - started:.1f}s；用户 ID 为 {BENCH_USER_PREFIX}000 ~ {BENCH_USER_PREFIX}{users - 1:03d}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="生成压测用的用户/分类/记录/图片数据")
+    parser.add_argument("--users", type=int, default=20, help="用户数")
+    parser.add_argument("--items-per-user", type=int, default=800, help="每个用户的记录数")
+    parser.add_argument("--todo-ratio", type=float, default=0.15, help="待办（未完成）占比")
+    parser.add_argument("--images", type=int, default=40, help="生成的不同图片文件数（记录间复用）")
+    parser.add_argument("--years", type=int, default=5, help="数据覆盖最近几年")
+    parser.add_argument("--seed", type=int, default=42, help="随机种子，相同参数生成相同数据")
+    args = parser.parse_args()
+    seed(args.users, args.items_per_user, args.todo_ratio, args.images, args.years, args.seed)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,59 @@
+"""
+Jikan / Bangumi 桩服务：返回固定结构的搜索结果，可选人为延迟，用于压测 /api/anime-search 而不打真实上游。
+
+用法（在 backend/ 下）：
+    uvicorn bench.stub_upstream:app --port 8910
+    RATE_LIMIT_ENABLED=0 JIKAN_BASE=http://127.0.0.1:8910/jikan BANGUMI_BASE=http://127.0.0.1:8910/bangumi uvicorn main:app
+
+也可作为追踪 collector 桩：TRACE_EXPORT=http://127.0.0.1:8910/v1/traces，收到的 OTLP/JSON 追加到 STUB_TRACE_FILE。
+"""
+import asyncio
+import json
+import os
+
+from fastapi import FastAPI, Query, Request
+
+# 模拟上游耗时（毫秒）
+STUB_LATENCY_MS = int(os.environ.get("STUB_LATENCY_MS", 80))
+STUB_TRACE_FILE = os.environ.get("STUB_TRACE_FILE", "stub_traces.jsonl")
+
+app = FastAPI(title="Logfolio bench upstream stub")
+
+
+def _cover(n: int, host: str) -> str:
+    return f"https://{host}/images/stub/{n}.jpg"
+
+
+@app.get("/jikan/{kind}")
+async def jikan_search(kind: str, q: str = Query(""), limit: int = Query(12), page: int = Query(1)):
+    await asyncio.sleep(STUB_LATENCY_MS / 1000)
+    data = [{
+        "title": f"{q} {kind} {page}-{n}",
+        "title_japanese": f"{q} の{n}",
+        "images": {"jpg": {"image_url": _cover(n, "cdn.myanimelist.net"), "large_image_url": _cover(n, "cdn.myanimelist.net")}},
+    } for n in range(limit)]
+    return {"data": data, "pagination": {"has_next_page": page < 3}}
+
+
+@app.post("/bangumi/v0/search/subjects")
+async def bangumi_search(request: Request, limit: int = Query(24), offset: int = Query(0)):
+    body = await request.json()
+    await asyncio.sleep(STUB_LATENCY_MS / 1000)
+    keyword = body.get("keyword") or ""
+    types = (body.get("filter") or {}).get("type") or [2]
+    data = [{
+        "id": offset + n,
+        "type": types[n % len(types)],
+        "name": f"{keyword} {offset + n}",
+        "name_cn": f"{keyword}（{offset + n}）",
+        "images": {"large": _cover(offset + n, "lain.bgm.tv")},
+    } for n in range(limit if offset < limit * 2 else 0)]
+    return {"data": data, "total": limit * 3}
+
+
+@app.post("/v1/traces")
+async def collect_traces(request: Request):
+    body = await request.json()
+    with open(STUB_TRACE_FILE, "a", encoding="utf-8") as f:
+        f.write(json.dumps(body, ensure_ascii=False, separators=(",", ":")) + "\n")
+    return {"partialSuccess": {}}
@@ -0,0 +1,243 @@
+"""
+部署后缓存预热：挑出近期最活跃的用户，预先执行成就墙 / 年度墙查询，并补齐他们墙上图片缺失的派生图，
+让部署或清空缓存后第一批打开页面的用户不必承担冷库缓存和首次图片转换的延迟。
+
+活跃度 = 近 WARM_ACTIVE_DAYS 天内被访问过的派生图数（来自 WebP 缓存索引持久化的访问时间）
+      + 同期修改过的记录数（缓存被清空、没有访问数据时只看这一项）。
+
+- 查询：对主库和每个只读副本分别执行 get_achievement_wall（该用户的每个分类）和 get_annual_gallery
+  （今年和去年，已结束年份顺带生成年度回顾快照），预热数据库缓冲池和连接池；
+- 派生图：墙上每张本地上传图片按 THUMB_WIDTHS × WARM_FORMATS 检查 WebP 缓存索引，缺失的在解码子进程中生成；
+  逐张串行生成，并按 WARM_CPU_BUDGET 在每次转换后休眠，预热期间线上请求仍有可用的解码进程和 CPU。
+
+可作为 API 启动任务（WARM_ON_STARTUP=1）或命令行运行：
+    python cache_warmer.py                     # 预热前 WARM_TOP_USERS 个活跃用户
+    python cache_warmer.py --users 50 --skip-derivatives
+    python cache_warmer.py --user alice --dry-run
+命令行生成的派生图写入共用的缓存目录，已在运行的 API 进程请求到时直接读取，下次同步索引时计入预算。
+"""
+import argparse
+import asyncio
+import logging
+import os
+import time
+from datetime import datetime, timedelta
+from typing import Callable, Optional
+
+from sqlalchemy import distinct, func
+
+import database
+import imaging
+import webp_cache
+from models import ArchivedItem, Category, Item, ItemImage
+from storage_gc import UPLOAD_URL_PREFIXES, upload_path
+from webp_cache import webp_cache_path
+
+logger = logging.getLogger("uvicorn.error")
+
+WARM_ON_STARTUP = os.environ.get("WARM_ON_STARTUP", "0") not in ("0", "false", "no", "")
+# 预热的用户数和统计活跃度的时间窗口
+WARM_TOP_USERS = int(os.environ.get("WARM_TOP_USERS", 20))
+WARM_ACTIVE_DAYS = int(os.environ.get("WARM_ACTIVE_DAYS", 7))
+# 生成派生图占用的 CPU 比例（按一个解码进程计）：0.5 表示每转换 1 秒休息 1 秒，1 表示不休息
+WARM_CPU_BUDGET = float(os.environ.get("WARM_CPU_BUDGET", 0.5))
+# 单次预热最多生成的派生图数量
+WARM_MAX_DERIVATIVES = int(os.environ.get("WARM_MAX_DERIVATIVES", 2000))
+# 预热的输出格式，逗号分隔；默认取主流浏览器（Accept 同时声明 AVIF 和 WebP）协商得到的格式
+WARM_FORMATS = [f for f in os.environ.get("WARM_FORMATS", "").replace(" ", "").split(",") if f]
+# 每生成多少张派生图报告一次进度
+WARM_PROGRESS_EVERY = 50
+
+_LOOKUP_BATCH = 500
+
+
+def warm_formats() -> list:
+    if WARM_FORMATS:
+        return [f for f in WARM_FORMATS if f in imaging.MEDIA_TYPES]
+    return [imaging.negotiate_format("image/avif,image/webp,*/*")]
+
+
+def _filename_for_source_key(key: str) -> Optional[str]:
+    """webp_cache.source_key 的逆运算（上传文件名为 uuid + 扩展名，可以还原）"""
+    base, sep, ext = key.rpartition("_")
+    return f"{base}.{ext}" if sep and base else None
+
+
+def active_users(limit: int = WARM_TOP_USERS, days: int = WARM_ACTIVE_DAYS) -> list:
+    """近 days 天最活跃的 limit 个用户，返回 [(user_id, 分数)]，按分数从高到低"""
+    since = time.time() - days * 86400
+    webp_cache.ensure_index()
+    names = [n for n in map(_filename_for_source_key, webp_cache.recent_sources(since)) if n]
+    scores = {}
+    db = database.SessionLocal()
+    try:
+        for i in range(0, len(names), _LOOKUP_BATCH):
+            urls = [prefix + n for n in names[i:i + _LOOKUP_BATCH] for prefix in UPLOAD_URL_PREFIXES]
+            # 每张图片只属于一层中的一条记录，两层分别计数后相加
+            for M in (Item, ArchivedItem):
+                rows = (
+                    db.query(M.user_id, func.count(distinct(ItemImage.id)))
+                    .join(ItemImage, ItemImage.item_id == M.id)
+                    .filter(ItemImage.image_url.in_(urls))
+                    .group_by(M.user_id)
+                    .all()
+                )
+                for user_id, n in rows:
+                    scores[user_id] = scores.get(user_id, 0) + n
+        rows = (
+            db.query(Item.user_id, func.count(Item.id))
+            .filter(Item.updated_at >= datetime.utcnow() - timedelta(days=days))
+            .group_by(Item.user_id)
+            .all()
+        )
+        for user_id, n in rows:
+            scores[user_id] = scores.get(user_id, 0) + n
+    finally:
+        db.close()
+    return sorted(scores.items(), key=lambda kv: (-kv[1], kv[0]))[:limit]
+
+
+def warm_queries(user_id: str, years: list) -> list:
+    """在主库和各副本上执行该用户的成就墙 / 年度墙查询，返回墙上出现的本地上传图片地址（去重、保持顺序）"""
+    from routers.items import get_achievement_wall, get_annual_gallery
+
+    images = {}
+    for factory in database.session_factories():
+        db = factory()
+        try:
+            category_ids = [cid for (cid,) in db.query(Category.id).filter(Category.user_id == user_id)]
+            entries = []
+            for cid in category_ids:
+                entries.extend(get_achievement_wall(category_id=cid, db=db, user_id=user_id)["items"])
+            for year in years:
+                entries.extend(get_annual_gallery(year, db=db, user_id=user_id))
+        finally:
+            db.close()
+        for entry in entries:
+            if entry.get("image_thumb"):
+                images.setdefault(entry["image"], None)
+    return list(images)
+
+
+def missing_derivatives(image_urls: list, formats: list) -> list:
+    """还没有缓存的 (原图路径, 宽度, 格式)；原图已不存在的跳过"""
+    jobs = []
+    for url in image_urls:
+        path = upload_path(url)
+        if not path or not os.path.isfile(path):
+            continue
+        for width in imaging.THUMB_WIDTHS:
+            for fmt in formats:
+                if not webp_cache.contains(webp_cache_path(path, width, fmt)):
+                    jobs.append((path, width, fmt))
+    return jobs
+
+
+async def warm(
+    users: Optional[list] = None,
+    limit: int = WARM_TOP_USERS,
+    derivatives: bool = True,
+    cpu_budget: float = WARM_CPU_BUDGET,
+    max_derivatives: int = WARM_MAX_DERIVATIVES,
+    dry_run: bool = False,
+    progress: Optional[Callable[[str], None]] = None,
+) -> dict:
+    """执行一次预热；users 为空时按活跃度挑选。dry_run 只统计缺失的派生图，不生成"""
+    report = progress or (lambda msg: logger.info("cache_warm: %s", msg))
+    started = time.time()
+    if users is None:
+        ranked = await asyncio.to_thread(active_users, limit)
+        users = [u for u, _ in ranked]
+        report(f"活跃用户 {len(users)} 个: " + ", ".join(f"{u}({n})" for u, n in ranked))
+    this_year = datetime.now().year
+    years = [this_year, this_year - 1]
+    formats = warm_formats()
+
+    result = {"users": len(users), "queries_seconds": 0.0, "images": 0, "missing": 0,
+              "generated": 0, "failed": 0, "generated_bytes": 0}
+    t0 = time.time()
+    user_images = []
+    for n, user_id in enumerate(users, 1):
+        try:
+            urls = await asyncio.to_thread(warm_queries, user_id, years)
+        except Exception as e:
+            logger.warning("cache_warm queries failed for %s: %s", user_id, e)
+            urls = []
+        user_images.append(urls)
+        result["images"] += len(urls)
+        report(f"查询 {n}/{len(users)} {user_id}: {len(urls)} 张图片")
+    result["queries_seconds"] = round(time.time() - t0, 2)
+
+    if derivatives:
+        webp_cache.ensure_index()
+        seen, jobs = set(), []
+        # 按活跃度顺序排队，同一张图片只生成一次
+        for urls in user_images:
+            jobs.extend(missing_derivatives([u for u in urls if u not in seen], formats))
+            seen.update(urls)
+        result["missing"] = len(jobs)
+        jobs = jobs[:max(max_derivatives, 0)]
+        report(f"缺失派生图 {result['missing']} 张，本次生成 {0 if dry_run else len(jobs)} 张（格式 {','.join(formats)}）")
+        if not dry_run:
+            await _generate(jobs, cpu_budget, result, report)
+
+    result["elapsed"] = round(time.time() - started, 2)
+    report(f"完成: {result}")
+    return result
+
+
+async def _generate(jobs: list, cpu_budget: float, result: dict, report: Callable[[str], None]):
+    """逐张生成派生图；每次转换后休眠 耗时 × (1/cpu_budget - 1) 秒"""
+    pause = 1 / cpu_budget - 1 if 0 < cpu_budget < 1 else 0.0
+    for n, (path, width, fmt) in enumerate(jobs, 1):
+        cache_path = webp_cache_path(path, width, fmt)
+        # 排队期间可能已被线上请求生成
+        if not webp_cache.contains(cache_path):
+            t0 = time.perf_counter()
+            try:
+                await asyncio.to_thread(imaging.probe, path)
+                data = await imaging.run_in_worker(imaging.render_variant, path, width, fmt)
+                webp_cache.put(cache_path, data)
+                result["generated"] += 1
+                result["generated_bytes"] += len(data)
+            except Exception as e:
+                result["failed"] += 1
+                logger.warning("cache_warm render failed for %s w=%s %s: %s", os.path.basename(path), width, fmt, e)
+            if pause:
+                await asyncio.sleep((time.perf_counter() - t0) * pause)
+        if n % WARM_PROGRESS_EVERY == 0 or n == len(jobs):
+            report(f"派生图 {n}/{len(jobs)}，已生成 {result['generated']}，失败 {result['failed']}")
+
+
+async def startup_warm():
+    """API 启动任务：预热结束后保存 WebP 缓存索引"""
+    try:
+        await warm()
+        await asyncio.to_thread(webp_cache.save_index)
+    except Exception as e:
+        logger.warning("cache_warm startup run failed: %s", e)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="预热活跃用户的成就墙 / 年度墙查询和派生图缓存")
+    parser.add_argument("--users", type=int, default=WARM_TOP_USERS, help=f"预热的活跃用户数（默认: {WARM_TOP_USERS}）")
+    parser.add_argument("--user", action="append", help="只预热指定用户（可重复），不按活跃度挑选")
+    parser.add_argument("--skip-derivatives", action="store_true", help="只预热查询，不生成派生图")
+    parser.add_argument("--cpu-budget", type=float, default=WARM_CPU_BUDGET, help=f"派生图生成的 CPU 比例（默认: {WARM_CPU_BUDGET}）")
+    parser.add_argument("--max-derivatives", type=int, default=WARM_MAX_DERIVATIVES)
+    parser.add_argument("--dry-run", action="store_true", help="只统计缺失的派生图，不生成")
+    args = parser.parse_args()
+
+    try:
+        asyncio.run(warm(
+            users=args.user, limit=args.users, derivatives=not args.skip_derivatives,
+            cpu_budget=args.cpu_budget, max_derivatives=args.max_derivatives, dry_run=args.dry_run,
+            progress=lambda msg: print(msg, flush=True),
+        ))
+        webp_cache.save_index()
+    finally:
+        imaging.shutdown_workers()
+
+
+if __name__ == "__main__":
+    main()
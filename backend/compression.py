@@ -0,0 +1,131 @@
+"""
+响应压缩：按 Accept-Encoding 协商 br / zstd / gzip，压缩 JSON、文本等响应（记录列表、成就墙、年度墙）。
+
+- 小于 COMPRESS_MIN_BYTES 的响应不压缩（压缩收益抵不过 CPU 和头部开销）；
+- 只压缩 COMPRESSIBLE_TYPES 中的类型，图片（WebP/AVIF/JPEG）等已压缩的内容原样返回；
+- 已带 Content-Encoding 的响应（如年度回顾的预压缩快照）不再处理；
+- 压缩后的字节与原响应不同，强 ETag 改为弱 ETag（W/），接口用 etag_matches 弱比较 If-None-Match 仍能返回 304；
+- br 需要 pip install brotli，zstd 需要 pip install zstandard，未安装时只协商 gzip。
+"""
+import asyncio
+import gzip
+import os
+from typing import Optional
+
+from starlette.datastructures import MutableHeaders
+from starlette.middleware.base import BaseHTTPMiddleware
+from starlette.responses import Response
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+COMPRESS_ENABLED = os.environ.get("COMPRESS_ENABLED", "1") not in ("0", "false", "no")
+COMPRESS_MIN_BYTES = int(os.environ.get("COMPRESS_MIN_BYTES", 1024))
+COMPRESS_GZIP_LEVEL = int(os.environ.get("COMPRESS_GZIP_LEVEL", 6))
+# 动态响应用中等级别：br 11 / zstd 19 压缩率更高但慢一个数量级，只适合构建时预压缩的静态文件
+COMPRESS_BROTLI_QUALITY = int(os.environ.get("COMPRESS_BROTLI_QUALITY", 5))
+COMPRESS_ZSTD_LEVEL = int(os.environ.get("COMPRESS_ZSTD_LEVEL", 3))
+# 超过该字节数的响应在线程中压缩，不阻塞事件循环
+COMPRESS_THREAD_BYTES = 64 * 1024
+
+COMPRESSIBLE_TYPES = (
+    "application/json", "application/javascript", "application/xml", "image/svg+xml", "text/",
+)
+
+
+def _gzip(data: bytes) -> bytes:
+    return gzip.compress(data, compresslevel=COMPRESS_GZIP_LEVEL, mtime=0)
+
+
+def _brotli(data: bytes) -> bytes:
+    return brotli.compress(data, quality=COMPRESS_BROTLI_QUALITY)
+
+
+def _zstd(data: bytes) -> bytes:
+    return zstandard.ZstdCompressor(level=COMPRESS_ZSTD_LEVEL).compress(data)
+
+
+# 服务端偏好顺序
+CODECS = [(name, fn) for name, fn, mod in (
+    ("br", _brotli, brotli), ("zstd", _zstd, zstandard), ("gzip", _gzip, gzip),
+) if mod is not None]
+
+
+def _qvalues(accept_encoding: Optional[str]) -> dict:
+    """解析 Accept-Encoding：{编码: q 值}"""
+    accepted = {}
+    for part in (accept_encoding or "").lower().split(","):
+        name, _, params = part.strip().partition(";")
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        if name:
+            accepted[name] = q
+    return accepted
+
+
+def accepts(accept_encoding: Optional[str], name: str) -> bool:
+    """客户端是否接受编码 name（q=0 视为不接受）；用于只有一种预压缩表示的响应"""
+    accepted = _qvalues(accept_encoding)
+    return accepted.get(name, accepted.get("*", 0)) > 0
+
+
+def negotiate(accept_encoding: Optional[str]) -> Optional[str]:
+    """从 Accept-Encoding 中选出支持的编码（q=0 视为不接受），没有可用编码时返回 None"""
+    for name, _ in CODECS:
+        if accepts(accept_encoding, name):
+            return name
+    return None
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """If-None-Match 弱比较：值为逗号分隔的 ETag 列表，忽略 W/ 前缀，* 匹配任意 ETag"""
+    opaque = etag[2:] if etag.startswith("W/") else etag
+    for tag in (if_none_match or "").split(","):
+        tag = tag.strip()
+        if tag == "*" or (tag[2:] if tag.startswith("W/") else tag) == opaque:
+            return True
+    return False
+
+
+def compressible(content_type: Optional[str]) -> bool:
+    return bool(content_type) and content_type.lower().startswith(COMPRESSIBLE_TYPES)
+
+
+class CompressionMiddleware(BaseHTTPMiddleware):
+    """压缩可压缩的响应；需在 CORS 之内、其余中间件之外"""
+
+    async def dispatch(self, request, call_next):
+        response = await call_next(request)
+        if not COMPRESS_ENABLED or request.method == "HEAD":
+            return response
+        if "content-encoding" in response.headers or not compressible(response.headers.get("content-type")):
+            return response
+        length = response.headers.get("content-length")
+        if length is not None and int(length) < COMPRESS_MIN_BYTES:
+            return response
+        encoding = negotiate(request.headers.get("accept-encoding"))
+        if encoding is None:
+            response.headers.add_vary_header("Accept-Encoding")
+            return response
+        headers = MutableHeaders(raw=[(k, v) for k, v in response.raw_headers if k != b"content-length"])
+        headers.add_vary_header("Accept-Encoding")
+        body = b"".join([chunk async for chunk in response.body_iterator])
+        if len(body) >= COMPRESS_MIN_BYTES:
+            fn = dict(CODECS)[encoding]
+            body = await asyncio.to_thread(fn, body) if len(body) >= COMPRESS_THREAD_BYTES else fn(body)
+            headers["Content-Encoding"] = encoding
+            etag = headers.get("etag")
+            if etag and not etag.startswith("W/"):
+                headers["ETag"] = "W/" + etag
+        return Response(content=body, status_code=response.status_code, headers=headers)
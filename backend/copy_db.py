@@ -0,0 +1,87 @@
+"""
+把现有数据库（通常是 MySQL）完整复制到另一个库，用于迁移到 SQLite 单机模式。
+
+用法（在 backend/ 下）：
+    python copy_db.py --target sqlite:///logfolio.db                      # 源库默认为 config.DATABASE_URL
+    python copy_db.py --source mysql+pymysql://u:p@host/logfolio --target sqlite:///logfolio.db --replace
+
+按外键顺序逐表分批复制，保留主键；复制完成后对目标库执行迁移（SQLite 会创建全文索引）并执行 ANALYZE。
+复制期间请停止写入。完成后把 config.py 的 DATABASE_URL 改为目标地址即可。
+"""
+import argparse
+import sys
+import time
+
+from sqlalchemy import create_engine, func, select, text
+
+from config import DATABASE_URL
+from database import Base, _create_engine, is_sqlite
+from models import ArchivedItem, Category, IdSequence, Item, ItemImage, Tombstone, YearSnapshot, sync_item_sequence  # noqa: F401
+import migrations
+
+
+def copy_table(src, dst, table, batch_size: int) -> int:
+    copied = 0
+    with src.connect() as sconn:
+        # 生成列（如 items.due_time_is_null）由目标库自己计算
+        cols = [c for c in table.columns if c.computed is None]
+        result = sconn.execution_options(stream_results=True).execute(select(*cols).order_by(*table.primary_key.columns))
+        while True:
+            rows = result.fetchmany(batch_size)
+            if not rows:
+                break
+            with dst.begin() as dconn:
+                dconn.execute(table.insert(), [dict(r._mapping) for r in rows])
+            copied += len(rows)
+    return copied
+
+
+def prepare_target(dst, replace: bool):
+    """在目标库建表；replace 时先删除已有表（含全文索引、视图），否则要求各表为空"""
+    if replace:
+        with dst.begin() as conn:
+            conn.execute(text("DROP TABLE IF EXISTS items_fts"))
+            conn.execute(text("DROP VIEW IF EXISTS items_all"))
+        migrations.schema_migrations.drop(dst, checkfirst=True)
+        Base.metadata.drop_all(bind=dst)
+    Base.metadata.create_all(bind=dst)
+    with dst.connect() as conn:
+        for table in Base.metadata.sorted_tables:
+            if conn.execute(select(func.count()).select_from(table)).scalar():
+                sys.exit(f"目标库的 {table.name} 已有数据，使用 --replace 覆盖")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="复制数据库（MySQL -> SQLite）")
+    parser.add_argument("--source", default=DATABASE_URL, help="源库连接串，默认 config.DATABASE_URL")
+    parser.add_argument("--target", required=True, help="目标库连接串，如 sqlite:///logfolio.db")
+    parser.add_argument("--batch-size", type=int, default=1000)
+    parser.add_argument("--replace", action="store_true", help="目标库已有数据时先清空")
+    args = parser.parse_args()
+
+    if args.source == args.target:
+        sys.exit("源库和目标库相同")
+    src = create_engine(args.source, pool_pre_ping=True)
+    dst = _create_engine(args.target)
+
+    prepare_target(dst, args.replace)
+
+    start = time.time()
+    for table in Base.metadata.sorted_tables:
+        t0 = time.time()
+        n = copy_table(src, dst, table, args.batch_size)
+        print(f"{table.name}: {n} 行，{time.time() - t0:.1f}s")
+
+    # 记录迁移版本；SQLite 目标库在这里创建全文索引
+    migrations.run(dst)
+    with dst.begin() as conn:
+        # 源库的 id 序列可能落后于复制过来的记录（如源库尚未执行迁移 0007）
+        sync_item_sequence(conn)
+    if is_sqlite(args.target):
+        with dst.begin() as conn:
+            conn.execute(text("ANALYZE"))
+    print(f"复制完成，用时 {time.time() - start:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
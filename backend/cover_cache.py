@@ -0,0 +1,229 @@
+"""
+封面代理缓存：封面搜索结果的缩略图经 /api/cover-proxy 从本地返回，不再让浏览器直连 MAL / Bangumi CDN。
+
+每个远程封面只拉取一次：原图存为 UPLOAD_DIR/.cover_cache/{key}.jpg（key 为 URL 的 sha1），
+选择器缩略图按 COVER_THUMB_WIDTH 在解码子进程中生成后一并缓存；用户选中封面创建记录时直接复用缓存的原图。
+同一 URL 并发请求只会有一次上游拉取。总大小超过 COVER_CACHE_MAX_BYTES 时按最近访问时间（mtime）淘汰。
+上游重定向手动跟随，每一跳都要通过 is_allowed（api.bgm.tv 的条目图片接口会重定向到 lain.bgm.tv），
+不会被重定向到内网或其它任意地址。
+"""
+import asyncio
+import hashlib
+import logging
+import os
+import re
+import threading
+import uuid
+from typing import Optional
+from urllib.parse import urlparse
+
+import httpx
+
+from config import UPLOAD_DIR
+import imaging
+
+logger = logging.getLogger("uvicorn.error")
+
+# 允许拉取封面的 CDN 域名
+ALLOWED_COVER_HOSTS = ("cdn.myanimelist.net", "cdn.myanimelist.net.", "lain.bgm.tv", "lain.bgm.tv.")
+# 本地条目库的封面地址：Bangumi API 条目图片接口（重定向到 lain.bgm.tv），只允许该路径
+BANGUMI_IMAGE_HOSTS = ("api.bgm.tv", "api.bgm.tv.")
+_BANGUMI_IMAGE_PATH = re.compile(r"^/v0/subjects/\d+/image$")
+COVER_CACHE_DIR = os.path.join(UPLOAD_DIR, ".cover_cache")
+# 缓存总大小预算（字节），0 表示不限制
+COVER_CACHE_MAX_BYTES = int(os.environ.get("COVER_CACHE_MAX_BYTES", 512 * 1024 ** 2))
+# 选择器缩略图宽度（像素）
+COVER_THUMB_WIDTH = int(os.environ.get("COVER_THUMB_WIDTH", 240))
+# 上游图片最大字节数
+COVER_MAX_BYTES = int(os.environ.get("COVER_MAX_BYTES", 10 * 1024 * 1024))
+# 最多跟随的重定向次数
+COVER_MAX_REDIRECTS = 5
+
+ORIGINAL_EXTS = (".jpg", ".png", ".webp")
+
+_locks = {}
+_size_lock = threading.Lock()
+# 当前缓存总字节数；None 表示尚未扫描目录
+_total_bytes = None
+
+
+def is_allowed(url: str) -> bool:
+    """是否为允许代理/拉取的封面链接"""
+    parsed = urlparse((url or "").strip())
+    if parsed.scheme not in ("https", "http"):
+        return False
+    if parsed.netloc in BANGUMI_IMAGE_HOSTS:
+        return bool(_BANGUMI_IMAGE_PATH.match(parsed.path))
+    return parsed.netloc in ALLOWED_COVER_HOSTS
+
+
+def _key(url: str) -> str:
+    return hashlib.sha1(url.strip().encode("utf-8")).hexdigest()
+
+
+def _lock_for(key: str) -> asyncio.Lock:
+    lock = _locks.get(key)
+    if lock is None:
+        lock = _locks[key] = asyncio.Lock()
+    return lock
+
+
+def _forget_lock(key: str):
+    """没有其它请求在等待时移除锁，避免每个 URL 的锁常驻内存"""
+    lock = _locks.get(key)
+    if lock is not None and not lock.locked() and not getattr(lock, "_waiters", None):
+        del _locks[key]
+
+
+def _find_original(key: str) -> Optional[str]:
+    for ext in ORIGINAL_EXTS:
+        path = os.path.join(COVER_CACHE_DIR, key + ext)
+        if os.path.isfile(path):
+            return path
+    return None
+
+
+def _touch(path: str):
+    """命中时更新 mtime，作为 LRU 的最近访问时间"""
+    try:
+        os.utime(path)
+    except OSError:
+        pass
+
+
+def _ext_for(content_type: str) -> str:
+    if "png" in content_type:
+        return ".png"
+    if "webp" in content_type:
+        return ".webp"
+    return ".jpg"
+
+
+def _write(path: str, data: bytes):
+    global _total_bytes
+    os.makedirs(COVER_CACHE_DIR, exist_ok=True)
+    tmp = f"{path}.{uuid.uuid4().hex}.tmp"
+    with open(tmp, "wb") as f:
+        f.write(data)
+    os.replace(tmp, path)
+    with _size_lock:
+        if _total_bytes is not None:
+            _total_bytes += len(data)
+
+
+def enforce_budget() -> int:
+    """总大小超出 COVER_CACHE_MAX_BYTES 时删除最久未访问的文件，返回释放字节数"""
+    global _total_bytes
+    if COVER_CACHE_MAX_BYTES <= 0 or not os.path.isdir(COVER_CACHE_DIR):
+        return 0
+    with _size_lock:
+        if _total_bytes is not None and _total_bytes <= COVER_CACHE_MAX_BYTES:
+            return 0
+    entries = []
+    with os.scandir(COVER_CACHE_DIR) as it:
+        for entry in it:
+            try:
+                if entry.is_file(follow_symlinks=False) and not entry.name.endswith(".tmp"):
+                    st = entry.stat(follow_symlinks=False)
+                    entries.append((st.st_mtime, entry.path, st.st_size))
+            except OSError:
+                continue
+    total = sum(e[2] for e in entries)
+    freed = 0
+    # 一次淘汰到预算的 90%，避免每次写入都扫描目录
+    target = COVER_CACHE_MAX_BYTES * 0.9 if total > COVER_CACHE_MAX_BYTES else total
+    for _, path, size in sorted(entries):
+        if total - freed <= target:
+            break
+        try:
+            os.remove(path)
+            freed += size
+        except OSError:
+            pass
+    with _size_lock:
+        _total_bytes = total - freed
+    return freed
+
+
+async def _get(client: httpx.AsyncClient, url: str) -> httpx.Response:
+    """GET 并手动跟随重定向，每一跳的地址都必须是允许的封面链接。
+    返回尚未读取响应体的流式响应（调用方负责 aclose），响应体用 _read_capped 读取"""
+    for _ in range(COVER_MAX_REDIRECTS + 1):
+        r = await client.send(client.build_request("GET", url), stream=True)
+        if not r.is_redirect:
+            try:
+                r.raise_for_status()
+            except httpx.HTTPStatusError:
+                await r.aclose()
+                raise
+            return r
+        await r.aclose()
+        url = str(r.url.join(r.headers["location"]))
+        if not is_allowed(url):
+            raise ValueError("封面链接重定向到了不允许的地址")
+    raise ValueError("封面链接重定向次数过多")
+
+
+async def _read_capped(r: httpx.Response) -> bytes:
+    """读取响应体；Content-Length 或已读字节数超过 COVER_MAX_BYTES 时立即中止，不把超大响应读入内存"""
+    declared = r.headers.get("content-length", "")
+    if declared.isdigit() and int(declared) > COVER_MAX_BYTES:
+        raise ValueError("封面图片过大")
+    chunks, size = [], 0
+    async for chunk in r.aiter_bytes():
+        size += len(chunk)
+        if size > COVER_MAX_BYTES:
+            raise ValueError("封面图片过大")
+        chunks.append(chunk)
+    return b"".join(chunks)
+
+
+async def fetch_original(url: str) -> str:
+    """返回封面原图的本地缓存路径；未缓存时从 CDN 拉取。
+    上游失败抛 httpx.HTTPError，重定向到不允许的地址、内容不是图片或过大时抛 ValueError"""
+    url = url.strip()
+    key = _key(url)
+    try:
+        async with _lock_for(key):
+            path = _find_original(key)
+            if path:
+                _touch(path)
+                return path
+            async with httpx.AsyncClient(timeout=15.0) as client:
+                r = await _get(client, url)
+                try:
+                    content_type = r.headers.get("content-type", "")
+                    if "image/" not in content_type:
+                        raise ValueError("链接不是有效图片")
+                    content = await _read_capped(r)
+                finally:
+                    await r.aclose()
+            path = os.path.join(COVER_CACHE_DIR, key + _ext_for(content_type))
+            await asyncio.to_thread(_write, path, content)
+    finally:
+        _forget_lock(key)
+    await asyncio.to_thread(enforce_budget)
+    return path
+
+
+async def thumbnail(url: str, fmt: str) -> bytes:
+    """返回选择器缩略图（COVER_THUMB_WIDTH 宽，fmt 为 avif/webp/jpeg）；原图和缩略图都会缓存"""
+    name = f"{_key(url)}__w{COVER_THUMB_WIDTH}.{fmt}"
+    thumb = os.path.join(COVER_CACHE_DIR, name)
+    try:
+        async with _lock_for(name):
+            try:
+                with open(thumb, "rb") as f:
+                    data = f.read()
+                _touch(thumb)
+                return data
+            except OSError:
+                pass
+            original = await fetch_original(url)
+            await asyncio.to_thread(imaging.probe, original)
+            data = await imaging.run_in_worker(imaging.render_variant, original, COVER_THUMB_WIDTH, fmt)
+            await asyncio.to_thread(_write, thumb, data)
+    finally:
+        _forget_lock(name)
+    await asyncio.to_thread(enforce_budget)
+    return data
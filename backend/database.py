@@ -1,21 +1,136 @@
-from sqlalchemy import create_engine
+"""
+数据库连接：主库负责写入，可选的只读副本负责 GET 请求。
+
+副本地址用 DATABASE_REPLICA_URLS 配置（config.py 或环境变量，逗号分隔），未配置时读写都走主库。
+GET 接口依赖 get_read_db：按轮询选择副本；用户刚写入过（DB_PRIMARY_PIN_SECONDS 内）则仍走主库，
+保证写后立即读到自己的修改。固定状态放在客户端：main.py 中间件在写请求成功（2xx）后下发 cookie DB_PIN_COOKIE，
+值为「截止时间:签名」，签名绑定 user_id；各 worker 用同一密钥校验，不依赖进程内状态。
+
+DATABASE_URL 为 sqlite:/// 文件时使用单机配置：每个连接开启 WAL、synchronous=NORMAL 并设置
+mmap_size、cache_size、busy_timeout，连接池较小（SQLite 同时只有一个写入者，读者不阻塞写入）。
+"""
+import hashlib
+import hmac
+import itertools
+import os
+import threading
+import time
+
+from fastapi import Request
+from sqlalchemy import create_engine, event
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 
+import config
 from config import DATABASE_URL
 
-engine = create_engine(
-    DATABASE_URL,
-    pool_pre_ping=True,
-    pool_recycle=3600,
-    pool_size=10,
-    max_overflow=20,
-    pool_timeout=30,
-    echo=False
-)
+# 写入后该用户的读请求在多少秒内继续走主库（覆盖副本复制延迟）
+DB_PRIMARY_PIN_SECONDS = float(os.environ.get("DB_PRIMARY_PIN_SECONDS", 5))
+DB_PIN_COOKIE = "lf_db_pin"
+# 固定标记的签名密钥，所有 worker 必须相同；不配置时由 DATABASE_URL 派生
+DB_PIN_SECRET = os.environ.get("DB_PIN_SECRET") or hashlib.sha256(f"db-pin:{DATABASE_URL}".encode()).hexdigest()
+DATABASE_REPLICA_URLS = [
+    u.strip()
+    for u in (getattr(config, "DATABASE_REPLICA_URLS", None) or os.environ.get("DATABASE_REPLICA_URLS", "")).split(",")
+    if u.strip()
+]
+# SQLite 单机模式参数
+SQLITE_BUSY_TIMEOUT_MS = int(os.environ.get("SQLITE_BUSY_TIMEOUT_MS", 5000))
+SQLITE_CACHE_KB = int(os.environ.get("SQLITE_CACHE_KB", 64 * 1024))
+SQLITE_MMAP_SIZE = int(os.environ.get("SQLITE_MMAP_SIZE", 256 * 1024 ** 2))
+
+
+def is_sqlite(url) -> bool:
+    return str(url).startswith("sqlite")
+
+
+def _sqlite_pragmas(dbapi_conn, connection_record):
+    cur = dbapi_conn.cursor()
+    try:
+        cur.execute("PRAGMA journal_mode=WAL")
+        cur.execute("PRAGMA synchronous=NORMAL")
+        cur.execute(f"PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT_MS}")
+        cur.execute(f"PRAGMA cache_size=-{SQLITE_CACHE_KB}")
+        cur.execute(f"PRAGMA mmap_size={SQLITE_MMAP_SIZE}")
+        cur.execute("PRAGMA temp_store=MEMORY")
+    finally:
+        cur.close()
+
+
+def _create_sqlite_engine(url: str):
+    if url in ("sqlite://", "sqlite:///:memory:"):
+        # 内存库只存在于单个连接中，沿用 SQLAlchemy 默认连接池
+        return create_engine(url, connect_args={"check_same_thread": False}, echo=False)
+    e = create_engine(
+        url,
+        connect_args={"check_same_thread": False, "timeout": SQLITE_BUSY_TIMEOUT_MS / 1000},
+        pool_size=5,
+        max_overflow=5,
+        pool_timeout=30,
+        echo=False
+    )
+    event.listen(e, "connect", _sqlite_pragmas)
+    return e
+
+
+def _create_engine(url: str):
+    if is_sqlite(url):
+        return _create_sqlite_engine(url)
+    return create_engine(
+        url,
+        pool_pre_ping=True,
+        pool_recycle=3600,
+        pool_size=10,
+        max_overflow=20,
+        pool_timeout=30,
+        echo=False
+    )
+
+
+engine = _create_engine(DATABASE_URL)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 Base = declarative_base()
 
+replica_engines = [_create_engine(url) for url in DATABASE_REPLICA_URLS]
+_replica_sessions = [sessionmaker(autocommit=False, autoflush=False, bind=e) for e in replica_engines]
+_replica_cycle = itertools.cycle(range(len(_replica_sessions))) if _replica_sessions else None
+_cycle_lock = threading.Lock()
+
+def _pin_signature(user_id: str, until: str) -> str:
+    return hmac.new(DB_PIN_SECRET.encode(), f"{user_id}:{until}".encode(), hashlib.sha256).hexdigest()[:32]
+
+
+def pin_token(user_id: str):
+    """用户写入成功后调用：返回 DB_PRIMARY_PIN_SECONDS 后过期的固定标记（写入 cookie）；没有副本时返回 None"""
+    if not _replica_sessions or DB_PRIMARY_PIN_SECONDS <= 0:
+        return None
+    until = f"{time.time() + DB_PRIMARY_PIN_SECONDS:.3f}"
+    return f"{until}:{_pin_signature(user_id, until)}"
+
+
+def is_pinned(user_id: str, token) -> bool:
+    """token 是否为该用户签发且尚未过期的固定标记"""
+    until, _, sig = (token or "").partition(":")
+    try:
+        deadline = float(until)
+    except ValueError:
+        return False
+    return deadline > time.time() and hmac.compare_digest(sig, _pin_signature(user_id, until))
+
+
+def read_session(user_id: str = None, pin: str = None):
+    """只读会话：有副本且用户未固定到主库时用副本，否则用主库；pin 为请求带来的固定标记"""
+    if not _replica_sessions or (user_id and is_pinned(user_id, pin)):
+        return SessionLocal()
+    with _cycle_lock:
+        idx = next(_replica_cycle)
+    return _replica_sessions[idx]()
+
+
+def session_factories() -> list:
+    """主库和各只读副本的会话工厂（缓存预热需要分别预热每个库）"""
+    return [SessionLocal] + list(_replica_sessions)
+
 
 def get_db():
     db = SessionLocal()
@@ -23,3 +138,28 @@ def get_db():
         yield db
     finally:
         db.close()
+
+
+def get_read_db(request: Request):
+    """GET 接口使用的只读会话，不能在其中写入"""
+    db = read_session(getattr(request.state, "user_id", None), request.cookies.get(DB_PIN_COOKIE))
+    try:
+        yield db
+    finally:
+        db.close()
+
+
+def pool_stats() -> dict:
+    """各连接池状态：主库为 primary，副本为 replica_0、replica_1……"""
+    engines = [("primary", engine)] + [(f"replica_{i}", e) for i, e in enumerate(replica_engines)]
+    out = {}
+    for name, e in engines:
+        pool = e.pool
+        out[name] = {
+            "url": e.url.render_as_string(hide_password=True),
+            "size": pool.size() if hasattr(pool, "size") else None,
+            "checked_out": pool.checkedout() if hasattr(pool, "checkedout") else None,
+            "checked_in": pool.checkedin() if hasattr(pool, "checkedin") else None,
+            "overflow": pool.overflow() if hasattr(pool, "overflow") else None,
+        }
+    return out
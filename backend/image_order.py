@@ -0,0 +1,76 @@
+"""
+记录图片的排序：item_images.sort_order 是稀疏整数 rank，图片按 (sort_order, id) 排列。
+
+相邻图片之间留 RANK_GAP 的间隔：追加取最大 rank + RANK_GAP，插到最前取最小 rank - RANK_GAP，
+移到两张图片之间取两者的中间值，都只修改被移动 / 新增的一行，不再整体 +1 平移其他图片。
+同一位置反复插入把间隔用完（或老数据 sort_order 全为 0）时，先把这条记录的图片重新按 RANK_GAP 编号，
+这种整体改写只会偶尔发生。
+"""
+from typing import List, Optional
+
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from models import ItemImage
+
+RANK_GAP = 1024
+
+
+def _ordered(db: Session, item_id: int) -> List[ItemImage]:
+    return (
+        db.query(ItemImage)
+        .filter(ItemImage.item_id == item_id)
+        .order_by(ItemImage.sort_order, ItemImage.id)
+        .all()
+    )
+
+
+def append_rank(db: Session, item_id: int) -> int:
+    """追加到末尾的 rank；同一请求内连续追加多张时依次加 RANK_GAP"""
+    last = db.query(func.max(ItemImage.sort_order)).filter(ItemImage.item_id == item_id).scalar()
+    return (last or 0) + RANK_GAP
+
+
+def front_rank(db: Session, item_id: int) -> int:
+    """插到最前的 rank"""
+    first = db.query(func.min(ItemImage.sort_order)).filter(ItemImage.item_id == item_id).scalar()
+    return (first or 0) - RANK_GAP
+
+
+def renormalize(db: Session, item_id: int) -> List[ItemImage]:
+    """按当前顺序把这条记录的图片重新编号为 RANK_GAP, 2*RANK_GAP, ...（不提交），返回排好序的图片"""
+    images = _ordered(db, item_id)
+    for i, img in enumerate(images, 1):
+        if img.sort_order != i * RANK_GAP:
+            img.sort_order = i * RANK_GAP
+    db.flush()
+    return images
+
+
+def move(db: Session, item_id: int, image: ItemImage, after_id: Optional[int]) -> bool:
+    """把 image 移到 after_id 之后（None 表示移到最前），只改 image 一行（不提交）；after_id 不属于该记录时返回 False"""
+    for attempt in range(2):
+        others = [i for i in _ordered(db, item_id) if i.id != image.id]
+        if after_id is None:
+            pos = 0
+        else:
+            pos = next((n + 1 for n, i in enumerate(others) if i.id == after_id), None)
+            if pos is None:
+                return False
+        prev = others[pos - 1] if pos > 0 else None
+        nxt = others[pos] if pos < len(others) else None
+        if prev is None and nxt is None:
+            rank = RANK_GAP
+        elif prev is None:
+            rank = nxt.sort_order - RANK_GAP
+        elif nxt is None:
+            rank = prev.sort_order + RANK_GAP
+        elif nxt.sort_order - prev.sort_order >= 2:
+            rank = (prev.sort_order + nxt.sort_order) // 2
+        else:
+            # 间隔用完（或 rank 相同），整体重新编号后再算一次
+            renormalize(db, item_id)
+            continue
+        image.sort_order = rank
+        return True
+    raise RuntimeError("renormalize did not open a gap")
@@ -0,0 +1,386 @@
+"""
+图片处理：派生图生成、上传图片校验，以及限制内存的解码子进程。
+
+派生图：宽度请求（w × dpr）向上取整到固定档位，保证每张原图最多 len(WIDTH_BUCKETS)+1 个尺寸 × 3 种格式的缓存；
+JPEG 先用 draft() 让解码器直接按 1/2、1/4、1/8 缩小解码，再用 reduce() 做整数倍缩小，最后 LANCZOS 精确缩放；
+输出格式按浏览器 Accept 协商 AVIF / WebP / JPEG。
+
+校验：probe 只读文件头得到格式和尺寸，像素数超过 IMAGE_MAX_PIXELS 的图片在解码前就拒绝（防解压炸弹）；
+长边超过 IMAGE_INGEST_MAX_SIDE 的原图入库时先缩小。所有完整解码都放到 run_in_worker 的子进程里，
+Pillow 引擎的子进程用 RLIMIT_AS 限制内存，单张坏图最多让子进程失败，不会拖垮 API 进程。
+
+引擎：probe / render_variant / render_placeholder / downscale_original 由 IMAGE_ENGINE 选择的引擎实现，
+默认 PillowEngine；VipsEngine（vips_engine.py）流式解码并在加载时缩小，大图的耗时和峰值内存都低得多。
+雪碧图和整墙导出只处理小格子，仍固定用 Pillow 拼接。
+"""
+import asyncio
+import base64
+import io
+import logging
+import math
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Optional
+
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+import tracing
+
+try:
+    # 可选：安装 pillow-heif 后支持手机拍摄的 HEIC/HEIF
+    from pillow_heif import register_heif_opener
+    register_heif_opener()
+except ImportError:
+    pass
+
+logger = logging.getLogger("uvicorn.error")
+
+# 单张图片最大像素数，超过直接拒绝（Pillow 自身在 2 倍时抛 DecompressionBombError，作为兜底）
+IMAGE_MAX_PIXELS = int(os.environ.get("IMAGE_MAX_PIXELS", 50_000_000))
+# 原图长边超过该值时入库前缩小，0 表示不缩小
+IMAGE_INGEST_MAX_SIDE = int(os.environ.get("IMAGE_INGEST_MAX_SIDE", 4096))
+# 解码子进程数量和每个子进程的地址空间上限（字节），只对 Pillow 引擎生效：
+# libvips 的线程池和内存映射会预留远超实际占用的虚拟地址空间，限制地址空间会让正常转换失败
+IMAGE_WORKERS = int(os.environ.get("IMAGE_WORKERS", 2))
+IMAGE_WORKER_MAX_MEMORY = int(os.environ.get("IMAGE_WORKER_MAX_MEMORY", 1024 ** 3))
+
+Image.MAX_IMAGE_PIXELS = IMAGE_MAX_PIXELS
+
+# 可选宽度档位（像素），前端 srcset 也使用这些档位
+WIDTH_BUCKETS = (160, 320, 480, 640, 960, 1280)
+# 成就墙/年度墙等小图默认档位
+THUMB_WIDTHS = (160, 320, 640)
+
+# 低清占位图长边（像素），以 WebP data URI 形式随接口返回
+PLACEHOLDER_SIZE = int(os.environ.get("PLACEHOLDER_SIZE", 20))
+PLACEHOLDER_QUALITY = 30
+
+# 解码/缩放引擎：pillow（默认）、vips（需 pip install pyvips 和系统 libvips，见 vips_engine.py）、auto（装了 pyvips 就用 vips）
+IMAGE_ENGINE = os.environ.get("IMAGE_ENGINE", "pillow").strip().lower()
+
+# EXIF Orientation 标签
+ORIENTATION_TAG = 0x0112
+
+MEDIA_TYPES = {"avif": "image/avif", "webp": "image/webp", "jpeg": "image/jpeg"}
+# 各格式编码参数：原尺寸 WebP 保持原来的 quality=85
+SAVE_OPTIONS = {
+    "avif": {"format": "AVIF", "quality": 60},
+    "webp": {"format": "WEBP", "quality": 85, "method": 6},
+    "jpeg": {"format": "JPEG", "quality": 82, "optimize": True, "progressive": True},
+}
+
+
+class ImageRejected(ValueError):
+    """图片无法识别或超出尺寸限制"""
+
+
+def check_pixels(width: int, height: int):
+    if width * height > IMAGE_MAX_PIXELS:
+        raise ImageRejected(f"图片尺寸过大（{width}x{height}），上限 {IMAGE_MAX_PIXELS} 像素")
+
+
+# ---- 输出尺寸：各引擎都按旋转后的原图尺寸计算，同一张图不同引擎的输出宽高完全一致 ----
+
+def oriented_size(width: int, height: int, orientation: int) -> tuple:
+    """EXIF 方向 5~8（旋转 90°）时宽高互换"""
+    return (height, width) if orientation in (5, 6, 7, 8) else (width, height)
+
+
+def variant_size(width: int, height: int, target_width: Optional[int]) -> tuple:
+    """派生图尺寸：宽于 target_width 时等比缩小到该宽度（高度四舍五入），否则保持原尺寸（不放大）"""
+    if not target_width or width <= target_width:
+        return width, height
+    return target_width, max(1, round(height * target_width / width))
+
+
+def fit_size(width: int, height: int, box: int) -> tuple:
+    """等比缩小到 box×box 以内（不放大），取宽高比误差最小的整数尺寸（与 Pillow thumbnail 相同）"""
+    if width <= box and height <= box:
+        return width, height
+    aspect = width / height
+
+    def closest(value, key):
+        return max(min(math.floor(value), math.ceil(value), key=key), 1)
+
+    if width >= height:
+        return box, closest(box / aspect, lambda n: abs(aspect - box / n) if n else math.inf)
+    return closest(box * aspect, lambda n: abs(aspect - n / box)), box
+
+
+def _orientation(img) -> int:
+    return img.getexif().get(ORIENTATION_TAG, 1)
+
+
+def _draft(img, size: tuple):
+    """JPEG 让 libjpeg 按 DCT 缩放直接解码出不小于 size（旋转后尺寸）的图，避免解码全尺寸；
+    draft 作用于旋转前的像素，EXIF 方向 5~8（竖拍照片）时目标框宽高互换"""
+    if img.format == "JPEG":
+        img.draft("RGB", oriented_size(*size, _orientation(img)))
+
+
+def _flatten(img):
+    """透明部分铺白底，转为 RGB（JPEG / 占位图）"""
+    if img.mode in ("RGBA", "LA", "P"):
+        rgba = img.convert("RGBA")
+        out = Image.new("RGB", rgba.size, (255, 255, 255))
+        out.paste(rgba, mask=rgba.split()[-1])
+        return out
+    return img.convert("RGB")
+
+
+def _resize(img, size: tuple, resample, reducing_gap: float = 2.0):
+    """缩放到 size：先 reduce() 整数倍缩小，再精确缩放"""
+    if img.size == size:
+        return img
+    factor = min(img.width // (size[0] * int(reducing_gap)), img.height // (size[1] * int(reducing_gap)))
+    if factor >= 2:
+        img = img.reduce(factor)
+    return img.resize(size, resample)
+
+
+class PillowEngine:
+    """默认引擎：Pillow 解码。JPEG 用 draft() 按 DCT 缩放解码，其它格式需完整解码后再缩小"""
+
+    name = "pillow"
+
+    def avif_supported(self) -> bool:
+        """当前 Pillow 是否能编码 AVIF（Pillow 11.3+ 内置，或安装了 pillow-avif-plugin）"""
+        Image.init()
+        return "AVIF" in Image.SAVE
+
+    def _open(self, file_path: str):
+        """打开图片（只读文件头）并校验格式和像素数"""
+        try:
+            img = Image.open(file_path)
+        except Image.DecompressionBombError:
+            raise ImageRejected(f"图片尺寸过大，上限 {IMAGE_MAX_PIXELS} 像素")
+        except (UnidentifiedImageError, OSError):
+            raise ImageRejected("无法识别的图片格式")
+        try:
+            check_pixels(*img.size)
+        except ImageRejected:
+            img.close()
+            raise
+        return img
+
+    def probe(self, file_path: str):
+        with self._open(file_path) as img:
+            return img.format, img.width, img.height
+
+    def render_variant(self, file_path: str, width: Optional[int], fmt: str) -> bytes:
+        with self._open(file_path) as img:
+            size = variant_size(*oriented_size(*img.size, _orientation(img)), width)
+            if width:
+                _draft(img, size)
+            img.load()
+            img = _resize(ImageOps.exif_transpose(img), size, Image.LANCZOS)
+            if fmt == "jpeg":
+                img = _flatten(img)
+            else:
+                img = img.convert("RGBA" if img.mode in ("RGBA", "LA", "P") else "RGB")
+            opts = dict(SAVE_OPTIONS[fmt])
+            buf = io.BytesIO()
+            img.save(buf, opts.pop("format"), **opts)
+            return buf.getvalue()
+
+    def render_placeholder(self, file_path: str) -> bytes:
+        with self._open(file_path) as img:
+            size = fit_size(*oriented_size(*img.size, _orientation(img)), PLACEHOLDER_SIZE)
+            _draft(img, (PLACEHOLDER_SIZE * 8, PLACEHOLDER_SIZE * 8))
+            img.load()
+            img = _flatten(_resize(ImageOps.exif_transpose(img), size, Image.BILINEAR))
+            buf = io.BytesIO()
+            img.save(buf, "WEBP", quality=PLACEHOLDER_QUALITY)
+        return buf.getvalue()
+
+    def downscale_original(self, file_path: str):
+        with self._open(file_path) as img:
+            fmt = img.format
+            if getattr(img, "is_animated", False):
+                # 动图逐帧缩放代价高且容易丢帧，保留原文件
+                return
+            size = fit_size(*oriented_size(*img.size, _orientation(img)), IMAGE_INGEST_MAX_SIDE)
+            _draft(img, size)
+            img.load()
+            img = _resize(ImageOps.exif_transpose(img), size, Image.LANCZOS, reducing_gap=3.0)
+            opts = {"quality": 90} if fmt in ("JPEG", "WEBP") else {}
+            if fmt == "JPEG" and img.mode not in ("RGB", "L"):
+                img = img.convert("RGB")
+            if fmt not in Image.SAVE:
+                fmt, opts = "JPEG", {"quality": 90}
+                img = img.convert("RGB")
+            tmp = file_path + ".resize"
+            img.save(tmp, fmt, **opts)
+        os.replace(tmp, file_path)
+
+
+def load_engine(name: str):
+    """按名称创建引擎；vips 不可用（未安装 pyvips 或缺少 libvips）时退回 Pillow"""
+    if name in ("vips", "auto"):
+        try:
+            from vips_engine import VipsEngine
+            return VipsEngine()
+        except (ImportError, OSError) as e:
+            if name == "vips":
+                logger.warning("IMAGE_ENGINE=vips but pyvips is unavailable (%s), falling back to Pillow", e)
+    elif name != "pillow":
+        logger.warning("unknown IMAGE_ENGINE %r, using Pillow", name)
+    return PillowEngine()
+
+
+_engine = None
+
+
+def get_engine():
+    """当前进程使用的引擎（API 进程和每个解码子进程各自按 IMAGE_ENGINE 创建一次）"""
+    global _engine
+    if _engine is None:
+        _engine = load_engine(IMAGE_ENGINE)
+    return _engine
+
+
+def avif_supported() -> bool:
+    return get_engine().avif_supported()
+
+
+def snap_width(w: Optional[int], dpr: Optional[float] = None) -> Optional[int]:
+    """把请求宽度（乘以 dpr）向上取整到档位；不传宽度返回 None 表示原尺寸"""
+    if not w or w <= 0:
+        return None
+    target = w * min(max(dpr or 1.0, 1.0), 3.0)
+    for bucket in WIDTH_BUCKETS:
+        if bucket >= target:
+            return bucket
+    return WIDTH_BUCKETS[-1]
+
+
+def negotiate_format(accept: Optional[str]) -> str:
+    """按 Accept 选择输出格式：声明支持 AVIF 优先，其次 WebP；未声明任何图片类型时保持 WebP（兼容旧行为）"""
+    accept = (accept or "").lower()
+    if "image/avif" in accept and avif_supported():
+        return "avif"
+    if "image/webp" in accept or "image/" not in accept:
+        return "webp"
+    return "jpeg"
+
+
+def render_variant(file_path: str, width: Optional[int], fmt: str) -> bytes:
+    """生成派生图：width 为 None 时保持原尺寸，否则缩放到该宽度（不放大）"""
+    return get_engine().render_variant(file_path, width, fmt)
+
+
+def render_placeholder(file_path: str) -> str:
+    """生成低清占位图（长边 PLACEHOLDER_SIZE 的 WebP），返回 data URI，通常只有几百字节"""
+    data = get_engine().render_placeholder(file_path)
+    return "data:image/webp;base64," + base64.b64encode(data).decode("ascii")
+
+
+def probe(file_path: str):
+    """只读文件头，返回 (格式, 宽, 高)；无法识别或像素数超限时抛 ImageRejected"""
+    return get_engine().probe(file_path)
+
+
+def needs_downscale(width: int, height: int) -> bool:
+    return IMAGE_INGEST_MAX_SIDE > 0 and max(width, height) > IMAGE_INGEST_MAX_SIDE
+
+
+def downscale_original(file_path: str):
+    """把原图缩小到长边不超过 IMAGE_INGEST_MAX_SIDE，按原格式原地写回（先写临时文件再替换）"""
+    get_engine().downscale_original(file_path)
+
+
+def _worker_init():
+    """解码子进程初始化：Pillow 引擎限制地址空间，超限时解码抛 MemoryError 而不是占满整机内存"""
+    Image.MAX_IMAGE_PIXELS = IMAGE_MAX_PIXELS
+    if IMAGE_WORKER_MAX_MEMORY <= 0 or not isinstance(get_engine(), PillowEngine):
+        return
+    try:
+        import resource
+        resource.setrlimit(resource.RLIMIT_AS, (IMAGE_WORKER_MAX_MEMORY, IMAGE_WORKER_MAX_MEMORY))
+    except (ImportError, ValueError, OSError):
+        pass
+
+
+_pool = None
+
+
+def _get_pool():
+    global _pool
+    if _pool is None:
+        _pool = ProcessPoolExecutor(
+            max_workers=max(IMAGE_WORKERS, 1),
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_worker_init,
+            max_tasks_per_child=200,
+        )
+    return _pool
+
+
+async def run_in_worker(fn, *args):
+    """在限制内存的子进程中执行图片解码任务；子进程崩溃时重建进程池并抛 ImageRejected"""
+    global _pool
+    loop = asyncio.get_running_loop()
+    try:
+        with tracing.span(f"image.{fn.__name__}"):
+            return await loop.run_in_executor(_get_pool(), fn, *args)
+    except BrokenProcessPool:
+        logger.warning("image worker crashed while running %s%s", fn.__name__, args)
+        _pool = None
+        raise ImageRejected("图片解码失败")
+    except (MemoryError, Image.DecompressionBombError) as e:
+        raise ImageRejected(f"图片解码超出限制: {e}")
+
+
+def shutdown_workers():
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
+
+
+def _open_tile(file_path: Optional[str], size, mode: str, bg):
+    """读取一张图并缩放为 size 大小的格子：cover 裁剪铺满，contain 完整显示并用 bg 填充；读取失败返回纯色格子"""
+    tile = Image.new("RGB", size, bg)
+    if not file_path:
+        return tile
+    try:
+        with Image.open(file_path) as img:
+            if img.format == "JPEG":
+                img.draft("RGB", size)
+            img.load()
+            img = ImageOps.exif_transpose(img).convert("RGB")
+            if mode == "cover":
+                return ImageOps.fit(img, size, Image.LANCZOS)
+            img = ImageOps.contain(img, size, Image.LANCZOS)
+            tile.paste(img, ((size[0] - img.width) // 2, (size[1] - img.height) // 2))
+    except Exception as e:
+        logger.warning("tile render failed for %s: %s", file_path, e)
+    return tile
+
+
+def render_atlas(paths: list, tile: int, cols: int, out_path: str):
+    """把若干张图裁成 tile×tile 的正方形，按行拼成一张 WebP 雪碧图"""
+    rows = max(1, -(-len(paths) // cols))
+    sheet = Image.new("RGB", (cols * tile, rows * tile), (0, 0, 0))
+    for n, path in enumerate(paths):
+        sheet.paste(_open_tile(path, (tile, tile), "cover", (0, 0, 0)), ((n % cols) * tile, (n // cols) * tile))
+    tmp = out_path + ".tmp"
+    sheet.save(tmp, "WEBP", quality=80, method=4)
+    os.replace(tmp, out_path)
+
+
+def render_wall_export(paths: list, tile: int, cols: int, gap: int, bg: str, out_path: str):
+    """成就墙整墙导出：每张图完整显示在 tile×tile 的格子中，格子间距 gap，背景色 bg，输出渐进式 JPEG"""
+    rows = max(1, -(-len(paths) // cols))
+    width = cols * tile + (cols + 1) * gap
+    height = rows * tile + (rows + 1) * gap
+    canvas = Image.new("RGB", (width, height), bg)
+    for n, path in enumerate(paths):
+        x = gap + (n % cols) * (tile + gap)
+        y = gap + (n // cols) * (tile + gap)
+        canvas.paste(_open_tile(path, (tile, tile), "contain", bg), (x, y))
+    tmp = out_path + ".tmp"
+    canvas.save(tmp, "JPEG", quality=85, optimize=True, progressive=True)
+    os.replace(tmp, out_path)
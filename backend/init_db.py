@@ -1,7 +1,10 @@
-"""创建表结构。若已有库且缺 user_id，请先执行 migrate SQL 或 migrate_add_user_id.py。"""
+"""创建表结构，并按 migrations.py 执行尚未执行的迁移（补列、生成列、在线建索引）。若已有库且缺 user_id，请先执行 migrate SQL 或 migrate_add_user_id.py。"""
 from database import engine, Base
-from models import Category, Item, ItemImage  # noqa: F401
+from models import ArchivedItem, Category, Item, ItemImage, Tombstone, YearSnapshot  # noqa: F401
+import migrations
+
 
 if __name__ == "__main__":
     Base.metadata.create_all(bind=engine)
+    migrations.run(engine)
     print("表结构创建完成。")
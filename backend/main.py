@@ -1,18 +1,35 @@
-from fastapi import FastAPI, Query
+from fastapi import FastAPI, Query, Request
 from fastapi.staticfiles import StaticFiles
 from fastapi.responses import Response
 from fastapi.middleware.cors import CORSMiddleware
 from starlette.middleware.base import BaseHTTPMiddleware
+import asyncio
 import logging
+import math
 import os
-import io
 import httpx
+from typing import Optional
 
-from routers import categories, items
+from routers import categories, items, sync, wall, bootstrap, upload_sessions
 from config import UPLOAD_DIR
-
-JIKAN_BASE = "https://api.jikan.moe/v4"
-BANGUMI_BASE = "https://api.bgm.tv"
+import webp_cache
+from webp_cache import webp_cache_path
+import storage_gc
+import imaging
+import cover_cache
+import bangumi_catalog
+import year_snapshot
+import resumable
+import archive
+import cache_warmer
+import tracing
+import database
+from rate_limit import RateLimitMiddleware
+from compression import CompressionMiddleware
+
+# 可通过环境变量指向本地桩服务（压测时用 bench/stub_upstream.py，避免打到真实上游）
+JIKAN_BASE = os.environ.get("JIKAN_BASE", "https://api.jikan.moe/v4")
+BANGUMI_BASE = os.environ.get("BANGUMI_BASE", "https://api.bgm.tv")
 BANGUMI_USER_AGENT = "Logfolio/1.0 (https://github.com/your-repo; cover search)"
 
 # 设为 True 时在控制台打印每个 /api 请求的 X-User-ID，便于排查「不同用户互相看见」：确认是否按用户变化
@@ -27,12 +44,27 @@ class XUserIDMiddleware(BaseHTTPMiddleware):
         request.state.user_id = raw.strip() or "default_user"
         if LOG_X_USER_ID and request.url.path.startswith("/api/"):
             logger.info(f"[X-User-ID] path={request.url.path} -> user_id={request.state.user_id!r}")
-        return await call_next(request)
+        response = await call_next(request)
+        if request.method not in ("GET", "HEAD", "OPTIONS") and 200 <= response.status_code < 300:
+            # 写入成功后短时间内该用户的读请求走主库，避免读到副本上的旧数据；标记随 cookie 带给任意 worker
+            token = database.pin_token(request.state.user_id)
+            if token:
+                response.set_cookie(
+                    database.DB_PIN_COOKIE, token, max_age=math.ceil(database.DB_PRIMARY_PIN_SECONDS),
+                    path="/api", httponly=True, samesite="lax",
+                )
+        return response
 
 
 app = FastAPI(title="Logfolio API", version="1.0.0", description="Logfolio 后端 API 服务")
 
+# 后添加的中间件在外层：CompressionMiddleware 压缩最终响应，TracingMiddleware 记录请求，
+# XUserIDMiddleware 写入 user_id，RateLimitMiddleware 再按用户限流
+app.add_middleware(RateLimitMiddleware)
 app.add_middleware(XUserIDMiddleware)
+app.add_middleware(tracing.TracingMiddleware)
+tracing.install()
+app.add_middleware(CompressionMiddleware)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],  # 生产环境建议指定具体的前端域名
@@ -44,63 +76,147 @@ app.add_middleware(
 # 只包含 API 路由
 app.include_router(categories.router)
 app.include_router(items.router)
+app.include_router(sync.router)
+app.include_router(wall.router)
+app.include_router(bootstrap.router)
+app.include_router(upload_sessions.router)
+
+
+@app.on_event("startup")
+async def start_storage_gc():
+    """按 GC_INTERVAL_SECONDS 在后台定期回收孤儿文件和 WebP 缓存"""
+    if storage_gc.GC_INTERVAL_SECONDS > 0:
+        asyncio.create_task(storage_gc.gc_loop())
+
+
+@app.on_event("startup")
+async def start_tombstone_purge():
+    """按 SYNC_PURGE_INTERVAL_SECONDS 定期清理过期的同步删除标记（与存储回收无关）"""
+    if sync.SYNC_PURGE_INTERVAL_SECONDS > 0:
+        asyncio.create_task(sync.purge_loop())
+
+
+@app.on_event("startup")
+async def start_webp_cache():
+    """启动时扫描 WebP 缓存目录建立索引，并定期与其它 worker 同步"""
+    await asyncio.to_thread(webp_cache.build_index)
+    asyncio.create_task(webp_cache.persist_loop())
 
 
-# WebP 缓存目录：首次转换后写入，后续直接读文件，避免重复转换
-WEBP_CACHE_DIR = os.path.join(UPLOAD_DIR, ".webp_cache")
+@app.on_event("startup")
+async def start_year_snapshot():
+    """后台重建写入后失效的年度回顾快照"""
+    asyncio.create_task(year_snapshot.rebuild_loop())
 
 
-def _webp_cache_path(source_path: str) -> str:
-    """源文件路径对应的 WebP 缓存文件路径（含扩展名区分 a.jpg / a.png）"""
-    name = os.path.basename(source_path)
-    base, ext = os.path.splitext(name)
-    ext = (ext or "").lstrip(".")
-    safe_base = "".join(c if c.isalnum() or c in "-_." else "_" for c in base).strip(".") or "img"
-    safe_ext = "".join(c if c.isalnum() else "_" for c in ext) or "img"
-    return os.path.join(WEBP_CACHE_DIR, f"{safe_base}_{safe_ext}.webp")
+@app.on_event("startup")
+async def start_upload_session_expiry():
+    """定期删除过期的断点续传会话"""
+    asyncio.create_task(resumable.expire_loop())
+
+
+@app.on_event("startup")
+async def start_archive():
+    """定期把到期的已完成记录移入归档表"""
+    if archive.ARCHIVE_AFTER_YEARS > 0 and archive.ARCHIVE_INTERVAL_SECONDS > 0:
+        asyncio.create_task(archive.archive_loop())
+
+
+@app.on_event("startup")
+async def start_cache_warm():
+    """部署后预热活跃用户的墙查询和派生图（在 WebP 缓存索引建立之后）"""
+    if cache_warmer.WARM_ON_STARTUP:
+        asyncio.create_task(cache_warmer.startup_warm())
+
+
+@app.on_event("startup")
+async def start_trace_export():
+    """定期导出采样请求的追踪数据"""
+    asyncio.create_task(tracing.export_loop())
+
+
+@app.on_event("shutdown")
+def stop_webp_cache():
+    webp_cache.save_index()
+    imaging.shutdown_workers()
+    try:
+        tracing.flush()
+    except Exception as e:
+        logger.warning("trace export failed: %s", e)
 
 
 @app.get("/api/serve-webp/{path:path}")
-async def serve_webp(path: str):
-    """将上传目录中的图片以 WebP 格式返回；首次转换后写入磁盘缓存，后续直接读缓存"""
+async def serve_webp(
+    path: str,
+    request: Request,
+    w: Optional[int] = Query(None, ge=1, le=4096, description="显示宽度（CSS 像素），会向上取整到固定档位"),
+    dpr: Optional[float] = Query(None, gt=0, le=4, description="设备像素比，与 w 相乘后取档位"),
+):
+    """返回上传图片的派生图：按 w/dpr 缩放，按 Accept 协商 AVIF/WebP/JPEG；首次生成后写入磁盘缓存，后续直接读缓存"""
     if not path or ".." in path or path.startswith("/"):
         return Response(status_code=400)
     name = os.path.basename(path)
     file_path = os.path.join(UPLOAD_DIR, name)
+    width = imaging.snap_width(w, dpr)
+    fmt = imaging.negotiate_format(request.headers.get("accept"))
+    headers = {"Vary": "Accept", "Cache-Control": "public, max-age=31536000, immutable"}
+    cache_path = webp_cache_path(file_path, width, fmt)
+    # 命中只查内存索引，不 stat 源文件/缓存文件
+    with tracing.span("webp_cache.get"):
+        data = webp_cache.get(cache_path)
+    if data is not None:
+        return Response(content=data, media_type=imaging.MEDIA_TYPES[fmt], headers=headers)
     if not os.path.isfile(file_path):
         return Response(status_code=404)
-    cache_path = _webp_cache_path(file_path)
-    src_mtime = os.path.getmtime(file_path)
-    # 有缓存且缓存不旧于源文件则直接返回
-    if os.path.isfile(cache_path) and os.path.getmtime(cache_path) >= src_mtime:
-        try:
-            with open(cache_path, "rb") as f:
-                return Response(content=f.read(), media_type="image/webp")
-        except Exception as e:
-            logger.warning("serve_webp read cache failed for %s: %s", name, e)
     try:
-        from PIL import Image
-        with Image.open(file_path) as img:
-            img.load()
-            if img.mode in ("RGBA", "P"):
-                img = img.convert("RGBA")
-            else:
-                img = img.convert("RGB")
-            buf = io.BytesIO()
-            img.save(buf, "WEBP", quality=85, method=6)
-            data = buf.getvalue()
-        os.makedirs(WEBP_CACHE_DIR, exist_ok=True)
-        try:
-            with open(cache_path, "wb") as f:
-                f.write(data)
-        except Exception as e:
-            logger.warning("serve_webp write cache failed for %s: %s", name, e)
-        return Response(content=data, media_type="image/webp")
+        # 先只读文件头检查尺寸，再在限制内存的子进程中解码，超大/损坏图片不会拖垮 API 进程
+        with tracing.span("image.probe"):
+            await asyncio.to_thread(imaging.probe, file_path)
+        data = await imaging.run_in_worker(imaging.render_variant, file_path, width, fmt)
+        with tracing.span("webp_cache.put", bytes=len(data)):
+            webp_cache.put(cache_path, data)
+        return Response(content=data, media_type=imaging.MEDIA_TYPES[fmt], headers=headers)
+    except imaging.ImageRejected as e:
+        logger.warning("serve_webp rejected %s: %s", name, e)
+        return Response(status_code=422)
     except Exception as e:
         logger.warning("serve_webp failed for %s: %s", name, e)
         return Response(status_code=500)
 
 
+@app.get("/api/db/pool-stats")
+async def db_pool_stats():
+    """主库和只读副本的连接池状态"""
+    return database.pool_stats()
+
+
+@app.get("/api/webp-cache/stats")
+async def webp_cache_stats():
+    """WebP 缓存指标：命中率、条目数、占用字节、淘汰次数"""
+    return webp_cache.stats()
+
+
+@app.get("/api/cover-proxy")
+async def cover_proxy(request: Request, url: str = Query(..., min_length=1)):
+    """封面搜索结果缩略图代理：只允许 MAL / Bangumi CDN，原图与缩略图缓存在本地，每个远程封面只拉取一次"""
+    if not cover_cache.is_allowed(url):
+        return Response(status_code=400)
+    fmt = imaging.negotiate_format(request.headers.get("accept"))
+    try:
+        data = await cover_cache.thumbnail(url, fmt)
+    except httpx.HTTPError as e:
+        logger.warning("cover_proxy fetch failed for %s: %s", url, e)
+        return Response(status_code=502)
+    except (ValueError, imaging.ImageRejected) as e:
+        logger.warning("cover_proxy rejected %s: %s", url, e)
+        return Response(status_code=422)
+    return Response(
+        content=data,
+        media_type=imaging.MEDIA_TYPES[fmt],
+        headers={"Vary": "Accept", "Cache-Control": "public, max-age=604800"},
+    )
+
+
 # 提供上传文件的静态访问（如果需要）
 if os.path.exists(UPLOAD_DIR):
     app.mount("/api/uploads", StaticFiles(directory=UPLOAD_DIR), name="uploads")
@@ -131,13 +247,23 @@ async def anime_search(
     q: str = Query(..., min_length=1),
     type: str = Query("both", regex="^(anime|manga|both|game|all)$"),
     page: int = Query(1, ge=1),
-    source: str = Query("both", regex="^(mal|bangumi|both)$"),
+    source: str = Query("both", regex="^(mal|bangumi|both|local)$"),
 ):
-    """搜索动漫/漫画/游戏封面：type=game 仅 Bangumi 游戏，all=动漫+漫画+游戏"""
+    """搜索动漫/漫画/游戏封面：type=game 仅 Bangumi 游戏，all=动漫+漫画+游戏；
+    source=local 先查本地 Bangumi 条目库（见 bangumi_catalog.py），无结果时再按 both 请求上游"""
     items_list = []
     has_next_page = False
     limit_per_page = 24
 
+    if source == "local":
+        types = {"anime": (2,), "manga": (1,), "both": (2, 1), "game": (4,), "all": (2, 1, 4)}[type]
+        local = await asyncio.to_thread(
+            bangumi_catalog.search, q, types, limit_per_page + 1, (page - 1) * limit_per_page
+        )
+        if local:
+            return {"data": local[:limit_per_page], "has_next_page": len(local) > limit_per_page, "source": "local"}
+        source = "both"
+
     async def search_bangumi():
         nonlocal has_next_page
         if source in ("bangumi", "both") and type != "anime" and type != "manga":
@@ -214,7 +340,6 @@ async def anime_search(
                 logging.getLogger("uvicorn.error").warning("Jikan manga search failed: %s", e)
         return []
 
-    import asyncio
     results = await asyncio.gather(search_bangumi(), search_mal_anime(), search_mal_manga())
     for r in results:
         items_list.extend(r)
@@ -0,0 +1,260 @@
+"""
+版本化的表结构迁移：schema_migrations 表记录已执行的版本，init_db.py 按顺序执行尚未执行的迁移。
+
+新增迁移：在文件末尾用 @migration(版本号, 说明) 注册一个接收连接的函数；函数需可重复执行（先检查再修改），
+新库由 create_all 建成最新结构后同样会跑一遍迁移，只补上 create_all 不负责的部分（如 SQLite 全文索引）。
+MySQL 下索引用 ALGORITHM=INPLACE, LOCK=NONE 在线创建，建索引期间不阻塞读写；SQLite 直接 CREATE INDEX。
+热点查询是否走索引用 query_plans.py 检查。
+
+用法（在 backend/ 下）：
+    python migrations.py            # 执行待执行的迁移
+    python migrations.py --status   # 查看各迁移是否已执行
+"""
+import argparse
+from datetime import datetime
+
+from sqlalchemy import Column, DateTime, MetaData, String, Table, bindparam, inspect, select, text
+from sqlalchemy.schema import CreateIndex
+
+from database import engine as default_engine, Base
+from models import ArchivedItem, Category, IdSequence, Item, ItemImage, Tombstone, YearSnapshot, sync_item_sequence  # noqa: F401
+import sqlite_search
+from titles import title_key
+
+schema_migrations = Table(
+    "schema_migrations", MetaData(),
+    Column("version", String(32), primary_key=True),
+    Column("description", String(200), nullable=False),
+    Column("applied_at", DateTime, nullable=False),
+)
+
+# 按注册顺序执行：{"version", "description", "fn", "columns", "indexes"}
+MIGRATIONS = []
+
+
+class Deferred(Exception):
+    """迁移暂时无法完成（如当前 SQLite 缺少所需扩展）：回滚、不记录版本，下次执行迁移时重试"""
+
+
+def migration(version: str, description: str, columns=(), indexes=()):
+    """注册迁移；columns / indexes 为该迁移负责创建的列和索引，基线迁移不会提前以普通方式创建它们"""
+    def register(fn):
+        MIGRATIONS.append({
+            "version": version, "description": description, "fn": fn,
+            "columns": set(columns), "indexes": set(indexes),
+        })
+        return fn
+    return register
+
+
+def _find_index(name: str):
+    for table in Base.metadata.sorted_tables:
+        for idx in table.indexes:
+            if idx.name == name:
+                return idx
+    raise KeyError(name)
+
+
+def create_index_online(conn, name: str) -> bool:
+    """按模型中的定义创建索引（已存在则跳过），返回是否新建"""
+    idx = _find_index(name)
+    if name in {i["name"] for i in inspect(conn).get_indexes(idx.table.name)}:
+        return False
+    ddl = str(CreateIndex(idx).compile(dialect=conn.dialect))
+    if conn.dialect.name == "mysql":
+        cols = ddl[ddl.index("(", ddl.index(" ON ")):]
+        conn.execute(text(f"ALTER TABLE {idx.table.name} ADD INDEX {name} {cols}, ALGORITHM=INPLACE, LOCK=NONE"))
+    else:
+        conn.execute(text(ddl))
+    print(f"已创建索引 {name}")
+    return True
+
+
+def _has_column(conn, table: str, column: str) -> bool:
+    return column in {c["name"] for c in inspect(conn).get_columns(table)}
+
+
+def run(engine=None) -> list:
+    """执行所有未执行的迁移，返回本次执行的版本号"""
+    engine = engine or default_engine
+    schema_migrations.create(engine, checkfirst=True)
+    with engine.connect() as conn:
+        applied = set(conn.execute(select(schema_migrations.c.version)).scalars())
+    done = []
+    for m in MIGRATIONS:
+        if m["version"] in applied:
+            continue
+        try:
+            with engine.begin() as conn:
+                m["fn"](conn)
+                conn.execute(schema_migrations.insert().values(
+                    version=m["version"], description=m["description"], applied_at=datetime.utcnow(),
+                ))
+        except Deferred as e:
+            print(f"暂缓迁移 {m['version']}（下次重试）: {e}")
+            continue
+        print(f"已执行迁移 {m['version']}: {m['description']}")
+        done.append(m["version"])
+    return done
+
+
+def status(engine=None) -> list:
+    """[(版本号, 说明, 执行时间或 None)]"""
+    engine = engine or default_engine
+    applied = {}
+    if inspect(engine).has_table("schema_migrations"):
+        with engine.connect() as conn:
+            applied = dict(conn.execute(select(schema_migrations.c.version, schema_migrations.c.applied_at)).all())
+    return [(m["version"], m["description"], applied.get(m["version"])) for m in MIGRATIONS]
+
+
+# ---- 迁移 ----
+
+# 新增列补齐后用已有列回填，保证增量同步不会漏掉老数据
+BACKFILL = {
+    ("categories", "updated_at"): "created_at",
+    ("items", "updated_at"): "created_at",
+    ("item_images", "updated_at"): "upload_time",
+}
+
+
+@migration("0001", "补齐引入迁移之前新增的列和索引")
+def _baseline(conn):
+    # 后续迁移负责的列和索引不在这里创建
+    owned_columns = set().union(*(m["columns"] for m in MIGRATIONS))
+    owned_indexes = set().union(*(m["indexes"] for m in MIGRATIONS))
+    insp = inspect(conn)
+    for table in Base.metadata.sorted_tables:
+        if not insp.has_table(table.name):
+            continue
+        existing_cols = {c["name"] for c in insp.get_columns(table.name)}
+        for col in table.columns:
+            if col.name in existing_cols or (table.name, col.name) in owned_columns:
+                continue
+            col_type = col.type.compile(dialect=conn.dialect)
+            conn.execute(text(f"ALTER TABLE {table.name} ADD COLUMN {col.name} {col_type}"))
+            print(f"已添加列 {table.name}.{col.name}")
+            source = BACKFILL.get((table.name, col.name))
+            if source:
+                conn.execute(text(f"UPDATE {table.name} SET {col.name} = {source} WHERE {col.name} IS NULL"))
+        existing_idx = {i["name"] for i in insp.get_indexes(table.name)}
+        for idx in table.indexes:
+            if idx.name not in existing_idx and idx.name not in owned_indexes:
+                idx.create(conn)
+                print(f"已创建索引 {idx.name}")
+
+
+@migration("0002", "SQLite 记录全文索引（MySQL 下跳过）")
+def _sqlite_fts(conn):
+    if conn.dialect.name == "sqlite" and not sqlite_search.ensure(conn):
+        # 不记录版本：换用支持 FTS5 trigram 的 SQLite 后再执行迁移即可建索引
+        raise Deferred("SQLite 不支持 FTS5 trigram，搜索暂用 LIKE")
+
+
+@migration("0003", "items.due_time_is_null 生成列", columns=[("items", "due_time_is_null")])
+def _due_time_is_null(conn):
+    if _has_column(conn, "items", "due_time_is_null"):
+        return
+    if conn.dialect.name == "mysql":
+        # 虚拟列只改元数据，不重建表
+        conn.execute(text(
+            "ALTER TABLE items ADD COLUMN due_time_is_null TINYINT(1) AS (due_time IS NULL) VIRTUAL, "
+            "ALGORITHM=INPLACE, LOCK=NONE"
+        ))
+    else:
+        conn.execute(text("ALTER TABLE items ADD COLUMN due_time_is_null BOOLEAN GENERATED ALWAYS AS (due_time IS NULL) VIRTUAL"))
+    print("已添加列 items.due_time_is_null")
+
+
+HOT_INDEXES = (
+    "ix_items_todos",
+    "ix_items_user_completed_created",
+    "ix_items_user_completed_cat_created",
+    "ix_item_images_item_sort",
+    "ix_categories_user_created",
+)
+
+
+@migration("0004", "热点查询覆盖索引（待办、记录列表、成就墙、图片排序、分类列表）", indexes=HOT_INDEXES)
+def _hot_indexes(conn):
+    for name in HOT_INDEXES:
+        create_index_online(conn, name)
+
+
+@migration("0005", "冷热分层：归档表 items_archive，去掉 item_images.item_id 外键")
+def _archive_tier(conn):
+    ArchivedItem.__table__.create(conn, checkfirst=True)
+    if conn.dialect.name == "mysql":
+        # 记录移入归档表时图片行不动，外键会阻止从 items 删除
+        for fk in inspect(conn).get_foreign_keys("item_images"):
+            if fk["referred_table"] == "items":
+                conn.execute(text(f"ALTER TABLE item_images DROP FOREIGN KEY {fk['name']}"))
+                print(f"已删除外键 item_images.{fk['name']}")
+
+
+def _backfill_title_key(conn, table: str, batch_size: int = 1000):
+    t = Base.metadata.tables[table]
+    while True:
+        rows = conn.execute(select(t.c.id, t.c.title).where(t.c.title_key.is_(None)).limit(batch_size)).all()
+        if not rows:
+            return
+        conn.execute(
+            t.update().where(t.c.id == bindparam("_id")).values(title_key=bindparam("_key")),
+            [{"_id": r.id, "_key": title_key(r.title)} for r in rows],
+        )
+
+
+@migration(
+    "0006", "记录标题归一化键 title_key 及 (user_id, title_key) 索引",
+    columns=[("items", "title_key"), ("items_archive", "title_key")],
+    indexes=("ix_items_user_title_key", "ix_items_archive_user_title_key"),
+)
+def _title_key(conn):
+    for table in ("items", "items_archive"):
+        if not _has_column(conn, table, "title_key"):
+            # 追加可空列：MySQL 8 下只改元数据
+            conn.execute(text(f"ALTER TABLE {table} ADD COLUMN title_key VARCHAR(200)"))
+            print(f"已添加列 {table}.title_key")
+        # 归一化在 Python 中计算，分批回填
+        _backfill_title_key(conn, table)
+    create_index_online(conn, "ix_items_user_title_key")
+    create_index_online(conn, "ix_items_archive_user_title_key")
+
+
+@migration("0007", "记录 id 序列 id_sequences（items 与 items_archive 共用，归档后 id 不再被重新分配）")
+def _item_id_sequence(conn):
+    IdSequence.__table__.create(conn, checkfirst=True)
+    sync_item_sequence(conn)
+
+
+@migration("0008", "删除 items_all 视图（读查询改为分层各自查询，见 archive.py）")
+def _drop_items_view(conn):
+    conn.execute(text("DROP VIEW IF EXISTS items_all"))
+
+
+@migration(
+    "0009", "年度回顾快照增加失效代数 generation（快照可重建，直接重建 year_snapshots 表）",
+    columns=[("year_snapshots", "generation")],
+)
+def _year_snapshot_generation(conn):
+    if _has_column(conn, "year_snapshots", "generation"):
+        return
+    YearSnapshot.__table__.drop(conn, checkfirst=True)
+    YearSnapshot.__table__.create(conn)
+    print("已重建表 year_snapshots")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="表结构迁移")
+    parser.add_argument("--status", action="store_true", help="只查看迁移状态")
+    args = parser.parse_args()
+    if args.status:
+        for version, description, applied_at in status():
+            print(f"{version}  {'已执行 ' + applied_at.isoformat() if applied_at else '未执行':<28}  {description}")
+        return
+    done = run()
+    print(f"执行了 {len(done)} 个迁移" if done else "已是最新版本")
+
+
+if __name__ == "__main__":
+    main()
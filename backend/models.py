@@ -1,13 +1,16 @@
-from sqlalchemy import Column, Integer, String, DateTime, Text, ForeignKey, Boolean, UniqueConstraint, Index
-from sqlalchemy.orm import relationship
+from sqlalchemy import Column, Integer, String, DateTime, Text, ForeignKey, Boolean, UniqueConstraint, Index, LargeBinary, Computed, Table, event, func, select, text
+from sqlalchemy.orm import relationship, validates
 from datetime import datetime
 from database import Base
+from titles import title_key
 
 
 class Category(Base):
     __tablename__ = "categories"
     __table_args__ = (
         UniqueConstraint("name", "user_id", name="uq_category_name_user"),
+        Index("ix_categories_user_updated", "user_id", "updated_at"),
+        Index("ix_categories_user_created", "user_id", "created_at"),
     )
 
     id = Column(Integer, primary_key=True, index=True)
@@ -15,6 +18,7 @@ class Category(Base):
     user_id = Column(String(64), nullable=False, index=True, default="default_user")
     user_defined = Column(Boolean, default=True)
     created_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
     items = relationship("Item", back_populates="category", cascade="all, delete-orphan")
 
@@ -25,14 +29,27 @@ class Item(Base):
         Index("ix_items_user_completed", "user_id", "is_completed"),
         Index("ix_items_user_completed_due", "user_id", "is_completed", "due_time"),
         Index("ix_items_user_completed_finish", "user_id", "is_completed", "finish_time"),
+        Index("ix_items_user_updated", "user_id", "updated_at"),
+        # 待办列表：ORDER BY due_time_is_null, due_time, created_at DESC
+        Index("ix_items_todos", "user_id", "is_completed", "due_time_is_null", "due_time", text("created_at DESC")),
+        # 记录列表 / 成就墙：ORDER BY created_at DESC
+        Index("ix_items_user_completed_created", "user_id", "is_completed", "created_at"),
+        Index("ix_items_user_completed_cat_created", "user_id", "is_completed", "category_id", "created_at"),
+        # 同名记录查找：POST /api/items/lookup、导入去重
+        Index("ix_items_user_title_key", "user_id", "title_key"),
     )
 
     id = Column(Integer, primary_key=True, index=True)
     title = Column(String(200), nullable=False, index=True)
+    # 标题归一化键（titles.py），随 title 自动更新
+    title_key = Column(String(200), nullable=True)
     
     due_time = Column(DateTime, nullable=True, index=True)
+    # 生成列，供待办排序使用索引（ORDER BY due_time IS NULL 无法走索引）
+    due_time_is_null = Column(Boolean, Computed("due_time IS NULL", persisted=False))
     finish_time = Column(DateTime, nullable=True, index=True)
     created_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
     is_completed = Column(Boolean, default=False, index=True)
     
@@ -41,19 +58,137 @@ class Item(Base):
     user_id = Column(String(64), nullable=False, index=True, default="default_user")
 
     category = relationship("Category", back_populates="items")
+    # item_images.item_id 不建外键：记录归档时只移动记录行，图片行留在原处，所属记录改在 items_archive 中，
+    # 外键会阻止从 items 删除；删除记录时由下面的级联删除图片，archive.py --check 检查孤儿图片行
     images = relationship(
         "ItemImage", back_populates="item", cascade="all, delete-orphan",
+        primaryjoin="Item.id == foreign(ItemImage.item_id)",
         order_by="ItemImage.sort_order, ItemImage.id",
     )
 
+    @validates("title")
+    def _set_title_key(self, key, value):
+        self.title_key = title_key(value)
+        return value
+
 
 class ItemImage(Base):
     __tablename__ = "item_images"
+    __table_args__ = (
+        Index("ix_item_images_updated", "updated_at"),
+        # Item.images 的 order_by
+        Index("ix_item_images_item_sort", "item_id", "sort_order", "id"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
-    item_id = Column(Integer, ForeignKey("items.id"), nullable=False, index=True)
+    item_id = Column(Integer, nullable=False, index=True)
     image_url = Column(String(500), nullable=False)
     upload_time = Column(DateTime, default=datetime.utcnow)
     sort_order = Column(Integer, default=0, nullable=False)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    placeholder = Column(Text, nullable=True)  # 低清占位图 data URI，入库时生成
+
+    item = relationship("Item", back_populates="images", primaryjoin="Item.id == foreign(ItemImage.item_id)")
+
+
+def _item_columns():
+    """Item 普通列（不含生成列）的副本，归档表与 items 保持同样的列"""
+    return [
+        Column(c.name, c.type, primary_key=c.primary_key, autoincrement=False, nullable=c.nullable)
+        for c in Item.__table__.columns if c.computed is None
+    ]
+
+
+class ArchivedItem(Base):
+    """归档的已完成记录（冷数据），保留原 id，由 archive.py 从 items 分批移入"""
+    __table__ = Table(
+        "items_archive", Base.metadata,
+        *_item_columns(),
+        Column("archived_at", DateTime, nullable=False, default=datetime.utcnow),
+        Index("ix_items_archive_user_finish", "user_id", "finish_time"),
+        Index("ix_items_archive_user_created", "user_id", "created_at"),
+        Index("ix_items_archive_user_cat_created", "user_id", "category_id", "created_at"),
+        Index("ix_items_archive_user_updated", "user_id", "updated_at"),
+        Index("ix_items_archive_user_title_key", "user_id", "title_key"),
+    )
+
+    # 只读：修改前由 archive.hot_item 把记录移回热表
+    category = relationship("Category", primaryjoin="foreign(ArchivedItem.category_id) == Category.id", viewonly=True)
+    images = relationship(
+        "ItemImage", primaryjoin="ArchivedItem.id == foreign(ItemImage.item_id)",
+        order_by="ItemImage.sort_order, ItemImage.id", viewonly=True,
+    )
+
+
+class IdSequence(Base):
+    """单调递增的 id 分配：items 与 items_archive 共用一个 id 空间，新记录的 id 从 name="items" 这一行取。
+    不能交给数据库按表内最大 id 分配（SQLite 表没有 AUTOINCREMENT，MySQL 5.7 重启后 auto_increment 回到 max(id)+1），
+    否则最大的几条记录被归档或删除后 id 会被重新使用，与归档表中的记录重复"""
+    __tablename__ = "id_sequences"
+
+    name = Column(String(64), primary_key=True)
+    value = Column(Integer, nullable=False)
+
+
+class Tombstone(Base):
+    """删除记录，供 /api/sync 增量同步告知客户端哪些数据已被删除"""
+    __tablename__ = "tombstones"
+    __table_args__ = (
+        Index("ix_tombstones_user_deleted", "user_id", "deleted_at"),
+    )
+
+    id = Column(Integer, primary_key=True)
+    user_id = Column(String(64), nullable=False)
+    entity = Column(String(20), nullable=False)  # item / image / category
+    entity_id = Column(Integer, nullable=False)
+    deleted_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+
+
+class YearSnapshot(Base):
+    """已结束年份的年度回顾快照（统计 + 年度墙条目），gzip 压缩后的 JSON，见 year_snapshot.py。
+    payload 为空表示已失效、待重建；generation 每次失效加一，保存快照时比较，生成期间被失效的快照不会写入"""
+    __tablename__ = "year_snapshots"
+    __table_args__ = (
+        UniqueConstraint("user_id", "year", name="uq_year_snapshot_user_year"),
+    )
+
+    id = Column(Integer, primary_key=True)
+    user_id = Column(String(64), nullable=False)
+    year = Column(Integer, nullable=False)
+    payload = Column(LargeBinary(16 * 1024 * 1024), nullable=True)  # MySQL 下为 MEDIUMBLOB
+    etag = Column(String(64), nullable=True)
+    generation = Column(Integer, nullable=False, default=0)
+    built_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+
+
+ITEM_SEQUENCE = "items"
+
+
+def sync_item_sequence(conn):
+    """把 items 序列提升到两张表现有的最大 id（迁移、整库复制、备份恢复后执行；序列行不存在时创建）"""
+    seq = IdSequence.__table__
+    top = max(
+        conn.execute(select(func.max(Item.__table__.c.id))).scalar() or 0,
+        conn.execute(select(func.max(ArchivedItem.__table__.c.id))).scalar() or 0,
+    )
+    current = conn.execute(select(seq.c.value).where(seq.c.name == ITEM_SEQUENCE)).scalar()
+    if current is None:
+        conn.execute(seq.insert().values(name=ITEM_SEQUENCE, value=top))
+    elif current < top:
+        conn.execute(seq.update().where(seq.c.name == ITEM_SEQUENCE).values(value=top))
+
+
+def next_item_id(conn) -> int:
+    """分配一个新的记录 id（在插入记录的同一事务内；MySQL 下序列行锁到事务提交，新建记录因此串行）"""
+    seq = IdSequence.__table__
+    bump = seq.update().where(seq.c.name == ITEM_SEQUENCE).values(value=seq.c.value + 1)
+    if conn.execute(bump).rowcount == 0:
+        sync_item_sequence(conn)
+        conn.execute(bump)
+    return conn.execute(select(seq.c.value).where(seq.c.name == ITEM_SEQUENCE)).scalar()
+
 
-    item = relationship("Item", back_populates="images")
+@event.listens_for(Item, "before_insert")
+def _assign_item_id(mapper, connection, target):
+    if target.id is None:
+        target.id = next_item_id(connection)
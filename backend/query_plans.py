@@ -0,0 +1,179 @@
+"""
+热点查询的执行计划检查：对每个查询执行 EXPLAIN，断言不全表扫描、不额外排序（filesort / TEMP B-TREE）。
+新增或修改热点查询、索引后运行一次；有问题时退出码为 1，可放进部署前检查。
+
+查询与接口中的写法一致（筛选条件、排序、joinedload）。MySQL 在表很小时可能选择全表扫描，请在有真实数据的库上运行。
+
+用法（在 backend/ 下）：
+    python query_plans.py             # 检查全部查询
+    python query_plans.py -v          # 同时打印每个查询的执行计划
+"""
+import argparse
+import re
+import sys
+from datetime import datetime
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session, joinedload
+
+from database import engine as default_engine
+from models import ArchivedItem, Category, Item, ItemImage
+from routers.items import in_year
+
+USER = "default_user"
+YEAR = datetime.now().year - 1
+HOT_TABLES = ("items", "items_archive", "item_images", "categories")
+
+
+def _todos(s):
+    return (
+        s.query(Item).options(joinedload(Item.category))
+        .filter(Item.user_id == USER, Item.is_completed == False)
+        .order_by(Item.due_time_is_null, Item.due_time.asc(), Item.created_at.desc())
+    )
+
+
+def _items_page(s):
+    return (
+        s.query(Item).options(joinedload(Item.category))
+        .filter(Item.user_id == USER, Item.is_completed == True)
+        .order_by(Item.created_at.desc()).limit(20)
+    )
+
+
+def _items_category_page(s):
+    return (
+        s.query(Item).options(joinedload(Item.category))
+        .filter(Item.user_id == USER, Item.is_completed == True, Item.category_id == 1)
+        .order_by(Item.created_at.desc()).limit(20)
+    )
+
+
+def _achievement_wall(s):
+    return (
+        s.query(Item)
+        .filter(Item.user_id == USER, Item.is_completed == True, Item.category_id == 1, Item.images.any())
+        .order_by(Item.created_at.desc())
+    )
+
+
+def _annual_gallery(s):
+    return (
+        s.query(Item).filter(Item.user_id == USER, Item.is_completed == True, in_year(Item.finish_time, YEAR))
+        .order_by(Item.finish_time.asc())
+    )
+
+
+def _archive_page(s):
+    # 有归档记录的用户翻页时归档层的查询（archive.fetch 只取排序键）
+    return (
+        s.query(ArchivedItem.created_at, ArchivedItem.id)
+        .filter(ArchivedItem.user_id == USER, ArchivedItem.is_completed == True)
+        .order_by(ArchivedItem.created_at.desc()).limit(20)
+    )
+
+
+def _archive_category_page(s):
+    return (
+        s.query(ArchivedItem.created_at, ArchivedItem.id)
+        .filter(ArchivedItem.user_id == USER, ArchivedItem.is_completed == True, ArchivedItem.category_id == 1)
+        .order_by(ArchivedItem.created_at.desc()).limit(20)
+    )
+
+
+def _archive_gallery(s):
+    return (
+        s.query(ArchivedItem)
+        .filter(ArchivedItem.user_id == USER, ArchivedItem.is_completed == True, in_year(ArchivedItem.finish_time, YEAR))
+        .order_by(ArchivedItem.finish_time.asc())
+    )
+
+
+def _item_images(s):
+    # Item.images 的加载方式：单条记录按 sort_order, id 取图片
+    return s.query(ItemImage).filter(ItemImage.item_id == 1).order_by(ItemImage.sort_order, ItemImage.id)
+
+
+def _categories(s):
+    return s.query(Category).filter(Category.user_id == USER).order_by(Category.created_at)
+
+
+# 名称 -> (构造查询的函数, 是否要求排序由索引完成)
+HOT_QUERIES = {
+    "todos": (_todos, True),
+    "items_page": (_items_page, True),
+    "items_category_page": (_items_category_page, True),
+    "achievement_wall": (_achievement_wall, True),
+    "annual_gallery": (_annual_gallery, True),
+    "archive_page": (_archive_page, True),
+    "archive_category_page": (_archive_category_page, True),
+    "archive_gallery": (_archive_gallery, True),
+    "item_images": (_item_images, True),
+    "categories": (_categories, True),
+}
+
+
+def explain(conn, stmt) -> list:
+    """返回执行计划的文本行"""
+    compiled = stmt.compile(dialect=conn.dialect, compile_kwargs={"render_postcompile": True})
+    params = compiled.construct_params()
+    if compiled.positional:
+        params = tuple(params[k] for k in compiled.positiontup)
+    if conn.dialect.name == "sqlite":
+        rows = conn.exec_driver_sql(f"EXPLAIN QUERY PLAN {compiled}", params).all()
+        return [r[-1] for r in rows]
+    rows = conn.exec_driver_sql(f"EXPLAIN {compiled}", params).mappings().all()
+    return [f"table={r['table']} type={r['type']} key={r['key']} extra={r['Extra']}" for r in rows]
+
+
+def problems(dialect: str, plan: list, ordered: bool) -> list:
+    """执行计划中的问题：热点表全表扫描、排序没有走索引"""
+    out = []
+    for line in plan:
+        if dialect == "sqlite":
+            m = re.match(r"SCAN (\w+)", line)
+            if m and m.group(1) in HOT_TABLES and "INDEX" not in line:
+                out.append(f"全表扫描: {line}")
+            if ordered and "TEMP B-TREE" in line:
+                out.append(f"额外排序: {line}")
+        else:
+            m = re.match(r"table=(\w+) type=(\w+)", line)
+            if m and m.group(1) in HOT_TABLES and m.group(2) == "ALL":
+                out.append(f"全表扫描: {line}")
+            if ordered and "filesort" in line:
+                out.append(f"额外排序: {line}")
+    return out
+
+
+def check(engine=None, verbose: bool = False) -> dict:
+    """检查全部热点查询，返回 {名称: [问题]}"""
+    engine = engine or default_engine
+    report = {}
+    with engine.connect() as conn:
+        session = Session(bind=conn)
+        for name, (build, ordered) in HOT_QUERIES.items():
+            plan = explain(conn, build(session).statement)
+            report[name] = problems(conn.dialect.name, plan, ordered)
+            if verbose:
+                print(f"[{name}]")
+                for line in plan:
+                    print(f"    {line}")
+        session.close()
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="检查热点查询的执行计划")
+    parser.add_argument("-v", "--verbose", action="store_true", help="打印执行计划")
+    args = parser.parse_args()
+    report = check(verbose=args.verbose)
+    failed = {k: v for k, v in report.items() if v}
+    for name, issues in report.items():
+        print(f"{'FAIL' if issues else 'ok  '}  {name}")
+        for issue in issues:
+            print(f"      {issue}")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
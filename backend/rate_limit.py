@@ -0,0 +1,238 @@
+"""
+按用户限流：所有用户共用一个进程和一个数据库连接池，单个用户跑导入脚本或频繁搜索封面时不应拖慢其他人。
+
+每个 user_id（XUserIDMiddleware 写入的 request.state.user_id）在每类路由上有一个令牌桶和一个并发上限：
+  - search：/api/anime-search（会请求 Jikan / Bangumi 上游）
+  - upload：创建记录、上传图片、从链接设置封面、创建/提交断点续传会话（会拉取/解码图片）
+  - list：其余 /api 请求
+图片类请求（serve-webp、cover-proxy、雪碧图）一页会并发几十个且有缓存，不限流。
+超限返回 429 和 Retry-After。并发名额在响应体发送完（流式响应结束或客户端断开）后才释放。
+
+状态默认保存在进程内存中；多 worker 部署时设置 RATE_LIMIT_REDIS_URL 使用 Redis（或兼容的服务），
+需要 pip install redis，未安装或连接失败时退回进程内存（每个 worker 各自计数）。
+"""
+import logging
+import math
+import os
+import re
+import time
+
+import anyio
+from fastapi.responses import JSONResponse
+from starlette.middleware.base import BaseHTTPMiddleware
+
+logger = logging.getLogger("uvicorn.error")
+
+RATE_LIMIT_ENABLED = os.environ.get("RATE_LIMIT_ENABLED", "1") != "0"
+RATE_LIMIT_REDIS_URL = os.environ.get("RATE_LIMIT_REDIS_URL", "")
+# Redis 中并发计数的过期时间（秒），worker 异常退出时计数不会永久占用
+RATE_LIMIT_INFLIGHT_TTL = int(os.environ.get("RATE_LIMIT_INFLIGHT_TTL", 300))
+
+
+def _parse_limit(name: str, default: str) -> tuple:
+    """环境变量格式「每秒令牌数,桶容量,并发上限」，某项为 0 表示不限制该项"""
+    rate, burst, concurrency = os.environ.get(name, default).split(",")
+    return float(rate), float(burst), int(concurrency)
+
+
+# 路由类别 -> (每秒令牌数, 桶容量, 并发上限)
+LIMITS = {
+    "search": _parse_limit("RATE_LIMIT_SEARCH", "2,10,3"),
+    "upload": _parse_limit("RATE_LIMIT_UPLOAD", "2,20,3"),
+    "list": _parse_limit("RATE_LIMIT_LIST", "20,100,10"),
+}
+
+EXEMPT_PREFIXES = ("/api/serve-webp/", "/api/cover-proxy", "/api/wall/atlas/")
+# 断点续传只有创建会话和 finalize 计入 upload，分片 PATCH 按 list 计数（否则令牌速率会限制上传带宽）
+_UPLOAD_PATH = re.compile(r"^/api/(items/(\d+/images|\d+/cover-from-url)?|upload-sessions/([0-9a-f]+/finalize)?)/?$")
+
+
+def route_class(method: str, path: str):
+    """请求所属的限流类别；不限流时返回 None"""
+    if not path.startswith("/api/") or path.startswith(EXEMPT_PREFIXES):
+        return None
+    if path.startswith("/api/anime-search"):
+        return "search"
+    if method == "POST" and _UPLOAD_PATH.match(path):
+        return "upload"
+    return "list"
+
+
+class MemoryBackend:
+    """进程内令牌桶和并发计数（只在事件循环线程中访问，无需加锁）"""
+
+    def __init__(self):
+        # key -> (剩余令牌, 上次补充时间, 补满时间)；各类别的速率和容量不同，补满时间随桶保存
+        self._buckets = {}
+        self._inflight = {}
+
+    async def take(self, key: str, rate: float, burst: float) -> float:
+        """取一个令牌；成功返回 0，否则返回需要等待的秒数"""
+        now = time.monotonic()
+        tokens, last, _ = self._buckets.get(key, (burst, now, now))
+        tokens = min(burst, tokens + (now - last) * rate)
+        wait = (1 - tokens) / rate if tokens < 1 else 0
+        if not wait:
+            tokens -= 1
+        self._buckets[key] = (tokens, now, now + (burst - tokens) / rate)
+        if len(self._buckets) > 10000:
+            self._prune(now)
+        return wait
+
+    def _prune(self, now: float):
+        # 已补满的桶与新建的桶等价，直接删除
+        for k in [k for k, (_, _, full_at) in self._buckets.items() if full_at <= now]:
+            del self._buckets[k]
+
+    async def acquire(self, key: str, limit: int) -> bool:
+        n = self._inflight.get(key, 0)
+        if n >= limit:
+            return False
+        self._inflight[key] = n + 1
+        return True
+
+    async def release(self, key: str):
+        n = self._inflight.get(key, 0) - 1
+        if n > 0:
+            self._inflight[key] = n
+        else:
+            self._inflight.pop(key, None)
+
+
+# KEYS[1] 桶；ARGV: 每秒令牌数, 桶容量, 当前时间（秒）。返回需要等待的毫秒数，0 表示放行
+_TAKE_SCRIPT = """
+local rate = tonumber(ARGV[1])
+local burst = tonumber(ARGV[2])
+local now = tonumber(ARGV[3])
+local b = redis.call('HMGET', KEYS[1], 't', 'ts')
+local tokens = tonumber(b[1]) or burst
+local last = tonumber(b[2]) or now
+tokens = math.min(burst, tokens + math.max(0, now - last) * rate)
+local wait = 0
+if tokens < 1 then
+  wait = math.ceil((1 - tokens) / rate * 1000)
+else
+  tokens = tokens - 1
+end
+redis.call('HSET', KEYS[1], 't', tostring(tokens), 'ts', tostring(now))
+redis.call('EXPIRE', KEYS[1], math.ceil(burst / rate) + 1)
+return wait
+"""
+
+# KEYS[1] 并发计数；ARGV: 上限, 过期秒数。返回 1 放行、0 拒绝
+_ACQUIRE_SCRIPT = """
+local n = redis.call('INCR', KEYS[1])
+redis.call('EXPIRE', KEYS[1], tonumber(ARGV[2]))
+if n > tonumber(ARGV[1]) then
+  redis.call('DECR', KEYS[1])
+  return 0
+end
+return 1
+"""
+
+
+class RedisBackend:
+    """Redis 令牌桶和并发计数，多个 worker 共享；时间取各 worker 的系统时间"""
+
+    def __init__(self, url: str):
+        import redis.asyncio as redis
+
+        self._redis = redis.from_url(url)
+        self._take = self._redis.register_script(_TAKE_SCRIPT)
+        self._acquire = self._redis.register_script(_ACQUIRE_SCRIPT)
+
+    async def take(self, key: str, rate: float, burst: float) -> float:
+        wait_ms = await self._take(keys=[f"rl:bucket:{key}"], args=[rate, burst, time.time()])
+        return int(wait_ms) / 1000
+
+    async def acquire(self, key: str, limit: int) -> bool:
+        return bool(await self._acquire(keys=[f"rl:inflight:{key}"], args=[limit, RATE_LIMIT_INFLIGHT_TTL]))
+
+    async def release(self, key: str):
+        await self._redis.decr(f"rl:inflight:{key}")
+
+
+def _create_backend():
+    if RATE_LIMIT_REDIS_URL:
+        try:
+            return RedisBackend(RATE_LIMIT_REDIS_URL)
+        except ImportError:
+            logger.warning("未安装 redis，限流状态保存在进程内存中")
+    return MemoryBackend()
+
+
+backend = _create_backend()
+_fallback = MemoryBackend()
+
+
+def _too_many(detail: str, retry_after: float) -> JSONResponse:
+    return JSONResponse(
+        status_code=429,
+        content={"detail": detail},
+        headers={"Retry-After": str(max(1, math.ceil(retry_after)))},
+    )
+
+
+async def _admit(store, key: str, limits: tuple):
+    """取令牌并占用一个并发名额；被拒绝时返回 429 响应"""
+    rate, burst, concurrency = limits
+    wait = await store.take(key, rate, burst) if rate > 0 else 0
+    if wait > 0:
+        return _too_many("请求过于频繁，请稍后再试", wait)
+    if concurrency > 0 and not await store.acquire(key, concurrency):
+        return _too_many("同时进行的请求过多，请稍后再试", 1)
+    return None
+
+
+class _ReleaseAfterBody:
+    """包装响应：响应体发送完、出错或客户端断开后调用 release"""
+
+    def __init__(self, response, release):
+        self.response = response
+        self.release = release
+
+    async def __call__(self, scope, receive, send):
+        try:
+            await self.response(scope, receive, send)
+        finally:
+            # 断开连接时任务已被取消，屏蔽取消以保证名额归还
+            with anyio.CancelScope(shield=True):
+                await self.release()
+
+
+class RateLimitMiddleware(BaseHTTPMiddleware):
+    """按 user_id 和路由类别限流；需放在 XUserIDMiddleware 之内（先取得 user_id）"""
+
+    async def dispatch(self, request, call_next):
+        cls = route_class(request.method, request.url.path) if RATE_LIMIT_ENABLED else None
+        if cls is None or request.method == "OPTIONS":
+            return await call_next(request)
+        limits = LIMITS[cls]
+        key = f"{request.state.user_id}:{cls}"
+        store = backend
+        try:
+            rejected = await _admit(store, key, limits)
+        except Exception as e:
+            # Redis 不可用时不影响请求，退回进程内计数
+            logger.warning("rate limit backend error, using memory: %s", e)
+            store = _fallback
+            rejected = await _admit(store, key, limits)
+        if rejected is not None:
+            return rejected
+        if limits[2] <= 0:
+            return await call_next(request)
+
+        async def release():
+            try:
+                await store.release(key)
+            except Exception as e:
+                logger.warning("rate limit release failed: %s", e)
+
+        try:
+            response = await call_next(request)
+        except BaseException:
+            with anyio.CancelScope(shield=True):
+                await release()
+            raise
+        # call_next 在响应头到达时就返回，响应体仍在流式生成；发送完（或连接中断）后才释放并发名额
+        return _ReleaseAfterBody(response, release)
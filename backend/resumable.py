@@ -0,0 +1,176 @@
+"""
+图片断点续传（参考 tus 协议）：创建会话 → 按偏移量 PATCH 追加分片 → finalize 入库并挂到记录上。
+
+会话存放在 UPLOAD_DIR/.upload_sessions/：{id}.json 为元数据（用户、记录、总字节数、扩展名），{id}.bin 为暂存文件。
+每个分片必须从当前已收到的字节数开始写入，否则返回 409 和服务端的偏移量，客户端据此续传；
+分片中途断开时已写入的部分保留。写入和 finalize 期间对暂存文件加 flock，多个 worker 之间也不会交错写入。
+finalize 成功写入数据库后才删除暂存文件，占位图或数据库提交失败时会话保持完整，可以重新提交。
+超过 UPLOAD_SESSION_TTL 没有写入的会话由 expire_loop 删除。
+"""
+import asyncio
+import fcntl
+import json
+import logging
+import os
+import re
+import time
+import uuid
+from typing import Optional
+
+from config import UPLOAD_DIR
+
+logger = logging.getLogger("uvicorn.error")
+
+SESSION_DIR = os.path.join(UPLOAD_DIR, ".upload_sessions")
+# 建议的分片大小，也是单个 PATCH 的最大字节数
+UPLOAD_CHUNK_SIZE = int(os.environ.get("UPLOAD_CHUNK_SIZE", 1024 * 1024))
+# 前端同时上传的文件数
+UPLOAD_PARALLELISM = int(os.environ.get("UPLOAD_PARALLELISM", 3))
+# 会话多久（秒）没有写入后过期
+UPLOAD_SESSION_TTL = int(os.environ.get("UPLOAD_SESSION_TTL", 86400))
+
+_ID = re.compile(r"^[0-9a-f]{32}$")
+
+
+class SessionNotFound(Exception):
+    pass
+
+
+class SessionBusy(Exception):
+    """另一个请求正在写入或提交该会话"""
+
+
+def _paths(session_id: str) -> tuple:
+    if not _ID.match(session_id or ""):
+        raise SessionNotFound(session_id)
+    base = os.path.join(SESSION_DIR, session_id)
+    return base + ".json", base + ".bin"
+
+
+def _write_meta(path: str, meta: dict):
+    tmp = f"{path}.{uuid.uuid4().hex}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(meta, f)
+    os.replace(tmp, path)
+
+
+def create(user_id: str, item_id: int, length: int, ext: str) -> dict:
+    """新建会话，返回元数据（含 id）"""
+    os.makedirs(SESSION_DIR, exist_ok=True)
+    session_id = uuid.uuid4().hex
+    meta_path, data_path = _paths(session_id)
+    meta = {"id": session_id, "user_id": user_id, "item_id": item_id, "length": length, "ext": ext, "created": time.time()}
+    open(data_path, "wb").close()
+    _write_meta(meta_path, meta)
+    return meta
+
+
+def load(session_id: str, user_id: str) -> dict:
+    """读取会话元数据，offset 为暂存文件当前大小；不存在或不属于该用户时抛 SessionNotFound"""
+    meta_path, data_path = _paths(session_id)
+    try:
+        with open(meta_path, encoding="utf-8") as f:
+            meta = json.load(f)
+    except (OSError, ValueError):
+        raise SessionNotFound(session_id)
+    if meta.get("user_id") != user_id:
+        raise SessionNotFound(session_id)
+    try:
+        meta["offset"] = os.path.getsize(data_path)
+    except OSError:
+        # 已提交的会话没有暂存文件
+        meta["offset"] = meta["length"] if meta.get("result") else None
+    return meta
+
+
+def open_locked(session_id: str):
+    """以追加方式打开暂存文件并加排它锁；已被锁住时抛 SessionBusy"""
+    _, data_path = _paths(session_id)
+    try:
+        f = open(data_path, "r+b")
+    except OSError:
+        raise SessionBusy(session_id)
+    try:
+        fcntl.flock(f.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        f.close()
+        raise SessionBusy(session_id)
+    f.seek(0, os.SEEK_END)
+    return f
+
+
+def staging_path(session_id: str) -> str:
+    return _paths(session_id)[1]
+
+
+def mark_done(session_id: str, result: dict):
+    """记录提交结果并删除暂存文件：finalize 重试时直接返回同一张图片"""
+    meta_path, data_path = _paths(session_id)
+    with open(meta_path, encoding="utf-8") as f:
+        meta = json.load(f)
+    meta["result"] = result
+    _write_meta(meta_path, meta)
+    try:
+        os.remove(data_path)
+    except OSError:
+        pass
+
+
+def delete(session_id: str):
+    for path in _paths(session_id):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+def _last_activity(meta_path: str, data_path: str) -> Optional[float]:
+    times = []
+    for p in (meta_path, data_path):
+        try:
+            times.append(os.path.getmtime(p))
+        except OSError:
+            pass
+    return max(times) if times else None
+
+
+def purge_expired() -> int:
+    """删除超过 UPLOAD_SESSION_TTL 未写入的会话，返回删除数"""
+    if not os.path.isdir(SESSION_DIR):
+        return 0
+    now = time.time()
+    purged = 0
+    with os.scandir(SESSION_DIR) as it:
+        names = {e.name for e in it}
+    for name in names:
+        session_id = name.split(".")[0]
+        if not _ID.match(session_id):
+            continue
+        if name == session_id + ".json":
+            last = _last_activity(*_paths(session_id))
+            if last is not None and now - last > UPLOAD_SESSION_TTL:
+                delete(session_id)
+                purged += 1
+        elif session_id + ".json" not in names:
+            # 元数据已丢失的暂存文件、写元数据中断留下的临时文件
+            path = os.path.join(SESSION_DIR, name)
+            try:
+                if now - os.path.getmtime(path) > UPLOAD_SESSION_TTL:
+                    os.remove(path)
+                    purged += 1
+            except OSError:
+                pass
+    return purged
+
+
+async def expire_loop():
+    """定期删除过期会话"""
+    interval = max(60, min(UPLOAD_SESSION_TTL, 3600))
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            n = await asyncio.to_thread(purge_expired)
+            if n:
+                logger.info("resumable: purged %d expired upload sessions", n)
+        except Exception as e:
+            logger.warning("resumable expire failed: %s", e)
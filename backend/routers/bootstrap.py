@@ -0,0 +1,54 @@
+"""
+首页一次性加载：分类、有记录的年份、分类数量和第一页记录合并为一个请求，
+移动网络下首页一次往返即可渲染。各子查询在线程池中并发执行，各自使用独立的数据库连接（配置了只读副本时走副本）。
+"""
+import asyncio
+from typing import Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+
+from database import DB_PIN_COOKIE, read_session
+from deps import get_user_id
+from routers.categories import get_categories
+from routers.items import get_years, get_category_counts, get_items
+
+router = APIRouter(prefix="/api/bootstrap", tags=["bootstrap"])
+
+FIELDS = ("categories", "years", "category_counts", "items")
+
+
+def _run(fn, pin, **kwargs):
+    db = read_session(kwargs.get("user_id"), pin)
+    try:
+        return fn(db=db, **kwargs)
+    finally:
+        db.close()
+
+
+@router.get("/")
+async def bootstrap(
+    request: Request,
+    year: Optional[int] = None,
+    category_id: Optional[int] = None,
+    limit: int = Query(20, ge=1, le=200),
+    offset: int = Query(0, ge=0),
+    fields: Optional[str] = Query(None, description=f"逗号分隔，可选 {','.join(FIELDS)}；不传返回全部"),
+    user_id: str = Depends(get_user_id),
+):
+    """首页所需数据：categories、years、category_counts（按 year 统计）、items（按 year/category_id 分页）"""
+    wanted = [f.strip() for f in fields.split(",") if f.strip()] if fields else list(FIELDS)
+    unknown = [f for f in wanted if f not in FIELDS]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"未知字段: {','.join(unknown)}")
+    pin = request.cookies.get(DB_PIN_COOKIE)
+    jobs = {
+        "categories": lambda: _run(get_categories, pin, user_id=user_id),
+        "years": lambda: _run(get_years, pin, user_id=user_id)["years"],
+        "category_counts": lambda: _run(get_category_counts, pin, year=year, user_id=user_id),
+        "items": lambda: _run(
+            get_items, pin, category_id=category_id, year=year, is_completed=None,
+            limit=limit, offset=offset, search=None, user_id=user_id,
+        ),
+    }
+    results = await asyncio.gather(*(asyncio.to_thread(jobs[f]) for f in wanted))
+    return dict(zip(wanted, results))
@@ -2,9 +2,10 @@ from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy.orm import Session
 from typing import List
 from pydantic import BaseModel
-from database import get_db
-from models import Category
+from database import get_db, get_read_db
+from models import ArchivedItem, Category
 from deps import get_user_id
+from routers.sync import add_tombstone
 
 router = APIRouter(prefix="/api/categories", tags=["categories"])
 
@@ -23,10 +24,14 @@ class CategoryResponse(BaseModel):
         from_attributes = True
 
 
+def _category_to_response(c):
+    return {"id": c.id, "name": c.name, "user_defined": c.user_defined, "created_at": (c.created_at or "").isoformat()}
+
+
 @router.get("/", response_model=List[CategoryResponse])
-def get_categories(db: Session = Depends(get_db), user_id: str = Depends(get_user_id)):
+def get_categories(db: Session = Depends(get_read_db), user_id: str = Depends(get_user_id)):
     cats = db.query(Category).filter(Category.user_id == user_id).order_by(Category.created_at).all()
-    return [{"id": c.id, "name": c.name, "user_defined": c.user_defined, "created_at": (c.created_at or "").isoformat()} for c in cats]
+    return [_category_to_response(c) for c in cats]
 
 
 @router.post("/", response_model=CategoryResponse)
@@ -38,7 +43,7 @@ def create_category(category: CategoryCreate, db: Session = Depends(get_db), use
     db.add(c)
     db.commit()
     db.refresh(c)
-    return {"id": c.id, "name": c.name, "user_defined": c.user_defined, "created_at": (c.created_at or "").isoformat()}
+    return _category_to_response(c)
 
 
 @router.delete("/{category_id}")
@@ -48,8 +53,9 @@ def delete_category(category_id: int, db: Session = Depends(get_db), user_id: st
         raise HTTPException(status_code=404, detail="分类不存在")
     if not cat.user_defined:
         raise HTTPException(status_code=403, detail="不能删除系统默认分类")
-    if cat.items:
+    if cat.items or db.query(ArchivedItem.id).filter(ArchivedItem.category_id == category_id).first():
         raise HTTPException(status_code=400, detail="该分类下还有记录，无法删除")
     db.delete(cat)
+    add_tombstone(db, user_id, "category", category_id)
     db.commit()
     return {"message": "分类删除成功"}
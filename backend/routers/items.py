@@ -1,24 +1,66 @@
-from fastapi import APIRouter, Depends, HTTPException, Query, UploadFile, File, Form
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, UploadFile, File, Form
+from fastapi.responses import Response
 from sqlalchemy.orm import Session, joinedload, selectinload
-from sqlalchemy import extract, update, func, case
+from sqlalchemy import and_, extract, func, case
 from typing import List, Optional
 from datetime import datetime
 from pydantic import BaseModel
-from urllib.parse import urlparse
 import os
-import uuid
-from pathlib import Path
+import asyncio
+import gzip
 import httpx
 
-from database import get_db
+from database import get_db, get_read_db
 from models import Item, ItemImage, Category
-from config import UPLOAD_DIR
 from deps import get_user_id
+from storage_gc import upload_path
+import webp_cache
+import cover_cache
+import sqlite_search
+import archive
+import image_order
+from titles import title_key
+import tracing
+from imaging import THUMB_WIDTHS
+from compression import accepts, etag_matches
+from uploads import save_upload, save_image_bytes, make_placeholder
+from routers.sync import add_tombstone
+import year_snapshot
 
 router = APIRouter(prefix="/api/items", tags=["items"])
 
-# 允许的封面图来源（防止 SSRF，只拉取动漫/漫画 CDN）
-ALLOWED_COVER_HOSTS = ("cdn.myanimelist.net", "cdn.myanimelist.net.", "lain.bgm.tv", "lain.bgm.tv.")
+# POST /api/items/lookup 一次最多查询的标题数
+LOOKUP_MAX_TITLES = 1000
+
+
+async def _save_cover(cover_image_url: str) -> str:
+    """把封面 URL 的原图保存为上传文件，返回文件名；封面代理已缓存过的原图直接复用，不再拉取"""
+    # 只允许 cover_cache.ALLOWED_COVER_HOSTS（防止 SSRF，只拉取动漫/漫画 CDN）
+    if not cover_cache.is_allowed(cover_image_url):
+        raise HTTPException(status_code=400, detail="封面链接仅允许来自 MyAnimeList 或 Bangumi CDN")
+    try:
+        path = await cover_cache.fetch_original(cover_image_url)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    content = await asyncio.to_thread(_read_bytes, path)
+    return await save_image_bytes(content, os.path.splitext(path)[1])
+
+
+def _read_bytes(path: str) -> bytes:
+    with open(path, "rb") as f:
+        return f.read()
+
+
+def _image_variants(img_url: Optional[str]) -> dict:
+    """本地上传图片的派生图地址：image_webp 为原尺寸，image_thumb 为小图，image_srcset 可直接用于 <img srcset>"""
+    if not img_url or not img_url.startswith("/api/uploads/"):
+        return {"image_webp": None, "image_thumb": None, "image_srcset": None}
+    base = "/api/serve-webp/" + img_url.replace("/api/uploads/", "").lstrip("/")
+    return {
+        "image_webp": base,
+        "image_thumb": f"{base}?w={THUMB_WIDTHS[1]}",
+        "image_srcset": ", ".join(f"{base}?w={w} {w}w" for w in THUMB_WIDTHS),
+    }
 
 
 def _item_to_response(item):
@@ -32,7 +74,11 @@ def _item_to_response(item):
         "category_id": item.category_id,
         "category_name": item.category.name,
         "created_at": item.created_at.isoformat(),
-        "images": [{"id": i.id, "image_url": i.image_url, "upload_time": i.upload_time.isoformat()} for i in item.images],
+        "updated_at": item.updated_at.isoformat() if item.updated_at else None,
+        "images": [
+            {"id": i.id, "image_url": i.image_url, "upload_time": i.upload_time.isoformat(), "placeholder": i.placeholder}
+            for i in item.images
+        ],
     }
 
 
@@ -87,29 +133,18 @@ async def create_item(
     db.commit()
     db.refresh(item)
 
+    # 新记录没有图片，按上传顺序依次编号
+    rank = 0
+
     # 可选：从动漫/漫画封面 URL 拉取一张图作为首图（仅允许 MAL CDN），先于本地上传
     if cover_image_url and cover_image_url.strip():
         try:
-            parsed = urlparse(cover_image_url.strip())
-            if parsed.scheme not in ("https", "http") or parsed.netloc not in ALLOWED_COVER_HOSTS:
-                raise HTTPException(status_code=400, detail="封面链接仅允许来自 MyAnimeList 或 Bangumi CDN")
-            async with httpx.AsyncClient(follow_redirects=True, timeout=15.0) as client:
-                r = await client.get(cover_image_url.strip())
-                r.raise_for_status()
-                content_type = r.headers.get("content-type", "")
-                if "image/" not in content_type:
-                    raise HTTPException(status_code=400, detail="链接不是有效图片")
-                ext = ".jpg"
-                if "png" in content_type:
-                    ext = ".png"
-                elif "webp" in content_type:
-                    ext = ".webp"
-                fn = f"{uuid.uuid4()}{ext}"
-                path = os.path.join(UPLOAD_DIR, fn)
-                with open(path, "wb") as buf:
-                    buf.write(r.content)
-                cover_img = ItemImage(item_id=item.id, image_url=f"/api/uploads/{fn}")
-                db.add(cover_img)
+            fn = await _save_cover(cover_image_url)
+            rank += image_order.RANK_GAP
+            cover_img = ItemImage(
+                item_id=item.id, image_url=f"/api/uploads/{fn}", sort_order=rank, placeholder=await make_placeholder(fn),
+            )
+            db.add(cover_img)
         except httpx.HTTPError as e:
             raise HTTPException(status_code=502, detail=f"拉取封面失败: {str(e)}")
         except HTTPException:
@@ -119,12 +154,9 @@ async def create_item(
 
     for f in files:
         if f.filename:
-            ext = Path(f.filename).suffix
-            fn = f"{uuid.uuid4()}{ext}"
-            path = os.path.join(UPLOAD_DIR, fn)
-            with open(path, "wb") as buf:
-                buf.write(await f.read())
-            img = ItemImage(item_id=item.id, image_url=f"/api/uploads/{fn}")
+            fn = await save_upload(f)
+            rank += image_order.RANK_GAP
+            img = ItemImage(item_id=item.id, image_url=f"/api/uploads/{fn}", sort_order=rank, placeholder=await make_placeholder(fn))
             db.add(img)
 
     db.commit()
@@ -132,14 +164,43 @@ async def create_item(
     return _item_to_response(item)
 
 
+class TitleLookup(BaseModel):
+    titles: List[str]
+    category_id: Optional[int] = None
+
+
+@router.post("/lookup")
+def lookup_titles(body: TitleLookup, db: Session = Depends(get_read_db), user_id: str = Depends(get_user_id)):
+    """按归一化标题批量查找已有记录（去重、导入前检查），一次查询；results 与 titles 一一对应"""
+    if len(body.titles) > LOOKUP_MAX_TITLES:
+        raise HTTPException(status_code=400, detail=f"一次最多查询 {LOOKUP_MAX_TITLES} 个标题")
+    keys = [title_key(t) for t in body.titles]
+    found = {}
+    wanted = {k for k in keys if k}
+    if wanted:
+        for M in archive.tiers(db, user_id):
+            q = db.query(M.id, M.title, M.title_key, M.category_id, M.is_completed).filter(
+                M.user_id == user_id, M.title_key.in_(wanted)
+            )
+            if body.category_id is not None:
+                q = q.filter(M.category_id == body.category_id)
+            for row in q.all():
+                found.setdefault(row.title_key, []).append({
+                    "id": row.id, "title": row.title, "category_id": row.category_id, "is_completed": row.is_completed,
+                })
+        for matches in found.values():
+            matches.sort(key=lambda m: m["id"])
+    return {"results": [{"title": t, "key": k, "items": found.get(k, [])} for t, k in zip(body.titles, keys)]}
+
+
 @router.get("/todos")
-def get_todos(db: Session = Depends(get_db), user_id: str = Depends(get_user_id)):
+def get_todos(db: Session = Depends(get_read_db), user_id: str = Depends(get_user_id)):
     """获取待办列表：先按有无截止日期排序（无在前），再按截止日期升序，最后按创建时间降序"""
     items = (
         db.query(Item)
         .options(joinedload(Item.category), selectinload(Item.images))
         .filter(Item.user_id == user_id, Item.is_completed == False)
-        .order_by(Item.due_time.is_(None), Item.due_time.asc(), Item.created_at.desc())
+        .order_by(Item.due_time_is_null, Item.due_time.asc(), Item.created_at.desc())
         .all()
     )
     return [_item_to_response(i) for i in items]
@@ -158,7 +219,7 @@ async def update_item(
     user_id: str = Depends(get_user_id),
 ):
     """更新记录（支持待办和已完成记录）"""
-    item = db.query(Item).filter(Item.id == item_id, Item.user_id == user_id).first()
+    item = archive.hot_item(db, item_id, user_id)
     if not item:
         raise HTTPException(status_code=404, detail="记录不存在")
     
@@ -204,7 +265,7 @@ def complete_todo(
     user_id: str = Depends(get_user_id),
 ):
     """完成待办：将待办转为正式记录"""
-    item = db.query(Item).filter(Item.id == item_id, Item.user_id == user_id).first()
+    item = archive.hot_item(db, item_id, user_id)
     if not item:
         raise HTTPException(status_code=404, detail="任务不存在")
     
@@ -221,36 +282,47 @@ def complete_todo(
 
 
 @router.get("/years")
-def get_years(db: Session = Depends(get_db), user_id: str = Depends(get_user_id)):
-    from sqlalchemy import distinct
-    rows = db.query(distinct(extract("year", Item.finish_time))).filter(
-        Item.user_id == user_id,
-        Item.is_completed == True,  # 只统计已完成的记录
-        Item.finish_time.isnot(None)
-    ).order_by(extract("year", Item.finish_time).desc()).all()
-    return {"years": [int(r[0]) for r in rows if r[0] is not None]}
+def get_years(db: Session = Depends(get_read_db), user_id: str = Depends(get_user_id)):
+    # 用带标签的列加 DISTINCT；distinct(extract(...)) 在 SQLite 下会按 DateTime 解析结果而报错
+    years = set()
+    for M in archive.tiers(db, user_id):
+        year_col = extract("year", M.finish_time).label("year")
+        rows = db.query(year_col).filter(
+            M.user_id == user_id,
+            M.is_completed == True,  # 只统计已完成的记录
+            M.finish_time.isnot(None)
+        ).distinct().all()
+        years.update(int(r[0]) for r in rows if r[0] is not None)
+    return {"years": sorted(years, reverse=True)}
 
 
 @router.get("/category-counts")
 def get_category_counts(
     year: Optional[int] = Query(None, description="按该年份的 finish_time 统计；不传则统计全部年份"),
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_read_db),
     user_id: str = Depends(get_user_id),
 ):
     """按年份返回各分类数量，用于首页分类胶囊数字（不随当前选中的分类变化）"""
-    q = (
-        db.query(Category.name, func.count(Item.id).label("cnt"))
-        .join(Item, Item.category_id == Category.id)
-        .filter(Item.user_id == user_id, Item.is_completed == True)
-    )
-    if year is not None:
-        q = q.filter(extract("year", Item.finish_time) == year)
-    rows = q.group_by(Category.id, Category.name).all()
-    by_category = {name: cnt for name, cnt in rows}
+    by_category = {}
+    for M in archive.tiers(db, user_id, year):
+        q = (
+            db.query(Category.name, func.count(M.id).label("cnt"))
+            .join(M, M.category_id == Category.id)
+            .filter(M.user_id == user_id, M.is_completed == True)
+        )
+        if year is not None:
+            q = q.filter(in_year(M.finish_time, year))
+        for name, cnt in q.group_by(Category.id, Category.name).all():
+            by_category[name] = by_category.get(name, 0) + cnt
     total = sum(by_category.values())
     return {"total": total, "by_category": by_category}
 
 
+def in_year(col, year: int):
+    """col 落在 year 年内；用范围条件而不是 extract(year)，可以走 (user_id, is_completed, finish_time) 等索引"""
+    return and_(col >= datetime(year, 1, 1), col < datetime(year + 1, 1, 1))
+
+
 def _escape_like(s: str) -> str:
     """转义 LIKE 中的 % 和 _，避免被当作通配符"""
     return (s or "").replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
@@ -264,44 +336,50 @@ def get_items(
     limit: Optional[int] = None,
     offset: int = 0,
     search: Optional[str] = Query(None),
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_read_db),
     user_id: str = Depends(get_user_id),
 ):
     from sqlalchemy import or_
     
-    base_filters = [Item.user_id == user_id]
     if is_completed is None:
         is_completed = True
-    base_filters.append(Item.is_completed == is_completed)
-    if category_id:
-        base_filters.append(Item.category_id == category_id)
-    if year:
-        if is_completed:
-            base_filters.append(extract("year", Item.finish_time) == year)
-        else:
-            base_filters.append(extract("year", Item.due_time) == year)
-    if search and search.strip():
-        term = _escape_like(search.strip())
-        pattern = f"%{term}%"
-        base_filters.append(
-            or_(
-                Item.title.ilike(pattern, escape="\\"),
-                Item.notes.ilike(pattern, escape="\\"),
-            )
-        )
-    
-    total = db.query(func.count(Item.id)).filter(*base_filters).scalar()
-    
-    q = (
-        db.query(Item)
-        .options(joinedload(Item.category), selectinload(Item.images))
-        .filter(*base_filters)
-        .order_by(Item.created_at.desc())
+    # 待办不会归档，只查热表
+    tiers = archive.tiers(db, user_id, year) if is_completed else [Item]
+
+    def base_filters(M):
+        filters = [M.user_id == user_id, M.is_completed == is_completed]
+        if category_id:
+            filters.append(M.category_id == category_id)
+        if year:
+            if is_completed:
+                filters.append(in_year(M.finish_time, year))
+            else:
+                filters.append(in_year(M.due_time, year))
+        if search and search.strip():
+            # 全文索引只覆盖热表
+            fts = M is Item and len(search.strip()) >= sqlite_search.FTS_MIN_CHARS and sqlite_search.available(db)
+            if fts:
+                filters.append(sqlite_search.match_filter(search.strip()))
+            else:
+                term = _escape_like(search.strip())
+                pattern = f"%{term}%"
+                filters.append(
+                    or_(
+                        M.title.ilike(pattern, escape="\\"),
+                        M.notes.ilike(pattern, escape="\\"),
+                    )
+                )
+        return filters
+
+    total = sum(db.query(func.count(M.id)).filter(*base_filters(M)).scalar() for M in tiers)
+
+    items = archive.fetch(
+        db, tiers, base_filters, lambda M: M.created_at,
+        options=lambda M: (joinedload(M.category), selectinload(M.images)),
+        limit=limit, offset=offset,
     )
-    if limit is not None:
-        q = q.offset(offset).limit(limit)
-    items = q.all()
-    result = [_item_to_response(i) for i in items]
+    with tracing.span("items.serialize", count=len(items)):
+        result = [_item_to_response(i) for i in items]
     if limit is not None:
         return {"items": result, "total": total}
     return result
@@ -310,19 +388,23 @@ def get_items(
 @router.get("/achievement-wall")
 def get_achievement_wall(
     category_id: Optional[int] = Query(None),
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_read_db),
     user_id: str = Depends(get_user_id),
 ):
     """成就墙：按分类返回已完成且带封面的记录。category_id 必传，为当前用户的分类 id（前端按用户分组展示）"""
     if category_id is None:
         return {"items": [], "total": 0}
-    items = (
-        db.query(Item)
-        .options(joinedload(Item.category), selectinload(Item.images))
-        .join(ItemImage)
-        .filter(Item.user_id == user_id, Item.is_completed == True, Item.category_id == category_id)
-        .order_by(Item.created_at.desc())
-        .all()
+    result = achievement_wall_entries(db, user_id, category_id)
+    return {"items": result, "total": len(result)}
+
+
+def achievement_wall_entries(db: Session, user_id: str, category_id: int) -> list:
+    """成就墙条目（已完成且带封面，按创建时间倒序），成就墙接口和拼图/导出共用"""
+    items = archive.fetch(
+        db, archive.tiers(db, user_id),
+        lambda M: [M.user_id == user_id, M.is_completed == True, M.category_id == category_id, M.images.any()],
+        lambda M: M.created_at,
+        options=lambda M: (joinedload(M.category), selectinload(M.images)),
     )
     seen_ids = set()
     result = []
@@ -331,24 +413,22 @@ def get_achievement_wall(
             seen_ids.add(item.id)
             cat_name = item.category.name if item.category else ""
             img_url = item.images[0].image_url if item.images else None
-            image_webp = None
-            if img_url and img_url.startswith("/api/uploads/"):
-                image_webp = "/api/serve-webp/" + img_url.replace("/api/uploads/", "").lstrip("/")
             result.append({
                 "id": item.id,
                 "title": item.title,
                 "image": img_url,
-                "image_webp": image_webp,
+                **_image_variants(img_url),
+                "placeholder": item.images[0].placeholder,
                 "date": item.finish_time.strftime("%Y-%m-%d") if item.finish_time else None,
                 "category": cat_name,
                 "notes": item.notes,
             })
-    return {"items": result, "total": len(result)}
+    return result
 
 
 @router.get("/{item_id}")
-def get_item(item_id: int, db: Session = Depends(get_db), user_id: str = Depends(get_user_id)):
-    item = db.query(Item).filter(Item.id == item_id, Item.user_id == user_id).first()
+def get_item(item_id: int, db: Session = Depends(get_read_db), user_id: str = Depends(get_user_id)):
+    item = archive.get(db, item_id, user_id)
     if not item:
         raise HTTPException(status_code=404, detail="记录不存在")
     return _item_to_response(item)
@@ -356,18 +436,21 @@ def get_item(item_id: int, db: Session = Depends(get_db), user_id: str = Depends
 
 @router.delete("/{item_id}")
 def delete_item(item_id: int, db: Session = Depends(get_db), user_id: str = Depends(get_user_id)):
-    item = db.query(Item).filter(Item.id == item_id, Item.user_id == user_id).first()
+    item = archive.hot_item(db, item_id, user_id)
     if not item:
         raise HTTPException(status_code=404, detail="记录不存在")
     for img in item.images:
         # 兼容旧路径和新路径
-        fp = img.image_url.replace("/api/uploads/", UPLOAD_DIR + "/").replace("/static/uploads/", UPLOAD_DIR + "/")
-        if os.path.exists(fp):
+        fp = upload_path(img.image_url)
+        if fp:
+            webp_cache.discard(fp)
+        if fp and os.path.exists(fp):
             try:
                 os.remove(fp)
             except Exception:
                 pass
     db.delete(item)
+    add_tombstone(db, user_id, "item", item_id)
     db.commit()
     return {"message": "记录删除成功"}
 
@@ -379,18 +462,16 @@ async def add_images(
     db: Session = Depends(get_db),
     user_id: str = Depends(get_user_id),
 ):
-    item = db.query(Item).filter(Item.id == item_id, Item.user_id == user_id).first()
+    item = archive.hot_item(db, item_id, user_id)
     if not item:
         raise HTTPException(status_code=404, detail="记录不存在")
     out = []
+    rank = image_order.append_rank(db, item.id)
     for f in files:
         if f.filename:
-            ext = Path(f.filename).suffix
-            fn = f"{uuid.uuid4()}{ext}"
-            path = os.path.join(UPLOAD_DIR, fn)
-            with open(path, "wb") as buf:
-                buf.write(await f.read())
-            img = ItemImage(item_id=item.id, image_url=f"/api/uploads/{fn}")
+            fn = await save_upload(f)
+            img = ItemImage(item_id=item.id, image_url=f"/api/uploads/{fn}", sort_order=rank, placeholder=await make_placeholder(fn))
+            rank += image_order.RANK_GAP
             db.add(img)
             out.append(img)
     db.commit()
@@ -407,39 +488,19 @@ async def add_cover_from_url(
     user_id: str = Depends(get_user_id),
 ):
     """为已有记录从 MAL 封面 URL 拉取并添加一张图片"""
-    item = db.query(Item).filter(Item.id == item_id, Item.user_id == user_id).first()
+    item = archive.hot_item(db, item_id, user_id)
     if not item:
         raise HTTPException(status_code=404, detail="记录不存在")
     if not cover_image_url or not cover_image_url.strip():
         raise HTTPException(status_code=400, detail="请提供封面链接")
     try:
-        parsed = urlparse(cover_image_url.strip())
-        if parsed.scheme not in ("https", "http") or parsed.netloc not in ALLOWED_COVER_HOSTS:
-            raise HTTPException(status_code=400, detail="封面链接仅允许来自 MyAnimeList 或 Bangumi CDN")
-        async with httpx.AsyncClient(follow_redirects=True, timeout=15.0) as client:
-            r = await client.get(cover_image_url.strip())
-            r.raise_for_status()
-            content_type = r.headers.get("content-type", "")
-            if "image/" not in content_type:
-                raise HTTPException(status_code=400, detail="链接不是有效图片")
-            ext = ".jpg"
-            if "png" in content_type:
-                ext = ".png"
-            elif "webp" in content_type:
-                ext = ".webp"
-            fn = f"{uuid.uuid4()}{ext}"
-            path = os.path.join(UPLOAD_DIR, fn)
-            with open(path, "wb") as buf:
-                buf.write(r.content)
-            img = ItemImage(item_id=item.id, image_url=f"/api/uploads/{fn}", sort_order=0)
-            db.add(img)
-            db.flush()
-            # 已有图片时，把新封面插到最前：其余 sort_order 统一 +1
-            db.execute(
-                update(ItemImage)
-                .where(ItemImage.item_id == item.id, ItemImage.id != img.id)
-                .values(sort_order=ItemImage.sort_order + 1)
-            )
+        fn = await _save_cover(cover_image_url)
+        # 插到最前，其余图片不动
+        img = ItemImage(
+            item_id=item.id, image_url=f"/api/uploads/{fn}",
+            sort_order=image_order.front_rank(db, item.id), placeholder=await make_placeholder(fn),
+        )
+        db.add(img)
         db.commit()
         db.refresh(img)
         out = list(item.images)  # 已按 sort_order, id 排序
@@ -452,35 +513,70 @@ async def add_cover_from_url(
         raise HTTPException(status_code=500, detail=f"保存封面失败: {str(e)}")
 
 
+class ImageMove(BaseModel):
+    image_id: int
+    after_id: Optional[int] = None  # 移到该图片之后；不传表示移到最前
+
+
+@router.patch("/{item_id}/images/order")
+def move_image(item_id: int, body: ImageMove, db: Session = Depends(get_db), user_id: str = Depends(get_user_id)):
+    """拖动排序：把一张图片移到 after_id 之后，只更新被移动的图片；返回排序后的全部图片"""
+    item = archive.hot_item(db, item_id, user_id)
+    if not item:
+        raise HTTPException(status_code=404, detail="记录不存在")
+    img = db.query(ItemImage).filter(ItemImage.id == body.image_id, ItemImage.item_id == item.id).first()
+    if not img:
+        raise HTTPException(status_code=404, detail="图片不存在")
+    if body.after_id == img.id or not image_order.move(db, item.id, img, body.after_id):
+        raise HTTPException(status_code=400, detail="目标位置无效")
+    db.commit()
+    db.refresh(item)
+    return [{"id": i.id, "image_url": i.image_url, "upload_time": i.upload_time.isoformat()} for i in item.images]
+
+
 @router.delete("/images/{image_id}")
 def delete_image(image_id: int, db: Session = Depends(get_db), user_id: str = Depends(get_user_id)):
-    img = db.query(ItemImage).join(Item).filter(ItemImage.id == image_id, Item.user_id == user_id).first()
-    if not img:
+    img = db.query(ItemImage).filter(ItemImage.id == image_id).first()
+    if not img or not archive.hot_item(db, img.item_id, user_id):
         raise HTTPException(status_code=404, detail="图片不存在")
-    fp = img.image_url.replace("/static/uploads/", UPLOAD_DIR + "/")
-    if os.path.exists(fp):
+    fp = upload_path(img.image_url)
+    if fp:
+        webp_cache.discard(fp)
+    if fp and os.path.exists(fp):
         try:
             os.remove(fp)
         except Exception:
             pass
+    # 删除后已没有图片行可供增量同步发现，更新所属记录的 updated_at
+    img.item.updated_at = datetime.utcnow()
     db.delete(img)
+    add_tombstone(db, user_id, "image", image_id)
     db.commit()
     return {"message": "图片删除成功"}
 
 
 @router.get("/statistics/year/{year}")
-def get_year_statistics(year: int, db: Session = Depends(get_db), user_id: str = Depends(get_user_id)):
-    items = (
-        db.query(Item)
-        .options(joinedload(Item.category))
-        .filter(
-            Item.user_id == user_id,
-            Item.is_completed == True,
-            Item.finish_time.isnot(None),
-            extract("year", Item.finish_time) == year
+def get_year_statistics(year: int, db: Session = Depends(get_read_db), user_id: str = Depends(get_user_id)):
+    if year_snapshot.is_closed(year):
+        return year_snapshot.load(db, user_id, year)["stats"]
+    return year_statistics(db, user_id, year)
+
+
+def year_statistics(db: Session, user_id: str, year: int) -> dict:
+    """年度统计：总数、按分类、按月份"""
+    items = []
+    for M in archive.tiers(db, user_id, year):
+        items += (
+            db.query(M)
+            .options(joinedload(M.category))
+            .filter(
+                M.user_id == user_id,
+                M.is_completed == True,
+                M.finish_time.isnot(None),
+                in_year(M.finish_time, year)
+            )
+            .all()
         )
-        .all()
-    )
     by_cat = {}
     by_month = {str(i): 0 for i in range(1, 13)}
     for i in items:
@@ -488,34 +584,69 @@ def get_year_statistics(year: int, db: Session = Depends(get_db), user_id: str =
         by_month[str(i.finish_time.month)] = by_month.get(str(i.finish_time.month), 0) + 1
     return {"total": len(items), "by_category": by_cat, "by_month": by_month}
 
+
+@router.get("/year-review/{year}")
+def get_year_review(
+    year: int,
+    request: Request,
+    db: Session = Depends(get_read_db),
+    user_id: str = Depends(get_user_id),
+):
+    """年度回顾（统计 + 年度墙条目）；已结束的年份直接返回预压缩快照，内容不变时返回 304"""
+    if year_snapshot.is_closed(year):
+        payload, etag = year_snapshot.get_snapshot(db, user_id, year)
+    else:
+        payload, etag = year_snapshot.encode(year_snapshot.build_document(db, user_id, year))
+    # 快照只有 gzip 一种压缩表示，按与压缩中间件相同的规则解析 Accept-Encoding（gzip;q=0 不算接受）
+    use_gzip = accepts(request.headers.get("accept-encoding"), "gzip")
+    # gzip 与未压缩两种表示的字节不同，各用一个强 ETag
+    etag = f'"{etag}-gz"' if use_gzip else f'"{etag}"'
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache", "Vary": "Accept-Encoding"}
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+    if use_gzip:
+        headers["Content-Encoding"] = "gzip"
+    else:
+        payload = gzip.decompress(payload)
+    return Response(content=payload, media_type="application/json", headers=headers)
+
+
 @router.get("/annual-gallery/{year}")
-def get_annual_gallery(year: int, db: Session = Depends(get_db), user_id: str = Depends(get_user_id)):
+def get_annual_gallery(year: int, db: Session = Depends(get_read_db), user_id: str = Depends(get_user_id)):
     """获取指定年份的所有带图记录，用于酷炫展示"""
-    items = (
-        db.query(Item)
-        .options(joinedload(Item.category), selectinload(Item.images))
-        .join(ItemImage)
-        .filter(
-            Item.user_id == user_id,
-            Item.is_completed == True,
-            Item.finish_time.isnot(None),
-            extract('year', Item.finish_time) == year
-        )
-        .order_by(Item.finish_time.asc())
-        .all()
+    if year_snapshot.is_closed(year):
+        return year_snapshot.load(db, user_id, year)["gallery"]
+    return annual_gallery_entries(db, user_id, year)
+
+
+def annual_gallery_entries(db: Session, user_id: str, year: int) -> list:
+    """年度墙条目（按完成时间正序），年度墙接口和年度回顾快照共用"""
+    items = archive.fetch(
+        db, archive.tiers(db, user_id, year),
+        lambda M: [
+            M.user_id == user_id,
+            M.is_completed == True,
+            M.finish_time.isnot(None),
+            in_year(M.finish_time, year),
+            M.images.any(),
+        ],
+        lambda M: M.finish_time, desc=False,
+        options=lambda M: (joinedload(M.category), selectinload(M.images)),
     )
     seen_ids = set()
     result = []
     for item in items:
         if item.id not in seen_ids and item.images:
             seen_ids.add(item.id)
+            img_url = item.images[0].image_url if item.images else None
             result.append({
                 "id": item.id,
                 "title": item.title,
-                "image": item.images[0].image_url if item.images else None,
+                "image": img_url,
+                **_image_variants(img_url),
+                "placeholder": item.images[0].placeholder,
                 "date": item.finish_time.strftime("%m-%d"),
                 "category": item.category.name,
                 "notes": item.notes
             })
-    
     return result
\ No newline at end of file
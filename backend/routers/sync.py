@@ -0,0 +1,159 @@
+"""
+增量同步：客户端首次不带 since 拉全量，之后带上次返回的 token，只拿到这段时间内变化的分类/记录和删除标记。
+
+token 是服务端本次查询开始的时间；下次查询时往前多取 SYNC_OVERLAP_SECONDS，覆盖 MySQL DATETIME 秒级精度
+以及查询期间尚未提交的事务，客户端按 id 覆盖写入即可，重复返回无副作用。
+token 早于删除标记保留期（SYNC_TOMBSTONE_DAYS）时返回 full=true 的全量数据，客户端应清空本地后重建。
+删除标记由后台任务 purge_loop 每 SYNC_PURGE_INTERVAL_SECONDS 清理一次，与存储回收无关。
+
+记录按 id 分页，每页最多 limit 条：响应的 next_cursor 不为空时带上同一个 since 和 cursor 继续请求，
+直到 next_cursor 为空，最后一页之后才保存 token。分类和删除标记只在第一页返回；后续页沿用第一页的查询时间，
+分页期间的修改由下一次同步取到。
+
+读请求走只读副本（用户刚写入时走主库，见 database.py）；副本复制延迟需小于 SYNC_OVERLAP_SECONDS。
+"""
+import asyncio
+import logging
+import os
+from datetime import datetime, timedelta
+from typing import Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy import or_
+from sqlalchemy.orm import Session, joinedload, selectinload
+
+from database import SessionLocal, get_read_db
+from models import Category, ItemImage, Tombstone
+from deps import get_user_id
+import archive
+
+logger = logging.getLogger("uvicorn.error")
+
+router = APIRouter(prefix="/api/sync", tags=["sync"])
+
+SYNC_OVERLAP_SECONDS = int(os.environ.get("SYNC_OVERLAP_SECONDS", 5))
+SYNC_TOMBSTONE_DAYS = int(os.environ.get("SYNC_TOMBSTONE_DAYS", 30))
+# 清理过期删除标记的间隔（秒），0 表示不在 API 进程内清理
+SYNC_PURGE_INTERVAL_SECONDS = int(os.environ.get("SYNC_PURGE_INTERVAL_SECONDS", 86400))
+# 每页记录数（默认值和上限）
+SYNC_PAGE_SIZE = int(os.environ.get("SYNC_PAGE_SIZE", 500))
+SYNC_MAX_PAGE_SIZE = int(os.environ.get("SYNC_MAX_PAGE_SIZE", 2000))
+TOKEN_FORMAT = "%Y%m%d%H%M%S%f"
+
+
+def add_tombstone(db: Session, user_id: str, entity: str, entity_id: int):
+    """记录一次删除（entity 为 item / image / category），随删除操作一起提交"""
+    db.add(Tombstone(user_id=user_id, entity=entity, entity_id=entity_id))
+
+
+def purge_tombstones(db: Session) -> int:
+    """删除超过保留期的删除标记，返回删除条数"""
+    cutoff = datetime.utcnow() - timedelta(days=SYNC_TOMBSTONE_DAYS)
+    n = db.query(Tombstone).filter(Tombstone.deleted_at < cutoff).delete(synchronize_session=False)
+    db.commit()
+    return n
+
+
+async def purge_loop():
+    """API 进程内定期清理过期删除标记；多个 worker 同时执行只是重复删除"""
+    while True:
+        await asyncio.sleep(SYNC_PURGE_INTERVAL_SECONDS)
+        try:
+            n = await asyncio.to_thread(_purge)
+            if n:
+                logger.info("sync: purged %d tombstones", n)
+        except Exception as e:
+            logger.warning("tombstone purge failed: %s", e)
+
+
+def _purge() -> int:
+    db = SessionLocal()
+    try:
+        return purge_tombstones(db)
+    finally:
+        db.close()
+
+
+def _decode_token(token: Optional[str]) -> Optional[datetime]:
+    if not token:
+        return None
+    try:
+        return datetime.strptime(token, TOKEN_FORMAT)
+    except ValueError:
+        return None
+
+
+def _decode_cursor(cursor: str) -> tuple:
+    """游标为「第一页的查询时间 token.本页最后一条记录 id」"""
+    token, _, last_id = cursor.partition(".")
+    started = _decode_token(token)
+    if started is None or not last_id.isdigit():
+        raise HTTPException(status_code=400, detail="同步游标无效")
+    return started, int(last_id)
+
+
+@router.get("/")
+def sync(
+    since: Optional[str] = Query(None, description="上次同步返回的 token；不传则返回全量"),
+    cursor: Optional[str] = Query(None, description="上一页返回的 next_cursor；不传表示第一页"),
+    limit: int = Query(SYNC_PAGE_SIZE, ge=1, le=SYNC_MAX_PAGE_SIZE),
+    db: Session = Depends(get_read_db),
+    user_id: str = Depends(get_user_id),
+):
+    from routers.categories import _category_to_response
+    from routers.items import _item_to_response
+
+    if cursor:
+        now, after = _decode_cursor(cursor)
+    else:
+        now, after = datetime.utcnow(), 0
+    since_dt = _decode_token(since)
+    full = since_dt is None or since_dt < now - timedelta(days=SYNC_TOMBSTONE_DAYS)
+
+    cat_q = db.query(Category).filter(Category.user_id == user_id)
+    window = None if full else since_dt - timedelta(seconds=SYNC_OVERLAP_SECONDS)
+
+    def item_filters(M):
+        filters = [M.user_id == user_id, M.id > after]
+        if window is not None:
+            # 图片新增/排序变化只更新 item_images.updated_at，所属记录也算变化，整条返回
+            image_changed = (
+                db.query(ItemImage.item_id)
+                .join(M, M.id == ItemImage.item_id)
+                .filter(M.user_id == user_id, ItemImage.updated_at >= window)
+            )
+            filters.append(or_(M.updated_at >= window, M.id.in_(image_changed)))
+        return filters
+
+    # 归档只移动行、不改 updated_at，冷热两层分别查询后合并即可
+    items = archive.fetch(
+        db, archive.tiers(db, user_id), item_filters, lambda M: M.id, desc=False,
+        options=lambda M: (joinedload(M.category), selectinload(M.images)), limit=limit,
+    )
+    token = now.strftime(TOKEN_FORMAT)
+    next_cursor = f"{token}.{items[-1].id}" if len(items) == limit else None
+    deleted = {"items": [], "images": [], "categories": []}
+    if cursor:
+        # 分类和删除标记已随第一页返回
+        cat_q = None
+    elif not full:
+        cat_q = cat_q.filter(Category.updated_at >= window)
+        rows = (
+            db.query(Tombstone.entity, Tombstone.entity_id)
+            .filter(Tombstone.user_id == user_id, Tombstone.deleted_at >= window)
+            .all()
+        )
+        keys = {"item": "items", "image": "images", "category": "categories"}
+        for entity, entity_id in rows:
+            deleted[keys[entity]].append(entity_id)
+    categories = [_category_to_response(c) for c in cat_q.order_by(Category.created_at).all()] if cat_q is not None else []
+
+    return {
+        "token": token,
+        "next_cursor": next_cursor,
+        "full": full,
+        "user_id": user_id,
+        "categories": categories,
+        "items": [_item_to_response(i) for i in items],
+        "deleted": deleted,
+    }
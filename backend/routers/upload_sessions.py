@@ -0,0 +1,182 @@
+"""
+图片断点续传 API（参考 tus 协议），会话存储见 resumable.py：
+    POST   /api/upload-sessions/                 创建会话 {item_id, filename, length}
+    HEAD   /api/upload-sessions/{id}             查询已收到的字节数（Upload-Offset 头；GET 同时返回 JSON）
+    PATCH  /api/upload-sessions/{id}             请求头 Upload-Offset 为本分片起始偏移，请求体为分片字节
+    POST   /api/upload-sessions/{id}/finalize    校验图片并添加到记录，返回与 /api/items/{id}/images 相同的图片结构
+    DELETE /api/upload-sessions/{id}             取消
+原有的整文件上传接口不变。
+"""
+import asyncio
+from pathlib import Path
+
+from fastapi import APIRouter, Depends, Header, HTTPException, Request, Response
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel
+from sqlalchemy.orm import Session
+from starlette.requests import ClientDisconnect
+
+from database import get_db
+from models import ItemImage
+from deps import get_user_id
+import archive
+import image_order
+import resumable
+from uploads import IMAGE_MAX_BYTES, save_staged, make_placeholder, remove_upload
+
+router = APIRouter(prefix="/api/upload-sessions", tags=["upload-sessions"])
+
+
+class UploadSessionCreate(BaseModel):
+    item_id: int
+    filename: str = ""
+    length: int
+
+
+def _load(session_id: str, user_id: str) -> dict:
+    try:
+        return resumable.load(session_id, user_id)
+    except resumable.SessionNotFound:
+        raise HTTPException(status_code=404, detail="上传会话不存在或已过期")
+
+
+def _lock(session_id: str):
+    try:
+        return resumable.open_locked(session_id)
+    except resumable.SessionBusy:
+        raise HTTPException(status_code=409, detail="该上传正在写入或提交，请稍后重试")
+
+
+def _session_headers(meta: dict) -> dict:
+    return {
+        "Upload-Offset": str(meta["offset"] or 0),
+        "Upload-Length": str(meta["length"]),
+        "Cache-Control": "no-store",
+    }
+
+
+def _session_response(meta: dict) -> dict:
+    return {
+        "id": meta["id"],
+        "item_id": meta["item_id"],
+        "offset": meta["offset"] or 0,
+        "length": meta["length"],
+        "chunk_size": resumable.UPLOAD_CHUNK_SIZE,
+        "parallelism": resumable.UPLOAD_PARALLELISM,
+        "expires_in": resumable.UPLOAD_SESSION_TTL,
+    }
+
+
+@router.post("/", status_code=201)
+def create_session(
+    body: UploadSessionCreate,
+    response: Response,
+    db: Session = Depends(get_db),
+    user_id: str = Depends(get_user_id),
+):
+    if body.length <= 0:
+        raise HTTPException(status_code=400, detail="文件大小无效")
+    if body.length > IMAGE_MAX_BYTES:
+        raise HTTPException(status_code=413, detail=f"图片不能超过 {IMAGE_MAX_BYTES // (1024 * 1024)}MB")
+    if not archive.get(db, body.item_id, user_id):
+        raise HTTPException(status_code=404, detail="记录不存在")
+    meta = resumable.create(user_id, body.item_id, body.length, Path(body.filename).suffix)
+    meta["offset"] = 0
+    response.headers["Location"] = f"{router.prefix}/{meta['id']}"
+    response.headers.update(_session_headers(meta))
+    return _session_response(meta)
+
+
+@router.api_route("/{session_id}", methods=["GET", "HEAD"])
+def get_session(session_id: str, user_id: str = Depends(get_user_id)):
+    meta = _load(session_id, user_id)
+    return JSONResponse(content=_session_response(meta), headers=_session_headers(meta))
+
+
+@router.patch("/{session_id}")
+async def upload_chunk(
+    session_id: str,
+    request: Request,
+    upload_offset: int = Header(..., alias="Upload-Offset"),
+    user_id: str = Depends(get_user_id),
+):
+    meta = _load(session_id, user_id)
+    f = _lock(session_id)
+    try:
+        offset = f.tell()
+        if upload_offset != offset:
+            raise HTTPException(status_code=409, detail="分片偏移量与已上传字节数不一致", headers={"Upload-Offset": str(offset)})
+        limit = min(resumable.UPLOAD_CHUNK_SIZE, meta["length"] - offset)
+        received = 0
+        try:
+            async for chunk in request.stream():
+                received += len(chunk)
+                if received > limit:
+                    # 超长的分片整体作废，偏移量回到本分片开始处
+                    f.truncate(offset)
+                    raise HTTPException(
+                        status_code=413, detail=f"分片超出文件剩余大小或分片上限（{limit} 字节）", headers={"Upload-Offset": str(offset)}
+                    )
+                await asyncio.to_thread(f.write, chunk)
+        except ClientDisconnect:
+            # 连接中断：已收到的字节保留，客户端查询偏移量后续传
+            pass
+        new_offset = f.tell()
+    finally:
+        f.close()
+    return Response(status_code=204, headers={"Upload-Offset": str(new_offset), "Cache-Control": "no-store"})
+
+
+@router.post("/{session_id}/finalize")
+async def finalize_session(
+    session_id: str,
+    db: Session = Depends(get_db),
+    user_id: str = Depends(get_user_id),
+):
+    meta = _load(session_id, user_id)
+    if meta.get("result"):
+        # 上次提交成功但客户端没收到响应
+        return meta["result"]
+    f = _lock(session_id)
+    fn = None
+    try:
+        if f.tell() != meta["length"]:
+            raise HTTPException(
+                status_code=409, detail="文件尚未上传完整", headers={"Upload-Offset": str(f.tell())}
+            )
+        item = archive.hot_item(db, meta["item_id"], user_id)
+        if not item:
+            resumable.delete(session_id)
+            raise HTTPException(status_code=404, detail="记录不存在")
+        try:
+            fn = await save_staged(resumable.staging_path(session_id), meta["ext"])
+        except HTTPException:
+            resumable.delete(session_id)
+            raise
+        img = ItemImage(
+            item_id=item.id, image_url=f"/api/uploads/{fn}",
+            sort_order=image_order.append_rank(db, item.id), placeholder=await make_placeholder(fn),
+        )
+        db.add(img)
+        db.commit()
+        # 已写入数据库，之后出错也不能再删除图片文件
+        fn = None
+        db.refresh(img)
+        result = {"id": img.id, "image_url": img.image_url, "upload_time": img.upload_time.isoformat()}
+        resumable.mark_done(session_id, result)
+    except BaseException:
+        # 暂存文件仍在，删除本次入库的文件后会话可以重新提交
+        if fn:
+            db.rollback()
+            remove_upload(fn)
+        raise
+    finally:
+        f.close()
+    return result
+
+
+@router.delete("/{session_id}")
+def cancel_session(session_id: str, user_id: str = Depends(get_user_id)):
+    _load(session_id, user_id)
+    resumable.delete(session_id)
+    return {"message": "上传已取消"}
@@ -0,0 +1,71 @@
+import json
+import os
+
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from fastapi.responses import FileResponse, Response
+from sqlalchemy.orm import Session
+
+from compression import etag_matches
+from database import get_read_db
+from deps import get_user_id
+from routers.items import achievement_wall_entries
+import wall_atlas
+
+router = APIRouter(prefix="/api/wall", tags=["wall"])
+
+
+@router.get("/atlas")
+async def get_wall_atlas(
+    request: Request,
+    category_id: int = Query(...),
+    db: Session = Depends(get_read_db),
+    user_id: str = Depends(get_user_id),
+):
+    """成就墙雪碧图坐标表：tiles 为 记录 id -> [第几张雪碧图, 列, 行]；条目不变时返回 304"""
+    entries = achievement_wall_entries(db, user_id, category_id)
+    data = await wall_atlas.build_atlas(user_id, category_id, entries)
+    etag = f'"{data["digest"]}"'
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers={"ETag": etag})
+    return Response(
+        content=json.dumps(data, separators=(",", ":")),
+        media_type="application/json",
+        headers={"ETag": etag, "Cache-Control": "no-cache"},
+    )
+
+
+@router.get("/atlas/{name}")
+def get_wall_atlas_sheet(name: str):
+    """雪碧图文件；文件名含条目摘要，内容不会变化，可长期缓存"""
+    path = wall_atlas.sheet_path(name)
+    if not path:
+        raise HTTPException(status_code=400, detail="文件名不合法")
+    if not os.path.isfile(path):
+        raise HTTPException(status_code=404, detail="雪碧图不存在")
+    return FileResponse(path, media_type="image/webp", headers={"Cache-Control": "public, max-age=31536000, immutable"})
+
+
+@router.get("/export")
+async def export_wall(
+    category_id: int = Query(...),
+    cols: int = Query(8, ge=1, le=30),
+    tile: int = Query(240, ge=60, le=600),
+    gap: int = Query(8, ge=0, le=64),
+    bg: str = Query("#0f0f1a", regex="^#[0-9a-fA-F]{6}$"),
+    db: Session = Depends(get_read_db),
+    user_id: str = Depends(get_user_id),
+):
+    """服务端生成整墙 JPEG（每张封面完整显示），用于「保存为图片」"""
+    entries = achievement_wall_entries(db, user_id, category_id)
+    if not entries:
+        raise HTTPException(status_code=404, detail="该分类没有带封面的记录")
+    width, height = wall_atlas.export_size(len(entries), cols, tile, gap)
+    if height > wall_atlas.WALL_EXPORT_MAX_SIDE:
+        raise HTTPException(status_code=400, detail="图片过高，请增加列数或减小格子尺寸")
+    if width * height > wall_atlas.WALL_EXPORT_MAX_PIXELS:
+        raise HTTPException(
+            status_code=413,
+            detail=f"导出图片过大（{width}x{height}），上限 {wall_atlas.WALL_EXPORT_MAX_PIXELS} 像素，请减小格子尺寸或间距",
+        )
+    path = await wall_atlas.build_export(user_id, category_id, entries, cols, tile, gap, bg)
+    return FileResponse(path, media_type="image/jpeg", filename=f"logfolio-achievement-wall-{category_id}.jpg")
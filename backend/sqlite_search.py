@@ -0,0 +1,80 @@
+"""
+SQLite 模式下的记录全文搜索：items_fts 是 items 的 FTS5 外部内容表（trigram 分词，任意子串匹配、不区分大小写），
+由触发器与 items 保持同步。搜索词不少于 FTS_MIN_CHARS 个字符时 get_items 用 MATCH 走索引，更短的词仍用 LIKE。
+MySQL 下不创建，搜索沿用 LIKE。表由迁移 0002（migrations.py）创建，已有数据在创建时一次性重建索引。
+"""
+import logging
+
+from sqlalchemy import text
+from sqlalchemy.exc import OperationalError
+
+from models import Item
+
+logger = logging.getLogger("uvicorn.error")
+
+# trigram 分词至少需要 3 个字符才能匹配
+FTS_MIN_CHARS = 3
+
+_DDL = [
+    """CREATE VIRTUAL TABLE IF NOT EXISTS items_fts USING fts5(
+        title, notes, content='items', content_rowid='id', tokenize='trigram'
+    )""",
+    """CREATE TRIGGER IF NOT EXISTS items_fts_ai AFTER INSERT ON items BEGIN
+        INSERT INTO items_fts(rowid, title, notes) VALUES (new.id, new.title, new.notes);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS items_fts_ad AFTER DELETE ON items BEGIN
+        INSERT INTO items_fts(items_fts, rowid, title, notes) VALUES ('delete', old.id, old.title, old.notes);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS items_fts_au AFTER UPDATE OF title, notes ON items BEGIN
+        INSERT INTO items_fts(items_fts, rowid, title, notes) VALUES ('delete', old.id, old.title, old.notes);
+        INSERT INTO items_fts(rowid, title, notes) VALUES (new.id, new.title, new.notes);
+    END""",
+]
+
+# engine -> 是否存在 items_fts
+_available = {}
+
+
+def ensure(conn) -> bool:
+    """创建 items_fts 及同步触发器；新建时从 items 重建索引。SQLite 不支持 FTS5/trigram 时返回 False"""
+    if conn.dialect.name != "sqlite":
+        return False
+    existed = conn.execute(
+        text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'items_fts'")
+    ).first() is not None
+    try:
+        for ddl in _DDL:
+            conn.execute(text(ddl))
+    except OperationalError as e:
+        logger.warning("SQLite 不支持 FTS5 trigram，搜索使用 LIKE: %s", e)
+        return False
+    if not existed:
+        rebuild(conn)
+        print("已创建全文索引 items_fts")
+    return True
+
+
+def rebuild(conn):
+    """按 items 当前内容重建全文索引"""
+    conn.execute(text("INSERT INTO items_fts(items_fts) VALUES ('rebuild')"))
+
+
+def available(db) -> bool:
+    """当前会话的数据库是否可以用 items_fts 搜索"""
+    bind = db.get_bind()
+    if bind.dialect.name != "sqlite":
+        return False
+    if bind not in _available:
+        with bind.connect() as conn:
+            _available[bind] = conn.execute(
+                text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'items_fts'")
+            ).first() is not None
+    return _available[bind]
+
+
+def match_filter(term: str):
+    """标题或备注包含 term 的过滤条件（term 作为短语整体匹配）"""
+    phrase = '"' + term.replace('"', '""') + '"'
+    return Item.id.in_(
+        text("SELECT rowid FROM items_fts WHERE items_fts MATCH :fts_q").bindparams(fts_q=phrase)
+    )
@@ -0,0 +1,224 @@
+"""
+上传目录垃圾回收：清理 UPLOAD_DIR 中没有被任何 ItemImage 引用的孤儿文件，以及过期/超额的 WebP 缓存。
+
+孤儿文件来源：create_item 写文件后报错、旧版 delete_image 未删除 /api/uploads/ 文件等。
+流程：os.scandir 分批扫描 → 与 ItemImage.image_url 集合比对 → 孤儿先移入隔离区 → 超过保留期再真正删除。
+WebP 缓存：源文件已不存在的缓存直接删除；总大小超过 WEBP_CACHE_MAX_BYTES 时按 LRU 淘汰。
+断点续传会话目录和上传中的 .part 临时文件不参与孤儿比对；超过 GC_PART_MAX_AGE_SECONDS 的 .part 视为崩溃遗留直接删除。
+
+用法（在 backend/ 下）：
+    python storage_gc.py              # 执行一次回收
+    python storage_gc.py --dry-run    # 只统计，不移动/删除
+    python storage_gc.py --purge-now  # 隔离区文件不等保留期，直接删除
+"""
+import argparse
+import asyncio
+import logging
+import os
+import time
+
+from config import UPLOAD_DIR
+import resumable
+import webp_cache
+
+logger = logging.getLogger("uvicorn.error")
+
+# 孤儿文件隔离目录（在 UPLOAD_DIR 内，以 . 开头不会被当作上传文件扫描）
+QUARANTINE_DIR = os.path.join(UPLOAD_DIR, ".gc_quarantine")
+# 新写入的文件可能还没提交到数据库，小于该秒数的文件不视为孤儿
+GC_MIN_AGE_SECONDS = int(os.environ.get("GC_MIN_AGE_SECONDS", 3600))
+# 隔离区保留时间，超过后真正删除；期间若又被引用会移回上传目录
+GC_QUARANTINE_SECONDS = int(os.environ.get("GC_QUARANTINE_SECONDS", 7 * 86400))
+# 上传中的临时文件后缀（见 uploads._tmp_path），不当作孤儿隔离
+PART_SUFFIX = ".part"
+# 超过该秒数未修改的 .part 是进程崩溃遗留的，直接删除（单次上传不会持续这么久）
+GC_PART_MAX_AGE_SECONDS = int(os.environ.get("GC_PART_MAX_AGE_SECONDS", 86400))
+# 扫描时跳过的 UPLOAD_DIR 子目录：断点续传会话、隔离区、WebP 缓存各有自己的清理流程
+EXCLUDED_DIRS = frozenset(
+    os.path.basename(d) for d in (resumable.SESSION_DIR, QUARANTINE_DIR, webp_cache.WEBP_CACHE_DIR)
+)
+# 每处理多少个目录项休眠一次，避免后台回收占满磁盘 IO
+GC_BATCH_SIZE = int(os.environ.get("GC_BATCH_SIZE", 500))
+GC_BATCH_SLEEP = float(os.environ.get("GC_BATCH_SLEEP", 0.05))
+# 后台回收间隔（秒），0 表示不在 API 进程内启动后台回收
+GC_INTERVAL_SECONDS = int(os.environ.get("GC_INTERVAL_SECONDS", 86400))
+
+UPLOAD_URL_PREFIXES = ("/api/uploads/", "/static/uploads/")
+
+
+def upload_filename(image_url: str):
+    """ItemImage.image_url 对应的上传文件名；非本地上传（外链等）返回 None"""
+    url = (image_url or "").strip()
+    for prefix in UPLOAD_URL_PREFIXES:
+        if url.startswith(prefix):
+            name = os.path.basename(url[len(prefix):])
+            return name or None
+    return None
+
+
+def upload_path(image_url: str):
+    """ItemImage.image_url 对应的磁盘路径（兼容 /api/uploads/ 与旧的 /static/uploads/）"""
+    name = upload_filename(image_url)
+    return os.path.join(UPLOAD_DIR, name) if name else None
+
+
+def referenced_filenames(db) -> set:
+    """一次性读出所有被引用的上传文件名（只查 image_url 一列，分批拉取）"""
+    from models import ItemImage
+
+    names = set()
+    for (url,) in db.query(ItemImage.image_url).yield_per(2000):
+        name = upload_filename(url)
+        if name:
+            names.add(name)
+    return names
+
+
+def _throttled_scandir(path: str):
+    """逐个产出目录下的普通文件（跳过 EXCLUDED_DIRS 和 . 开头的目录/文件），每 GC_BATCH_SIZE 项休眠一次"""
+    if not os.path.isdir(path):
+        return
+    with os.scandir(path) as it:
+        for n, entry in enumerate(it, 1):
+            if n % GC_BATCH_SIZE == 0 and GC_BATCH_SLEEP > 0:
+                time.sleep(GC_BATCH_SLEEP)
+            if entry.name in EXCLUDED_DIRS or entry.name.startswith("."):
+                continue
+            try:
+                if not entry.is_file(follow_symlinks=False):
+                    continue
+                st = entry.stat(follow_symlinks=False)
+            except OSError:
+                continue
+            yield entry, st
+
+
+def _quarantine_orphans(referenced: set, now: float, dry_run: bool, report: dict):
+    for entry, st in _throttled_scandir(UPLOAD_DIR):
+        report["scanned"] += 1
+        if entry.name.endswith(PART_SUFFIX):
+            _discard_stale_part(entry, st, now, dry_run, report)
+            continue
+        if entry.name in referenced or now - st.st_mtime < GC_MIN_AGE_SECONDS:
+            continue
+        report["orphans"] += 1
+        report["orphan_bytes"] += st.st_size
+        if dry_run:
+            continue
+        try:
+            os.makedirs(QUARANTINE_DIR, exist_ok=True)
+            dst = os.path.join(QUARANTINE_DIR, entry.name)
+            os.replace(entry.path, dst)
+            # 用 mtime 记录进入隔离区的时间，作为保留期起点
+            os.utime(dst, (now, now))
+        except OSError as e:
+            logger.warning("storage_gc quarantine failed for %s: %s", entry.name, e)
+
+
+def _discard_stale_part(entry, st, now: float, dry_run: bool, report: dict):
+    """上传中的临时文件不进隔离区；只删除超过 GC_PART_MAX_AGE_SECONDS 的崩溃遗留"""
+    if now - st.st_mtime < GC_PART_MAX_AGE_SECONDS:
+        return
+    report["parts_purged"] += 1
+    report["parts_purged_bytes"] += st.st_size
+    if not dry_run:
+        try:
+            os.remove(entry.path)
+        except OSError as e:
+            logger.warning("storage_gc remove failed for %s: %s", entry.name, e)
+
+
+def _purge_quarantine(referenced: set, now: float, purge_now: bool, dry_run: bool, report: dict):
+    for entry, st in _throttled_scandir(QUARANTINE_DIR):
+        if entry.name in referenced:
+            # 隔离后又被引用（如从备份恢复了数据库），移回上传目录
+            report["restored"] += 1
+            if not dry_run:
+                try:
+                    os.replace(entry.path, os.path.join(UPLOAD_DIR, entry.name))
+                except OSError as e:
+                    logger.warning("storage_gc restore failed for %s: %s", entry.name, e)
+            continue
+        if not purge_now and now - st.st_mtime < GC_QUARANTINE_SECONDS:
+            continue
+        report["purged"] += 1
+        report["purged_bytes"] += st.st_size
+        if not dry_run:
+            try:
+                os.remove(entry.path)
+            except OSError as e:
+                logger.warning("storage_gc purge failed for %s: %s", entry.name, e)
+
+
+def _compact_webp_cache(referenced: set, dry_run: bool, report: dict):
+    """删除源文件已不再被引用的缓存；剩余缓存超出预算时按 LRU 淘汰"""
+    webp_cache.ensure_index()
+    valid = {webp_cache.source_key(name) for name in referenced}
+    for entry, st in _throttled_scandir(webp_cache.WEBP_CACHE_DIR):
+        if webp_cache.cache_source_key(entry.name) in valid:
+            continue
+        report["cache_evicted"] += 1
+        report["cache_evicted_bytes"] += st.st_size
+        if not dry_run:
+            webp_cache.discard_entry(entry.path)
+    count, size = webp_cache.enforce_budget(dry_run=dry_run)
+    report["cache_evicted"] += count
+    report["cache_evicted_bytes"] += size
+    if not dry_run:
+        webp_cache.save_index()
+
+
+def run_gc(dry_run: bool = False, purge_now: bool = False, include_cache: bool = True) -> dict:
+    """执行一次完整回收，返回统计（reclaimed_bytes 为本次真正释放的字节数）"""
+    from database import SessionLocal
+
+    started = time.time()
+    report = {
+        "scanned": 0, "orphans": 0, "orphan_bytes": 0, "restored": 0,
+        "purged": 0, "purged_bytes": 0, "parts_purged": 0, "parts_purged_bytes": 0,
+        "cache_evicted": 0, "cache_evicted_bytes": 0,
+    }
+    db = SessionLocal()
+    try:
+        referenced = referenced_filenames(db)
+    finally:
+        db.close()
+    _quarantine_orphans(referenced, started, dry_run, report)
+    _purge_quarantine(referenced, started, purge_now, dry_run, report)
+    if include_cache:
+        _compact_webp_cache(referenced, dry_run, report)
+    report["reclaimed_bytes"] = report["purged_bytes"] + report["parts_purged_bytes"] + report["cache_evicted_bytes"]
+    report["dry_run"] = dry_run
+    report["elapsed"] = round(time.time() - started, 3)
+    logger.info("storage_gc done: %s", report)
+    return report
+
+
+async def gc_loop():
+    """API 进程内的后台回收：启动后先等一个间隔，避免和部署后的首批请求抢 IO"""
+    while True:
+        await asyncio.sleep(GC_INTERVAL_SECONDS)
+        try:
+            await asyncio.to_thread(run_gc)
+        except Exception as e:
+            logger.warning("storage_gc background run failed: %s", e)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="清理上传目录中的孤儿文件和 WebP 缓存")
+    parser.add_argument("--dry-run", action="store_true", help="只统计，不移动或删除文件")
+    parser.add_argument("--purge-now", action="store_true", help="隔离区文件忽略保留期，直接删除")
+    parser.add_argument("--skip-cache", action="store_true", help="不处理 WebP 缓存")
+    args = parser.parse_args()
+
+    report = run_gc(dry_run=args.dry_run, purge_now=args.purge_now, include_cache=not args.skip_cache)
+    print(f"扫描文件: {report['scanned']}")
+    print(f"孤儿文件: {report['orphans']} ({report['orphan_bytes']} 字节){'（未移动）' if args.dry_run else ' 已移入隔离区'}")
+    print(f"隔离区恢复: {report['restored']}，删除: {report['purged']} ({report['purged_bytes']} 字节)")
+    print(f"遗留临时文件: {report['parts_purged']} ({report['parts_purged_bytes']} 字节)")
+    print(f"WebP 缓存淘汰: {report['cache_evicted']} ({report['cache_evicted_bytes']} 字节)")
+    print(f"共释放: {report['reclaimed_bytes']} 字节，耗时 {report['elapsed']}s")
+
+
+if __name__ == "__main__":
+    main()
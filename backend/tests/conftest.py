@@ -0,0 +1,59 @@
+"""
+测试公共配置：把 backend/ 加入导入路径，并用临时目录下的 SQLite 和上传目录替换 config 模块
+（config.py 不在仓库中，测试也不应连到本机配置的数据库）；接口测试在短时间内连续请求，关闭限流。
+
+在 backend/ 下运行：python -m pytest -q
+"""
+import os
+import sys
+import tempfile
+import types
+
+import pytest
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if BACKEND_DIR not in sys.path:
+    sys.path.insert(0, BACKEND_DIR)
+
+TEST_DIR = tempfile.mkdtemp(prefix="logfolio_test_")
+
+config = types.ModuleType("config")
+config.DATABASE_URL = f"sqlite:///{os.path.join(TEST_DIR, 'primary.db')}"
+config.UPLOAD_DIR = os.path.join(TEST_DIR, "uploads")
+os.makedirs(config.UPLOAD_DIR, exist_ok=True)
+sys.modules["config"] = config
+
+os.environ.setdefault("RATE_LIMIT_ENABLED", "0")
+
+
+def init_schema(engine):
+    """建表并执行迁移（与 init_db.py 相同）"""
+    import database
+    import migrations
+
+    database.Base.metadata.create_all(bind=engine)
+    migrations.run(engine)
+
+
+@pytest.fixture
+def primary():
+    """已建表、数据清空的主库，返回会话工厂"""
+    import database
+    from models import Category, Item, ItemImage
+
+    init_schema(database.engine)
+    db = database.SessionLocal()
+    for model in (ItemImage, Item, Category):
+        db.query(model).delete()
+    db.commit()
+    db.close()
+    return database.SessionLocal
+
+
+@pytest.fixture
+def client():
+    import main
+    from fastapi.testclient import TestClient
+
+    # 不进入 with 块，不触发启动任务（存储回收、缓存预热等）
+    return TestClient(main.app)
@@ -0,0 +1,72 @@
+"""冷热分层的读路径：热表与归档表分别查询后合并，分页、按 id 读取、年份与同名查找覆盖两层"""
+from datetime import datetime
+
+import pytest
+
+import archive
+from models import ArchivedItem, Category, Item, ItemImage
+
+USER = {"X-User-ID": "archive-user"}
+
+
+@pytest.fixture
+def tiered(primary):
+    """同一用户 6 条热表记录、6 条归档记录，创建时间交错；返回按 created_at 倒序的 id 列表"""
+    db = primary()
+    db.query(ArchivedItem).delete()
+    cat = Category(name="书", user_id=USER["X-User-ID"])
+    db.add(cat)
+    db.commit()
+    for n in range(12):
+        db.add(Item(
+            title=f"第 {n} 本", user_id=USER["X-User-ID"], category_id=cat.id, is_completed=True,
+            finish_time=datetime(2015 + n, 6, 1), created_at=datetime(2020, 1, 1 + (n * 5) % 12),
+        ))
+    db.commit()
+    ids = [i.id for i in db.query(Item).order_by(Item.created_at.desc()).all()]
+    # 偶数号记录（完成时间较早的一半中的和较晚的一半中的都有）移入归档表
+    old = [i.id for i in db.query(Item).filter(Item.title.in_([f"第 {n} 本" for n in range(0, 12, 2)])).all()]
+    archive._move(db, archive._HOT, archive._COLD, [archive._HOT.c.id.in_(old)], archived_at=datetime.utcnow())
+    db.add(ItemImage(item_id=old[0], image_url="/api/uploads/a.jpg"))
+    db.commit()
+    db.close()
+    yield ids, old
+    db = primary()
+    db.query(ArchivedItem).delete()
+    db.commit()
+    db.close()
+
+
+def test_paging_merges_both_tiers(client, tiered):
+    ids, _ = tiered
+    pages = []
+    for offset in range(0, 12, 5):
+        r = client.get("/api/items/", params={"limit": 5, "offset": offset}, headers=USER)
+        assert r.json()["total"] == 12
+        pages += [i["id"] for i in r.json()["items"]]
+    assert pages == ids
+    assert [i["id"] for i in client.get("/api/items/", headers=USER).json()] == ids
+
+
+def test_reads_reach_archived_rows(client, tiered):
+    _, old = tiered
+    item = client.get(f"/api/items/{old[0]}", headers=USER).json()
+    assert item["id"] == old[0] and item["images"][0]["image_url"] == "/api/uploads/a.jpg"
+    assert client.get("/api/items/years", headers=USER).json()["years"] == list(range(2026, 2014, -1))
+    assert client.get("/api/items/category-counts", headers=USER).json()["total"] == 12
+    found = client.post("/api/items/lookup", json={"titles": ["第 0 本", "第 1 本"]}, headers=USER).json()
+    assert [len(r["items"]) for r in found["results"]] == [1, 1]
+    wall = client.get("/api/items/achievement-wall", params={"category_id": item["category_id"]}, headers=USER)
+    assert [i["id"] for i in wall.json()["items"]] == [old[0]]
+
+
+def test_tiers_skip_archive_when_not_needed(primary, tiered):
+    db = primary()
+    try:
+        assert archive.tiers(db, USER["X-User-ID"]) == [Item, ArchivedItem]
+        # 最晚归档的是 2025 年完成的记录
+        assert archive.tiers(db, USER["X-User-ID"], 2026) == [Item]
+        assert archive.tiers(db, "someone-else") == [Item]
+        assert archive.orphan_images(db) == 0
+    finally:
+        db.close()
@@ -0,0 +1,64 @@
+"""增量备份：未变化的分块复用上一快照；不更新 updated_at 的占位图补齐也会重新导出"""
+import gzip
+import json
+import os
+from datetime import datetime
+
+import pytest
+
+import backup
+import database
+from models import Category, Item, ItemImage
+
+
+@pytest.fixture
+def snapshot(primary, tmp_path):
+    """创建快照；快照名精确到秒，创建后按序号改名，同一秒内的多次备份不冲突"""
+    dest = tmp_path / "backups"
+    names = iter(range(1, 100))
+
+    def create():
+        snap_dir = backup.create(str(dest), source_url=database.DATABASE_URL)
+        renamed = str(dest / f"{next(names):02d}")
+        os.rename(snap_dir, renamed)
+        return renamed
+    return create
+
+
+def _images(snap_dir: str) -> dict:
+    manifest = backup.load_manifest(snap_dir)
+    rows = {}
+    for chunk in manifest["tables"]["item_images"]["chunks"].values():
+        with gzip.open(os.path.join(snap_dir, "db", chunk["file"]), "rt", encoding="utf-8") as f:
+            rows.update((r["id"], r) for r in map(json.loads, f))
+    return rows
+
+
+def test_placeholder_backfill_is_backed_up(primary, snapshot):
+    db = primary()
+    old = datetime(2020, 1, 1)
+    cat = Category(name="书", user_id="backup-user")
+    db.add(cat)
+    db.commit()
+    item = Item(title="记录", user_id="backup-user", category_id=cat.id, is_completed=True, updated_at=old)
+    db.add(item)
+    db.commit()
+    img = ItemImage(item_id=item.id, image_url="/api/uploads/a.jpg", updated_at=old)
+    db.add(img)
+    db.commit()
+    image_id = img.id
+
+    first = snapshot()
+    assert _images(first)[image_id]["placeholder"] is None
+    unchanged = snapshot()
+    assert (backup.load_manifest(unchanged)["tables"]["item_images"]
+            == backup.load_manifest(first)["tables"]["item_images"])
+
+    # 与 uploads.backfill_placeholders 相同：只写占位图，updated_at 保持原值
+    db.query(ItemImage).filter(ItemImage.id == image_id).update(
+        {ItemImage.placeholder: "data:image/webp;base64,AAAA", ItemImage.updated_at: ItemImage.updated_at},
+        synchronize_session=False,
+    )
+    db.commit()
+    db.close()
+    assert _images(snapshot())[image_id]["placeholder"] == "data:image/webp;base64,AAAA"
@@ -0,0 +1,33 @@
+"""本地 Bangumi 条目库：search 按二元组检索，match 只返回标题归一化后同名的条目（批量导入自动选择用）"""
+import json
+
+import pytest
+
+import bangumi_catalog
+
+SUBJECTS = [
+    {"id": 1, "type": 2, "name": "東京喰種トーキョーグール", "name_cn": "东京食尸鬼", "infobox": "", "rank": 100},
+    {"id": 2, "type": 2, "name": "進撃の巨人", "name_cn": "进击的巨人", "rank": 10,
+     "infobox": "{{Infobox animanga/TVAnime\n|别名={\n[Attack on Titan]\n}\n}}"},
+]
+
+
+@pytest.fixture
+def catalog(tmp_path, monkeypatch):
+    dump = tmp_path / "subject.jsonlines"
+    dump.write_text("\n".join(json.dumps(s, ensure_ascii=False) for s in SUBJECTS), encoding="utf-8")
+    path = str(tmp_path / "catalog.db")
+    bangumi_catalog.ingest(str(dump), path=path)
+    monkeypatch.setattr(bangumi_catalog, "BANGUMI_CATALOG_PATH", path)
+    monkeypatch.setattr(bangumi_catalog, "_local", bangumi_catalog.threading.local())
+    return bangumi_catalog
+
+
+def test_match_requires_same_title(catalog):
+    # 「东京」能检索到「东京食尸鬼」，但不是同一个标题，不自动选择
+    assert [i["subject_id"] for i in catalog.search("东京")] == [1]
+    assert catalog.match("东京") is None
+    assert catalog.match("东京食尸鬼")["subject_id"] == 1
+    assert catalog.match("進撃の巨人")["subject_id"] == 2
+    # 别名，忽略大小写、标点和空白
+    assert catalog.match("ATTACK ON TITAN!")["subject_id"] == 2
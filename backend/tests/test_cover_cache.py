@@ -0,0 +1,116 @@
+"""封面拉取：重定向的每一跳都必须是允许的封面地址；响应体按 COVER_MAX_BYTES 边读边限制大小"""
+import asyncio
+
+import httpx
+import pytest
+
+import cover_cache
+
+BANGUMI_IMAGE = "https://api.bgm.tv/v0/subjects/12/image"
+CDN_IMAGE = "https://lain.bgm.tv/pic/cover/l/ab/cd/12_xyz.jpg"
+
+
+def _get(url, routes):
+    """routes: 地址 -> (状态码, Location)；返回最终响应和实际请求过的地址"""
+    seen = []
+
+    def handler(request):
+        seen.append(str(request.url))
+        status, location = routes.get(str(request.url), (200, None))
+        if location:
+            return httpx.Response(status, headers={"location": location})
+        return httpx.Response(status, content=b"img", headers={"content-type": "image/jpeg"})
+
+    async def run():
+        async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as client:
+            r = await cover_cache._get(client, url)
+            await r.aclose()
+            return r
+
+    return asyncio.run(run()), seen
+
+
+def test_follows_allowed_redirect():
+    r, seen = _get(BANGUMI_IMAGE, {BANGUMI_IMAGE: (302, CDN_IMAGE)})
+    assert r.status_code == 200
+    assert seen == [BANGUMI_IMAGE, CDN_IMAGE]
+
+
+def test_relative_redirect_on_allowed_host():
+    other = "https://lain.bgm.tv/pic/cover/l/ab/cd/other.jpg"
+    _, seen = _get(CDN_IMAGE, {CDN_IMAGE: (301, "/pic/cover/l/ab/cd/other.jpg")})
+    assert seen == [CDN_IMAGE, other]
+
+
+@pytest.mark.parametrize("location", [
+    "http://127.0.0.1:8000/api/db/pool-stats",
+    "http://169.254.169.254/latest/meta-data/",
+    "https://evil.example/cover.jpg",
+    # api.bgm.tv 只允许条目图片接口
+    "https://api.bgm.tv/v0/me",
+])
+def test_rejects_redirect_to_disallowed_host(location):
+    with pytest.raises(ValueError):
+        _get(BANGUMI_IMAGE, {BANGUMI_IMAGE: (302, location)})
+
+
+def test_rejects_second_hop():
+    routes = {BANGUMI_IMAGE: (302, CDN_IMAGE), CDN_IMAGE: (302, "http://10.0.0.1/internal")}
+    with pytest.raises(ValueError):
+        _get(BANGUMI_IMAGE, routes)
+
+
+def test_redirect_loop():
+    with pytest.raises(ValueError):
+        _get(CDN_IMAGE, {CDN_IMAGE: (302, CDN_IMAGE)})
+
+
+def test_upstream_error():
+    with pytest.raises(httpx.HTTPStatusError):
+        _get(CDN_IMAGE, {CDN_IMAGE: (404, None)})
+
+
+class _Body(httpx.AsyncByteStream):
+    """分块发送、不带 Content-Length 的响应体，记录上游实际发出的字节数"""
+
+    def __init__(self, chunks: int, size: int):
+        self.chunks, self.size, self.sent = chunks, size, 0
+
+    async def __aiter__(self):
+        for _ in range(self.chunks):
+            self.sent += self.size
+            yield b"x" * self.size
+
+
+def _read(response: httpx.Response) -> bytes:
+    async def run():
+        client = httpx.AsyncClient(transport=httpx.MockTransport(lambda request: response))
+        async with client:
+            r = await cover_cache._get(client, CDN_IMAGE)
+            try:
+                return await cover_cache._read_capped(r)
+            finally:
+                await r.aclose()
+
+    return asyncio.run(run())
+
+
+def test_body_within_cap(monkeypatch):
+    monkeypatch.setattr(cover_cache, "COVER_MAX_BYTES", 100)
+    assert _read(httpx.Response(200, content=b"x" * 100)) == b"x" * 100
+
+
+def test_rejects_large_content_length(monkeypatch):
+    monkeypatch.setattr(cover_cache, "COVER_MAX_BYTES", 100)
+    body = _Body(chunks=1, size=101)
+    with pytest.raises(ValueError):
+        _read(httpx.Response(200, headers={"content-length": "101"}, stream=body))
+    assert body.sent == 0
+
+
+def test_aborts_stream_past_cap(monkeypatch):
+    monkeypatch.setattr(cover_cache, "COVER_MAX_BYTES", 100)
+    body = _Body(chunks=1000, size=30)
+    with pytest.raises(ValueError):
+        _read(httpx.Response(200, stream=body))
+    assert body.sent == 120
@@ -0,0 +1,105 @@
+"""
+读写分离：主库和只读副本分别指向两个 SQLite 文件（不做复制，两边数据不同，能看出读请求落在哪个库），
+校验 GET 读副本、写入成功后 DB_PRIMARY_PIN_SECONDS 内该用户固定读主库（签名 cookie，不依赖进程内状态）、
+未配置副本时 get_read_db 退回主库。
+"""
+import itertools
+import time
+from types import SimpleNamespace
+
+import pytest
+
+import database
+from conftest import init_schema
+from models import Category
+
+PRIMARY_USER, OTHER_USER = "alice", "bob"
+
+
+def _add_category(session_factory, user_id, name):
+    db = session_factory()
+    try:
+        db.add(Category(name=name, user_id=user_id))
+        db.commit()
+    finally:
+        db.close()
+
+
+def _names(client, user_id):
+    resp = client.get("/api/categories/", headers={"X-User-ID": user_id})
+    assert resp.status_code == 200
+    return {c["name"] for c in resp.json()}
+
+
+@pytest.fixture
+def replica(tmp_path, monkeypatch, primary):
+    """把一个独立 SQLite 文件配置为唯一的只读副本"""
+    engine = database._create_engine(f"sqlite:///{tmp_path / 'replica.db'}")
+    init_schema(engine)
+    factory = database.sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    monkeypatch.setattr(database, "replica_engines", [engine])
+    monkeypatch.setattr(database, "_replica_sessions", [factory])
+    monkeypatch.setattr(database, "_replica_cycle", itertools.cycle([0]))
+    monkeypatch.setattr(database, "DB_PRIMARY_PIN_SECONDS", 5.0)
+    yield factory
+    engine.dispose()
+
+
+def test_reads_go_to_replica(client, primary, replica):
+    _add_category(primary, PRIMARY_USER, "primary-only")
+    _add_category(replica, PRIMARY_USER, "replica-only")
+    assert _names(client, PRIMARY_USER) == {"replica-only"}
+
+
+def test_writer_pinned_to_primary_for_pin_window(client, primary, replica, monkeypatch):
+    _add_category(replica, PRIMARY_USER, "replica-only")
+    _add_category(replica, OTHER_USER, "replica-only")
+
+    resp = client.post("/api/categories/", json={"name": "just-written"}, headers={"X-User-ID": PRIMARY_USER})
+    assert resp.status_code == 200
+    # 刚写入的用户读主库，立即看到自己的修改；其他用户仍读副本
+    assert _names(client, PRIMARY_USER) == {"just-written"}
+    assert _names(client, OTHER_USER) == {"replica-only"}
+
+    # 固定窗口过后回到副本
+    now = time.time()
+    monkeypatch.setattr(database.time, "time", lambda: now + database.DB_PRIMARY_PIN_SECONDS + 1)
+    assert _names(client, PRIMARY_USER) == {"replica-only"}
+
+
+def test_pin_travels_with_client(client, primary, replica):
+    """标记在 cookie 中：没有 cookie 的请求（另一个客户端）读副本，篡改或过期的标记无效"""
+    from fastapi.testclient import TestClient
+    import main
+
+    _add_category(replica, PRIMARY_USER, "replica-only")
+    resp = client.post("/api/categories/", json={"name": "just-written"}, headers={"X-User-ID": PRIMARY_USER})
+    token = resp.cookies.get(database.DB_PIN_COOKIE)
+    assert database.is_pinned(PRIMARY_USER, token)
+    assert not database.is_pinned(OTHER_USER, token)
+    until, _, sig = token.partition(":")
+    assert not database.is_pinned(PRIMARY_USER, f"{float(until) + 3600:.3f}:{sig}")
+    assert _names(TestClient(main.app), PRIMARY_USER) == {"replica-only"}
+
+
+def test_reads_and_failed_writes_do_not_pin(client, primary, replica):
+    _add_category(replica, PRIMARY_USER, "replica-only")
+    client.get("/api/categories/", headers={"X-User-ID": PRIMARY_USER})
+    resp = client.put("/api/items/999999", data={"title": "x"}, headers={"X-User-ID": PRIMARY_USER})
+    assert resp.status_code == 404
+    assert database.DB_PIN_COOKIE not in client.cookies
+    assert _names(client, PRIMARY_USER) == {"replica-only"}
+
+
+def test_falls_back_to_primary_without_replicas(client, primary, monkeypatch):
+    monkeypatch.setattr(database, "_replica_sessions", [])
+    monkeypatch.setattr(database, "_replica_cycle", None)
+    _add_category(primary, PRIMARY_USER, "primary-only")
+    assert _names(client, PRIMARY_USER) == {"primary-only"}
+    # 没有副本时写入不需要固定
+    resp = client.post("/api/categories/", json={"name": "another"}, headers={"X-User-ID": PRIMARY_USER})
+    assert resp.status_code == 200 and database.DB_PIN_COOKIE not in resp.cookies
+
+    gen = database.get_read_db(SimpleNamespace(state=SimpleNamespace(user_id=PRIMARY_USER), cookies={}))
+    assert next(gen).get_bind() is database.engine
+    gen.close()
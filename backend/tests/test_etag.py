@@ -0,0 +1,83 @@
+"""条件请求：If-None-Match 列表 / 弱 ETag 解析，以及不同内容编码的表示使用不同的 ETag"""
+from datetime import datetime
+
+import pytest
+from fastapi import FastAPI, Request
+from fastapi.responses import Response
+from fastapi.testclient import TestClient
+
+from compression import CompressionMiddleware, etag_matches
+
+USER = {"X-User-ID": "etag-user"}
+
+
+@pytest.mark.parametrize("header, etag, expected", [
+    ('"a"', '"a"', True),
+    ('W/"a"', '"a"', True),
+    ('"a"', 'W/"a"', True),
+    ('"x", W/"a" ,"y"', '"a"', True),
+    ("*", '"a"', True),
+    ('"x", "y"', '"a"', False),
+    ('"a-gz"', '"a"', False),
+    ("", '"a"', False),
+    (None, '"a"', False),
+])
+def test_etag_matches(header, etag, expected):
+    assert etag_matches(header, etag) is expected
+
+
+def test_year_review_etag_per_encoding(client, primary):
+    url = f"/api/items/year-review/{datetime.now().year}"
+    gz = client.get(url, headers={**USER, "Accept-Encoding": "gzip"})
+    plain = client.get(url, headers={**USER, "Accept-Encoding": "identity"})
+    assert gz.status_code == plain.status_code == 200
+    assert gz.headers["content-encoding"] == "gzip"
+    assert "content-encoding" not in plain.headers
+    assert gz.json() == plain.json()
+    assert gz.headers["etag"] != plain.headers["etag"]
+
+    # 缓存的是某一种表示，只在同一种编码下命中
+    for resp, encoding in ((gz, "gzip"), (plain, "identity")):
+        etag = resp.headers["etag"]
+        headers = {**USER, "Accept-Encoding": encoding}
+        assert client.get(url, headers={**headers, "If-None-Match": etag}).status_code == 304
+        assert client.get(url, headers={**headers, "If-None-Match": f'"other", W/{etag}'}).status_code == 304
+    assert client.get(url, headers={
+        **USER, "Accept-Encoding": "identity", "If-None-Match": gz.headers["etag"],
+    }).status_code == 200
+
+    # gzip;q=0 表示不接受 gzip
+    refused = client.get(url, headers={**USER, "Accept-Encoding": "gzip;q=0"})
+    assert "content-encoding" not in refused.headers
+    assert refused.headers["etag"] == plain.headers["etag"]
+
+
+@pytest.fixture
+def compressed_app():
+    app = FastAPI()
+    app.add_middleware(CompressionMiddleware)
+    body = '{"items": [%s]}' % ",".join(['"entry"'] * 1000)
+
+    @app.get("/doc")
+    def doc(request: Request):
+        etag = '"doc-v1"'
+        if etag_matches(request.headers.get("if-none-match"), etag):
+            return Response(status_code=304, headers={"ETag": etag})
+        return Response(content=body, media_type="application/json", headers={"ETag": etag})
+
+    return TestClient(app)
+
+
+def test_compression_weakens_etag(compressed_app):
+    plain = compressed_app.get("/doc", headers={"Accept-Encoding": "identity"})
+    assert "content-encoding" not in plain.headers
+    assert plain.headers["etag"] == '"doc-v1"'
+
+    gz = compressed_app.get("/doc", headers={"Accept-Encoding": "gzip"})
+    assert gz.headers["content-encoding"] == "gzip"
+    assert gz.headers["etag"] == 'W/"doc-v1"'
+    assert gz.content == plain.content
+
+    # 浏览器带回弱 ETag 重新验证，仍返回 304
+    revalidate = compressed_app.get("/doc", headers={"Accept-Encoding": "gzip", "If-None-Match": gz.headers["etag"]})
+    assert revalidate.status_code == 304
@@ -0,0 +1,190 @@
+"""
+图片引擎一致性：同一批输入分别交给 PillowEngine 和 VipsEngine，输出的宽高、格式、EXIF 方向处理、
+拒绝规则和占位图尺寸必须与 Pillow 参考结果一致。未安装 pyvips / libvips 时 vips 用例跳过。
+"""
+import io
+
+import pytest
+from PIL import Image
+
+import imaging
+from imaging import ImageRejected, PillowEngine
+
+# 输出格式 -> 文件头魔数校验
+MAGIC = {
+    "jpeg": lambda b: b[:3] == b"\xff\xd8\xff",
+    "webp": lambda b: b[:4] == b"RIFF" and b[8:12] == b"WEBP",
+    "avif": lambda b: b[4:8] == b"ftyp" and b[8:12] in (b"avif", b"avis"),
+}
+
+# 左半红、右半蓝的横图；EXIF 方向 6（顺时针转 90° 显示）后应为上红下蓝的竖图，方向 8 为上蓝下红
+RED, BLUE = (220, 20, 20), (20, 20, 220)
+
+
+@pytest.fixture(params=["pillow", "vips"])
+def engine(request):
+    if request.param == "pillow":
+        return PillowEngine()
+    try:
+        from vips_engine import VipsEngine
+        return VipsEngine()
+    except (ImportError, OSError) as e:
+        pytest.skip(f"pyvips 不可用: {e}")
+
+
+@pytest.fixture
+def reference():
+    return PillowEngine()
+
+
+def _save(tmp_path, name, img, **opts):
+    path = tmp_path / name
+    img.save(path, **opts)
+    return str(path)
+
+
+def _gradient(size):
+    grad = Image.linear_gradient("L").resize(size)
+    return Image.merge("RGB", (grad, grad.transpose(Image.FLIP_LEFT_RIGHT), grad.transpose(Image.ROTATE_90).resize(size)))
+
+
+def _halves(size=(1600, 1200)):
+    img = Image.new("RGB", size, RED)
+    img.paste(BLUE, (size[0] // 2, 0, size[0], size[1]))
+    return img
+
+
+def _oriented_jpeg(tmp_path, orientation):
+    exif = Image.Exif()
+    exif[imaging.ORIENTATION_TAG] = orientation
+    return _save(tmp_path, f"o{orientation}.jpg", _halves(), quality=95, exif=exif.tobytes())
+
+
+def _decode(data):
+    img = Image.open(io.BytesIO(data))
+    img.load()
+    return img
+
+
+def _formats(engine):
+    return ["jpeg", "webp"] + (["avif"] if engine.avif_supported() and PillowEngine().avif_supported() else [])
+
+
+@pytest.fixture
+def inputs(tmp_path):
+    return {
+        "jpeg": _save(tmp_path, "photo.jpg", _gradient((1600, 1200)), quality=92),
+        "png": _save(tmp_path, "photo.png", _gradient((1600, 1200))),
+        "odd": _save(tmp_path, "odd.jpg", _gradient((1001, 333)), quality=92),
+        "tall": _save(tmp_path, "tall.png", _gradient((300, 1000))),
+    }
+
+
+@pytest.mark.parametrize("name", ["jpeg", "png", "odd", "tall"])
+@pytest.mark.parametrize("width", [160, 320, 960, None])
+def test_variant_size_and_format(engine, reference, inputs, name, width):
+    for fmt in _formats(engine):
+        data = engine.render_variant(inputs[name], width, fmt)
+        assert MAGIC[fmt](data)
+        assert _decode(data).size == _decode(reference.render_variant(inputs[name], width, fmt)).size
+
+
+def test_variant_never_upscales(engine, inputs):
+    assert _decode(engine.render_variant(inputs["tall"], 1280, "webp")).size == (300, 1000)
+
+
+@pytest.mark.parametrize("orientation, top", [(6, RED), (8, BLUE)])
+def test_exif_orientation(engine, reference, tmp_path, orientation, top):
+    path = _oriented_jpeg(tmp_path, orientation)
+    for width in (320, None):
+        for fmt in _formats(engine):
+            img = _decode(engine.render_variant(path, width, fmt))
+            assert img.size == _decode(reference.render_variant(path, width, fmt)).size
+            # 竖图，且方向已应用到像素上，输出不再带方向标签（否则浏览器会再转一次）
+            assert img.height > img.width
+            assert img.getexif().get(imaging.ORIENTATION_TAG, 1) == 1
+            rgb = img.convert("RGB")
+            for actual, expected in zip(rgb.getpixel((img.width // 2, img.height // 4)), top):
+                assert abs(actual - expected) < 40
+
+
+def test_exif_orientation_placeholder(engine, tmp_path):
+    path = _oriented_jpeg(tmp_path, 6)
+    img = _decode(engine.render_placeholder(path))
+    assert img.size == imaging.fit_size(1200, 1600, imaging.PLACEHOLDER_SIZE)
+
+
+def test_rejects_svg(engine, tmp_path):
+    path = tmp_path / "image.svg"
+    path.write_text(
+        '<svg xmlns="http://www.w3.org/2000/svg" width="100" height="100">'
+        '<rect width="100" height="100" fill="red"/></svg>'
+    )
+    with pytest.raises(ImageRejected):
+        engine.probe(str(path))
+    with pytest.raises(ImageRejected):
+        engine.render_variant(str(path), 160, "webp")
+
+
+def test_rejects_pdf(engine, tmp_path):
+    path = _save(tmp_path, "doc.pdf", _gradient((200, 200)))
+    with pytest.raises(ImageRejected):
+        engine.probe(path)
+    with pytest.raises(ImageRejected):
+        engine.render_placeholder(path)
+
+
+def test_rejects_over_pixel_limit(engine, inputs, monkeypatch):
+    monkeypatch.setattr(imaging, "IMAGE_MAX_PIXELS", 1600 * 1200 - 1)
+    for name in ("jpeg", "png"):
+        with pytest.raises(ImageRejected):
+            engine.probe(inputs[name])
+        with pytest.raises(ImageRejected):
+            engine.render_variant(inputs[name], 160, "webp")
+    assert engine.probe(inputs["odd"]) == ("JPEG", 1001, 333)
+
+
+def test_probe(engine, inputs):
+    assert engine.probe(inputs["jpeg"]) == ("JPEG", 1600, 1200)
+    assert engine.probe(inputs["png"]) == ("PNG", 1600, 1200)
+
+
+@pytest.mark.parametrize("name", ["jpeg", "png", "odd", "tall"])
+def test_placeholder_size(engine, reference, inputs, name):
+    data = engine.render_placeholder(inputs[name])
+    assert MAGIC["webp"](data)
+    img = _decode(data)
+    assert max(img.size) <= imaging.PLACEHOLDER_SIZE
+    assert img.size == _decode(reference.render_placeholder(inputs[name])).size
+
+
+def test_alpha_flattened_to_white_for_jpeg(engine, tmp_path):
+    img = Image.new("RGBA", (400, 300), (0, 0, 0, 0))
+    img.paste((0, 0, 0, 255), (0, 0, 200, 300))
+    path = _save(tmp_path, "alpha.png", img)
+    out = _decode(engine.render_variant(path, 160, "jpeg")).convert("RGB")
+    assert all(c > 235 for c in out.getpixel((150, 60)))
+    assert all(c < 20 for c in out.getpixel((10, 60)))
+
+
+@pytest.mark.parametrize("name, fmt", [("jpeg", "JPEG"), ("png", "PNG")])
+def test_downscale_original(engine, reference, inputs, tmp_path, monkeypatch, name, fmt):
+    monkeypatch.setattr(imaging, "IMAGE_INGEST_MAX_SIDE", 500)
+    expected = tmp_path / f"expected.{fmt.lower()}"
+    expected.write_bytes(open(inputs[name], "rb").read())
+    reference.downscale_original(str(expected))
+    engine.downscale_original(inputs[name])
+    with Image.open(inputs[name]) as out, Image.open(expected) as ref:
+        assert out.format == fmt
+        assert out.size == ref.size == (500, 375)
+
+
+@pytest.mark.parametrize("engine_obj,limited", [(PillowEngine(), True), (object(), False)])
+def test_worker_memory_limit_only_for_pillow(monkeypatch, engine_obj, limited):
+    # libvips 预留的虚拟地址空间远超实际占用，RLIMIT_AS 只限制 Pillow 子进程
+    import resource
+    calls = []
+    monkeypatch.setattr(resource, "setrlimit", lambda *args: calls.append(args))
+    monkeypatch.setattr(imaging, "_engine", engine_obj)
+    imaging._worker_init()
+    assert bool(calls) == limited
@@ -0,0 +1,29 @@
+"""热点查询的执行计划（query_plans.py）在 SQLite 测试库上不全表扫描、不额外排序；迁移 0002 在缺少 FTS5 时不记录"""
+import migrations
+import query_plans
+import sqlite_search
+from conftest import init_schema
+from database import _create_engine, engine
+
+
+def test_hot_queries_use_indexes(primary):
+    report = query_plans.check(engine)
+    assert set(report) == set(query_plans.HOT_QUERIES)
+    assert {name: issues for name, issues in report.items() if issues} == {}
+
+
+def test_fts_migration_retried_when_unsupported(tmp_path, monkeypatch):
+    e = _create_engine(f"sqlite:///{tmp_path / 'nofts.db'}")
+    try:
+        monkeypatch.setattr(sqlite_search, "ensure", lambda conn: False)
+        init_schema(e)
+        applied = {version for version, _, applied_at in migrations.status(e) if applied_at}
+        assert "0002" not in applied and "0003" in applied
+
+        # 换成支持 FTS5 的 SQLite 后再次执行迁移，补建全文索引
+        monkeypatch.undo()
+        assert migrations.run(e) == ["0002"]
+        with e.connect() as conn:
+            assert conn.exec_driver_sql("SELECT 1 FROM sqlite_master WHERE name = 'items_fts'").first()
+    finally:
+        e.dispose()
@@ -0,0 +1,109 @@
+"""限流：进程内令牌桶按各自类别补满后才清理；并发名额在流式响应体发送完后才释放"""
+import asyncio
+
+import pytest
+from fastapi import FastAPI, Request
+from fastapi.responses import StreamingResponse
+from fastapi.testclient import TestClient
+
+import rate_limit
+from rate_limit import MemoryBackend, RateLimitMiddleware
+
+# (每秒令牌数, 桶容量)：空桶补满分别需要 10 秒和 5 秒
+SEARCH = (1.0, 10.0)
+LIST = (20.0, 100.0)
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    c = Clock()
+    monkeypatch.setattr(rate_limit.time, "monotonic", c)
+    return c
+
+
+def _drain(store, key, rate, burst):
+    for _ in range(int(burst)):
+        assert asyncio.run(store.take(key, rate, burst)) == 0
+    assert asyncio.run(store.take(key, rate, burst)) > 0
+
+
+def test_prune_uses_each_bucket_rate(clock):
+    store = MemoryBackend()
+    _drain(store, "u:search", *SEARCH)
+    _drain(store, "u:list", *LIST)
+    # list 桶已补满，search 桶（速率低得多）还没有
+    clock.now += LIST[1] / LIST[0] + 0.1
+    assert clock.now < 1000.0 + SEARCH[1] / SEARCH[0]
+    store._prune(clock.now)
+    assert "u:list" not in store._buckets
+    assert "u:search" in store._buckets
+
+    clock.now += SEARCH[1] / SEARCH[0]
+    store._prune(clock.now)
+    assert not store._buckets
+
+
+def test_prune_does_not_refill_drained_bucket(clock):
+    store = MemoryBackend()
+    _drain(store, "u:search", *SEARCH)
+    # 由高速率类别的请求触发清理，低速率类别的空桶不能被当作已补满
+    store._prune(clock.now + LIST[1] / LIST[0])
+    clock.now += 0.1
+    assert asyncio.run(store.take("u:search", *SEARCH)) > 0
+
+
+@pytest.fixture
+def app(monkeypatch):
+    store = MemoryBackend()
+    monkeypatch.setattr(rate_limit, "RATE_LIMIT_ENABLED", True)
+    monkeypatch.setattr(rate_limit, "backend", store)
+    monkeypatch.setattr(rate_limit, "LIMITS", {**rate_limit.LIMITS, "list": (0, 0, 1)})
+
+    app = FastAPI()
+    app.add_middleware(RateLimitMiddleware)
+    seen = []
+
+    @app.middleware("http")
+    async def user_id(request: Request, call_next):
+        request.state.user_id = "alice"
+        return await call_next(request)
+
+    @app.get("/api/stream")
+    def stream():
+        def body():
+            for n in range(3):
+                # 流式生成响应体期间仍占用并发名额
+                seen.append(dict(store._inflight))
+                yield f"chunk{n}\n"
+        return StreamingResponse(body(), media_type="text/plain")
+
+    @app.get("/api/boom")
+    def boom():
+        raise RuntimeError("boom")
+
+    return TestClient(app, raise_server_exceptions=False), store, seen
+
+
+def test_slot_held_until_body_streamed(app):
+    client, store, seen = app
+    resp = client.get("/api/stream")
+    assert resp.status_code == 200
+    assert resp.text == "chunk0\nchunk1\nchunk2\n"
+    assert seen == [{"alice:list": 1}] * 3
+    assert store._inflight == {}
+    # 名额已归还，下一个请求不会因并发上限被拒
+    assert client.get("/api/stream").status_code == 200
+
+
+def test_slot_released_on_error(app):
+    client, store, _ = app
+    assert client.get("/api/boom").status_code == 500
+    assert store._inflight == {}
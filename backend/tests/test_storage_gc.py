@@ -0,0 +1,40 @@
+"""上传目录回收：断点续传会话和上传中的 .part 临时文件不受 GC_MIN_AGE_SECONDS 影响也不会被当作孤儿"""
+import os
+import time
+
+import pytest
+
+import storage_gc
+
+
+@pytest.fixture
+def upload_dir(primary, tmp_path, monkeypatch):
+    monkeypatch.setattr(storage_gc, "UPLOAD_DIR", str(tmp_path))
+    monkeypatch.setattr(storage_gc, "QUARANTINE_DIR", str(tmp_path / ".gc_quarantine"))
+    # 不靠文件年龄保护：所有文件都已“足够旧”
+    monkeypatch.setattr(storage_gc, "GC_MIN_AGE_SECONDS", 0)
+    return tmp_path
+
+
+def _touch(path, age=0):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_bytes(b"x" * 10)
+    t = time.time() - age
+    os.utime(path, (t, t))
+    return path
+
+
+def test_sessions_and_parts_are_not_orphans(upload_dir):
+    session = _touch(upload_dir / ".upload_sessions" / "abc.bin")
+    part = _touch(upload_dir / "uploading.part")
+    stale = _touch(upload_dir / "crashed.part", age=storage_gc.GC_PART_MAX_AGE_SECONDS + 60)
+    orphan = _touch(upload_dir / "orphan.jpg")
+
+    report = storage_gc.run_gc(include_cache=False)
+    assert session.exists() and part.exists()
+    assert not stale.exists() and report["parts_purged"] == 1
+    assert not orphan.exists() and (upload_dir / ".gc_quarantine" / "orphan.jpg").exists()
+    assert report["orphans"] == 1
+    # 删除标记由 routers.sync 的独立任务清理
+    assert "tombstones_purged" not in report
+
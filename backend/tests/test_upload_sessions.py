@@ -0,0 +1,118 @@
+"""断点续传：分片写入、finalize 入库；占位图或数据库提交失败时不留下图片文件，会话保持完整可以重新提交"""
+import io
+import os
+
+import pytest
+from PIL import Image
+from sqlalchemy.orm import Session
+
+import config
+import resumable
+import routers.upload_sessions as upload_sessions
+from models import Category, Item, ItemImage
+
+USER = {"X-User-ID": "uploader"}
+
+
+def _png() -> bytes:
+    buf = io.BytesIO()
+    Image.linear_gradient("L").resize((64, 48)).save(buf, "PNG")
+    return buf.getvalue()
+
+
+def _uploads() -> set:
+    return {n for n in os.listdir(config.UPLOAD_DIR) if not n.startswith(".")}
+
+
+@pytest.fixture
+def item_id(primary):
+    db = primary()
+    cat = Category(name="相册", user_id=USER["X-User-ID"])
+    db.add(cat)
+    db.flush()
+    item = Item(title="测试", user_id=USER["X-User-ID"], category_id=cat.id)
+    db.add(item)
+    db.commit()
+    item_id = item.id
+    db.close()
+    return item_id
+
+
+async def _no_placeholder(fn):
+    return None
+
+
+@pytest.fixture(autouse=True)
+def no_placeholder_worker(monkeypatch):
+    # 占位图在解码子进程中生成，与本测试无关
+    monkeypatch.setattr(upload_sessions, "make_placeholder", _no_placeholder)
+
+
+def _upload(client, item_id, data: bytes, chunk: int = 100) -> str:
+    resp = client.post("/api/upload-sessions/", json={"item_id": item_id, "filename": "a.png", "length": len(data)}, headers=USER)
+    assert resp.status_code == 201
+    sid = resp.json()["id"]
+    for offset in range(0, len(data), chunk):
+        resp = client.patch(
+            f"/api/upload-sessions/{sid}", content=data[offset:offset + chunk],
+            headers={**USER, "Upload-Offset": str(offset)},
+        )
+        assert resp.status_code == 204
+    assert resp.headers["upload-offset"] == str(len(data))
+    return sid
+
+
+def _images(primary, item_id) -> list:
+    db = primary()
+    try:
+        return db.query(ItemImage).filter(ItemImage.item_id == item_id).all()
+    finally:
+        db.close()
+
+
+def test_finalize(client, primary, item_id):
+    data = _png()
+    sid = _upload(client, item_id, data)
+    before = _uploads()
+    resp = client.post(f"/api/upload-sessions/{sid}/finalize", headers=USER)
+    assert resp.status_code == 200
+    assert len(_uploads() - before) == 1
+    assert not os.path.exists(resumable.staging_path(sid))
+    # 重试返回同一张图片
+    assert client.post(f"/api/upload-sessions/{sid}/finalize", headers=USER).json() == resp.json()
+    assert [i.id for i in _images(primary, item_id)] == [resp.json()["id"]]
+
+
+@pytest.mark.parametrize("failure", ["placeholder", "commit"])
+def test_finalize_failure_keeps_session_resumable(client, primary, item_id, monkeypatch, failure):
+    data = _png()
+    sid = _upload(client, item_id, data)
+    before = _uploads()
+
+    if failure == "placeholder":
+        async def broken(fn):
+            raise RuntimeError("worker crashed")
+        monkeypatch.setattr(upload_sessions, "make_placeholder", broken)
+    else:
+        commit = Session.commit
+
+        def broken(self):
+            raise RuntimeError("database gone")
+        monkeypatch.setattr(Session, "commit", broken)
+
+    client_no_raise = type(client)(client.app, raise_server_exceptions=False)
+    assert client_no_raise.post(f"/api/upload-sessions/{sid}/finalize", headers=USER).status_code == 500
+    # 没有孤儿文件，暂存文件完整，会话可以直接重新提交
+    assert _uploads() == before
+    state = client.get(f"/api/upload-sessions/{sid}", headers=USER).json()
+    assert state["offset"] == state["length"] == len(data)
+    assert not _images(primary, item_id)
+
+    if failure == "placeholder":
+        monkeypatch.setattr(upload_sessions, "make_placeholder", _no_placeholder)
+    else:
+        monkeypatch.setattr(Session, "commit", commit)
+    resp = client.post(f"/api/upload-sessions/{sid}/finalize", headers=USER)
+    assert resp.status_code == 200
+    assert len(_uploads() - before) == 1
+    assert len(_images(primary, item_id)) == 1
@@ -0,0 +1,59 @@
+"""整墙导出：画布尺寸在生成前校验，过大的请求直接拒绝，不进入解码子进程"""
+import pytest
+from PIL import Image
+
+import imaging
+import routers.wall as wall
+import wall_atlas
+
+USER = {"X-User-ID": "wall-user"}
+
+
+@pytest.fixture
+def export(monkeypatch, tmp_path):
+    """count 条带封面的记录；返回实际生成导出图时的参数列表"""
+    calls = []
+    out = tmp_path / "export.jpg"
+    Image.new("RGB", (8, 8)).save(out)
+
+    async def build_export(user_id, category_id, entries, cols, tile, gap, bg):
+        calls.append((len(entries), cols, tile, gap))
+        return str(out)
+
+    def use(count):
+        entries = [{"id": n, "image": f"/api/uploads/{n}.jpg"} for n in range(count)]
+        monkeypatch.setattr(wall, "achievement_wall_entries", lambda db, user_id, category_id: entries)
+        monkeypatch.setattr(wall_atlas, "build_export", build_export)
+        return calls
+
+    return use
+
+
+def test_export_within_limits(client, export):
+    calls = export(40)
+    resp = client.get("/api/wall/export?category_id=1&cols=8&tile=240&gap=8", headers=USER)
+    assert resp.status_code == 200
+    assert resp.headers["content-type"] == "image/jpeg"
+    assert calls == [(40, 8, 240, 8)]
+
+
+def test_export_rejects_pixel_count(client, export):
+    calls = export(1000)
+    # 30 列 × 600 像素约 1.9 万像素宽、34 行约 2 万像素高：单边未超 JPEG 上限，但像素数远超上限
+    resp = client.get("/api/wall/export?category_id=1&cols=30&tile=600&gap=64", headers=USER)
+    assert resp.status_code == 413
+    assert not calls
+
+
+def test_export_rejects_height(client, export):
+    calls = export(2000)
+    resp = client.get("/api/wall/export?category_id=1&cols=1&tile=600&gap=0", headers=USER)
+    assert resp.status_code == 400
+    assert not calls
+
+
+def test_export_size_matches_render(tmp_path):
+    out = str(tmp_path / "wall.jpg")
+    imaging.render_wall_export([None] * 10, 100, 4, 5, "#0f0f1a", out)
+    with Image.open(out) as img:
+        assert img.size == wall_atlas.export_size(10, 4, 100, 5)
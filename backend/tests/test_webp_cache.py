@@ -0,0 +1,92 @@
+"""WebP 缓存多 worker：两个独立加载的 webp_cache 模块（各自的内存索引，模拟两个 uvicorn worker）共用一个缓存目录"""
+import importlib.util
+import os
+import time
+
+import pytest
+
+import webp_cache
+
+BUDGET = 10_000
+
+
+def _worker(name, cache_dir, monkeypatch):
+    spec = importlib.util.spec_from_file_location(f"webp_cache_{name}", webp_cache.__file__)
+    mod = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(mod)
+    monkeypatch.setattr(mod, "WEBP_CACHE_DIR", str(cache_dir))
+    monkeypatch.setattr(mod, "WEBP_CACHE_INDEX_FILE", str(cache_dir / ".index.json"))
+    monkeypatch.setattr(mod, "WEBP_CACHE_LOCK_FILE", str(cache_dir / ".index.lock"))
+    monkeypatch.setattr(mod, "WEBP_CACHE_MAX_BYTES", BUDGET)
+    mod.build_index()
+    return mod
+
+
+@pytest.fixture
+def workers(tmp_path, monkeypatch):
+    cache_dir = tmp_path / ".webp_cache"
+    return _worker("a", cache_dir, monkeypatch), _worker("b", cache_dir, monkeypatch), cache_dir
+
+
+def _path(cache_dir, n):
+    return str(cache_dir / f"img{n}_jpg__w320.webp")
+
+
+def _disk_bytes(cache_dir):
+    return sum(e.stat().st_size for e in os.scandir(cache_dir) if not e.name.startswith("."))
+
+
+def test_sees_files_written_by_other_worker(workers):
+    a, b, cache_dir = workers
+    a.put(_path(cache_dir, 1), b"x" * 100)
+    assert b.contains(_path(cache_dir, 1))
+    assert b.get(_path(cache_dir, 1)) == b"x" * 100
+    assert b.stats()["entries"] == 1
+
+    # 另一个 worker 删除后不再返回
+    a.discard_entry(_path(cache_dir, 1))
+    assert b.get(_path(cache_dir, 1)) is None
+    assert b.stats()["entries"] == 0
+
+
+def test_budget_enforced_across_workers(workers, monkeypatch):
+    a, b, cache_dir = workers
+    clock = [time.time() - 3600]
+    monkeypatch.setattr(webp_cache.time, "time", lambda: clock[0])
+    # 每个 worker 各写 8 个 1000 字节的文件：各自视图都没超预算，合计 16000 字节
+    for n in range(16):
+        clock[0] += 1
+        (a if n % 2 else b).put(_path(cache_dir, n), b"x" * 1000)
+        os.utime(_path(cache_dir, n), (clock[0], clock[0]))
+    assert _disk_bytes(cache_dir) == 16_000
+    # worker a 最近访问过最早写入的 img0（由 b 写入）
+    clock[0] += 1
+    assert a.get(_path(cache_dir, 0))
+
+    a.sync_index()
+    b.sync_index()
+    assert _disk_bytes(cache_dir) <= BUDGET
+    assert os.path.exists(_path(cache_dir, 0))
+    assert not os.path.exists(_path(cache_dir, 1))
+    assert a.stats()["bytes"] == b.stats()["bytes"] == _disk_bytes(cache_dir)
+
+
+def test_index_merges_access_times(workers):
+    a, b, cache_dir = workers
+    a.put(_path(cache_dir, 1), b"x" * 10)
+    b.put(_path(cache_dir, 2), b"y" * 10)
+    a.save_index()
+    b.save_index()
+    # b 的保存不能覆盖 a 写入的条目
+    entries = b._read_persisted()
+    assert set(entries) == {os.path.basename(_path(cache_dir, n)) for n in (1, 2)}
+
+    recent = b.recent_sources(time.time() - 60)
+    assert recent == {"img1_jpg": 1, "img2_jpg": 1}
+
+
+def test_scan_skips_temporary_files(workers):
+    a, _, cache_dir = workers
+    (cache_dir / "img9_jpg__w320.webp.abcd.tmp").write_bytes(b"z" * 500)
+    a.sync_index()
+    assert a.stats()["entries"] == 0
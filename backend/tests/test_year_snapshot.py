@@ -0,0 +1,48 @@
+"""年度回顾快照：写入时失效；生成期间被失效（可能来自其它 worker）的快照不会写入"""
+from datetime import datetime
+
+import pytest
+
+import year_snapshot
+from models import Category, Item, YearSnapshot
+
+USER = "snapshot-user"
+YEAR = datetime.now().year - 1
+
+
+@pytest.fixture
+def db(primary):
+    s = primary()
+    s.query(YearSnapshot).delete()
+    cat = Category(name="书", user_id=USER)
+    s.add(cat)
+    s.commit()
+    s.add(Item(title="去年读完", user_id=USER, category_id=cat.id, is_completed=True, finish_time=datetime(YEAR, 3, 1)))
+    s.commit()
+    yield s
+    s.close()
+
+
+def _add_item(db, title):
+    cat = db.query(Category).filter(Category.user_id == USER).first()
+    db.add(Item(title=title, user_id=USER, category_id=cat.id, is_completed=True, finish_time=datetime(YEAR, 5, 1)))
+    db.commit()
+
+
+def test_snapshot_invalidated_on_write(db):
+    assert year_snapshot.load(db, USER, YEAR)["stats"]["total"] == 1
+    _add_item(db, "又一本")
+    db.expire_all()
+    row = db.query(YearSnapshot).filter(YearSnapshot.user_id == USER, YearSnapshot.year == YEAR).one()
+    assert row.payload is None and row.generation == 1
+    assert year_snapshot.load(db, USER, YEAR)["stats"]["total"] == 2
+
+
+def test_stale_build_is_not_saved(db):
+    gen = year_snapshot._claim(db, USER, YEAR)
+    payload, etag = year_snapshot.encode(year_snapshot.build_document(db, USER, YEAR))
+    # 生成期间另一个 worker 提交了写入
+    _add_item(db, "生成期间写入")
+    assert not year_snapshot._save(db, USER, YEAR, payload, etag, gen)
+    assert year_snapshot._current(db, USER, YEAR) is None
+    assert year_snapshot.load(db, USER, YEAR)["stats"]["total"] == 2
@@ -0,0 +1,20 @@
+"""
+记录标题的归一化键 title_key，用于判断「是否已有同名记录」（去重、重复导入检查）。
+items / items_archive 上有 (user_id, title_key) 索引，批量查询见 POST /api/items/lookup。
+
+归一化：NFKC（全角/半角、兼容字符统一）→ casefold → 去掉标点、符号、空白和控制字符。
+如「ＳＴＥＩＮＳ；ＧＡＴＥ」与「Steins;Gate」、「ｶｳﾎﾞｰｲ」与「カウボーイ」的键相同；简繁不做转换。
+"""
+import unicodedata
+
+# 与 Item.title 相同的长度上限
+TITLE_KEY_MAX = 200
+
+# 去掉的 Unicode 类别：P 标点、Z 空白分隔符、S 符号、C 控制/格式字符
+_DROP_CATEGORIES = frozenset("PZSC")
+
+
+def title_key(title) -> str:
+    """标题的归一化键；标题只有标点/空白时为空字符串"""
+    s = unicodedata.normalize("NFKC", title or "").casefold()
+    return "".join(ch for ch in s if unicodedata.category(ch)[0] not in _DROP_CATEGORIES)[:TITLE_KEY_MAX]
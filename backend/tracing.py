@@ -0,0 +1,259 @@
+"""
+请求追踪：定位慢请求的时间花在 SQL、上游 HTTP、文件读写还是图片编码上。
+
+每个请求的追踪 ID 来自 OpenResty 的 X-Request-ID（nginx $request_id 为 32 位十六进制，直接作为 trace id；
+其它格式取哈希），或 W3C traceparent 头；响应总是带回 X-Request-ID。
+被采样的请求记录以下 span：请求本身、每条 SQL（含 _item_to_response 触发的懒加载）、httpx 请求、
+span() 标注的文件读写和图片编码（run_in_worker）。未采样的请求只多一次 contextvar 读取。
+
+采样：TRACE_SAMPLE_RATE（0~1，按 trace id 决定，多 worker 结果一致）；traceparent 带 sampled 标志时总是采样。
+导出：export_loop 每 TRACE_FLUSH_SECONDS 把 span 按 OTLP/JSON（ExportTraceServiceRequest）格式
+追加到 TRACE_EXPORT 文件（每行一批），TRACE_EXPORT 为 http(s) 地址时 POST 到 collector（如 :4318/v1/traces）。
+"""
+import asyncio
+import contextvars
+import hashlib
+import json
+import logging
+import os
+import re
+import threading
+import time
+import uuid
+from collections import deque
+from contextlib import contextmanager
+from typing import Optional
+
+import httpx
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from starlette.middleware.base import BaseHTTPMiddleware
+
+logger = logging.getLogger("uvicorn.error")
+
+TRACE_SAMPLE_RATE = float(os.environ.get("TRACE_SAMPLE_RATE", 0))
+TRACE_EXPORT = os.environ.get("TRACE_EXPORT", os.path.join(os.path.dirname(os.path.abspath(__file__)), "traces.jsonl"))
+TRACE_FLUSH_SECONDS = float(os.environ.get("TRACE_FLUSH_SECONDS", 5))
+# 未导出的 span 上限，导出跟不上时丢弃最旧的
+TRACE_MAX_BUFFER = int(os.environ.get("TRACE_MAX_BUFFER", 20000))
+SERVICE_NAME = "logfolio-api"
+
+# OTLP SpanKind
+KIND_INTERNAL, KIND_SERVER, KIND_CLIENT = 1, 2, 3
+
+_current = contextvars.ContextVar("trace_span", default=None)
+_buffer = deque(maxlen=TRACE_MAX_BUFFER)
+_flush_lock = threading.Lock()
+
+_HEX32 = re.compile(r"^[0-9a-f]{32}$")
+_TRACEPARENT = re.compile(r"^00-([0-9a-f]{32})-([0-9a-f]{16})-([0-9a-f]{2})$")
+
+
+def _span_id() -> str:
+    return uuid.uuid4().hex[:16]
+
+
+class Span:
+    __slots__ = ("trace_id", "span_id", "parent_id", "name", "kind", "start", "end", "attrs", "error")
+
+    def __init__(self, name: str, trace_id: str, parent_id: Optional[str], kind: int = KIND_INTERNAL, attrs: dict = None):
+        self.trace_id = trace_id
+        self.span_id = _span_id()
+        self.parent_id = parent_id
+        self.name = name
+        self.kind = kind
+        self.attrs = attrs or {}
+        self.error = None
+        self.start = time.time_ns()
+        self.end = None
+
+    def set(self, key: str, value):
+        self.attrs[key] = value
+
+    def finish(self, error: BaseException = None):
+        self.end = time.time_ns()
+        if error is not None:
+            self.error = f"{type(error).__name__}: {error}"[:300]
+        _buffer.append(self)
+
+    def child(self, name: str, kind: int = KIND_INTERNAL, attrs: dict = None) -> "Span":
+        return Span(name, self.trace_id, self.span_id, kind, attrs)
+
+    def to_otlp(self) -> dict:
+        out = {
+            "traceId": self.trace_id,
+            "spanId": self.span_id,
+            "name": self.name,
+            "kind": self.kind,
+            "startTimeUnixNano": str(self.start),
+            "endTimeUnixNano": str(self.end),
+            "attributes": [{"key": k, "value": _otlp_value(v)} for k, v in self.attrs.items()],
+            "status": {"code": 2, "message": self.error} if self.error else {"code": 1},
+        }
+        if self.parent_id:
+            out["parentSpanId"] = self.parent_id
+        return out
+
+
+def _otlp_value(v) -> dict:
+    if isinstance(v, bool):
+        return {"boolValue": v}
+    if isinstance(v, int):
+        return {"intValue": str(v)}
+    if isinstance(v, float):
+        return {"doubleValue": v}
+    return {"stringValue": str(v)}
+
+
+def current() -> Optional[Span]:
+    return _current.get()
+
+
+def _sampled(trace_id: str) -> bool:
+    if TRACE_SAMPLE_RATE <= 0:
+        return False
+    return int(trace_id[:8], 16) / 0xFFFFFFFF < TRACE_SAMPLE_RATE
+
+
+def trace_id_for(request_id: str) -> str:
+    rid = request_id.strip().lower()
+    return rid if _HEX32.match(rid) else hashlib.md5(request_id.encode("utf-8")).hexdigest()
+
+
+@contextmanager
+def span(name: str, kind: int = KIND_INTERNAL, **attrs):
+    """在当前请求被采样时记录一个子 span，否则什么都不做（yield None）"""
+    parent = _current.get()
+    if parent is None:
+        yield None
+        return
+    s = parent.child(name, kind, attrs)
+    token = _current.set(s)
+    error = None
+    try:
+        yield s
+    except BaseException as e:
+        error = e
+        raise
+    finally:
+        _current.reset(token)
+        s.finish(error)
+
+
+class TracingMiddleware(BaseHTTPMiddleware):
+    """读取/生成 X-Request-ID，采样的请求记录根 span；放在最外层（CORS 之内）以覆盖限流等中间件"""
+
+    async def dispatch(self, request, call_next):
+        request_id = request.headers.get("X-Request-ID") or uuid.uuid4().hex
+        request.state.request_id = request_id
+        root = None
+        token = None
+        m = _TRACEPARENT.match(request.headers.get("traceparent", ""))
+        if m:
+            trace_id, parent_id, forced = m.group(1), m.group(2), int(m.group(3), 16) & 1
+        else:
+            trace_id, parent_id, forced = trace_id_for(request_id), None, 0
+        if forced or _sampled(trace_id):
+            root = Span(f"{request.method} {request.url.path}", trace_id, parent_id, KIND_SERVER, {
+                "http.method": request.method,
+                "http.target": request.url.path,
+                "request.id": request_id,
+                "enduser.id": request.headers.get("X-User-ID") or "default_user",
+            })
+            token = _current.set(root)
+        status = 500
+        try:
+            response = await call_next(request)
+            status = response.status_code
+        finally:
+            if root is not None:
+                root.set("http.status_code", status)
+                _current.reset(token)
+                root.finish()
+        response.headers["X-Request-ID"] = request_id
+        return response
+
+
+def _before_cursor(conn, cursor, statement, parameters, context, executemany):
+    parent = _current.get()
+    if parent is None or context is None:
+        return
+    context._trace_span = parent.child("db.query", KIND_CLIENT, {
+        "db.system": conn.dialect.name,
+        "db.statement": statement[:1000],
+    })
+
+
+def _after_cursor(conn, cursor, statement, parameters, context, executemany):
+    s = getattr(context, "_trace_span", None)
+    if s is not None:
+        s.set("db.rows", cursor.rowcount)
+        s.finish()
+
+
+def _on_db_error(exception_context):
+    s = getattr(exception_context.execution_context, "_trace_span", None)
+    if s is not None and s.end is None:
+        s.finish(exception_context.original_exception)
+
+
+_installed = False
+
+
+def install():
+    """给所有 SQLAlchemy Engine 和 httpx.AsyncClient 加上 span 记录（进程内只执行一次）"""
+    global _installed
+    if _installed:
+        return
+    _installed = True
+    event.listen(Engine, "before_cursor_execute", _before_cursor)
+    event.listen(Engine, "after_cursor_execute", _after_cursor)
+    event.listen(Engine, "handle_error", _on_db_error)
+
+    send = httpx.AsyncClient.send
+
+    async def traced_send(self, request, *args, **kwargs):
+        with span(f"HTTP {request.method}", KIND_CLIENT, **{
+            "http.method": request.method,
+            "http.url": str(request.url.copy_with(query=None)),
+        }) as s:
+            response = await send(self, request, *args, **kwargs)
+            if s is not None:
+                s.set("http.status_code", response.status_code)
+            return response
+
+    httpx.AsyncClient.send = traced_send
+
+
+def _payload(spans: list) -> dict:
+    return {"resourceSpans": [{
+        "resource": {"attributes": [{"key": "service.name", "value": {"stringValue": SERVICE_NAME}}]},
+        "scopeSpans": [{"scope": {"name": "logfolio"}, "spans": [s.to_otlp() for s in spans]}],
+    }]}
+
+
+def flush() -> int:
+    """导出缓冲区中的 span，返回导出数量"""
+    with _flush_lock:
+        spans = []
+        while _buffer:
+            spans.append(_buffer.popleft())
+        if not spans:
+            return 0
+        payload = _payload(spans)
+        if TRACE_EXPORT.startswith(("http://", "https://")):
+            httpx.post(TRACE_EXPORT, json=payload, timeout=10.0).raise_for_status()
+        else:
+            with open(TRACE_EXPORT, "a", encoding="utf-8") as f:
+                f.write(json.dumps(payload, ensure_ascii=False, separators=(",", ":")) + "\n")
+        return len(spans)
+
+
+async def export_loop():
+    """定期导出 span"""
+    while True:
+        await asyncio.sleep(TRACE_FLUSH_SECONDS)
+        try:
+            await asyncio.to_thread(flush)
+        except Exception as e:
+            logger.warning("trace export failed: %s", e)
@@ -0,0 +1,182 @@
+"""
+上传图片入库：流式写入临时文件 → 限制字节数 → 只读文件头校验格式和像素数 → 超大原图在子进程中缩小 → 改名为正式文件。
+
+任何一步失败都会删除临时文件并抛出 HTTPException，不会在 UPLOAD_DIR 留下孤儿文件。
+断点续传（resumable.py）写完的暂存文件经 save_staged 走同样的校验流程。
+入库后用 make_placeholder 生成低清占位图存到 ItemImage.placeholder；老数据用命令行补齐：
+    python uploads.py --backfill-placeholders
+"""
+import argparse
+import asyncio
+import logging
+import os
+import shutil
+import uuid
+from pathlib import Path
+from typing import Optional
+
+from fastapi import HTTPException, UploadFile
+
+from config import UPLOAD_DIR
+import imaging
+import tracing
+
+logger = logging.getLogger("uvicorn.error")
+
+# 单个上传文件的最大字节数
+IMAGE_MAX_BYTES = int(os.environ.get("IMAGE_MAX_BYTES", 20 * 1024 * 1024))
+CHUNK_SIZE = 1024 * 1024
+
+
+def _tmp_path() -> str:
+    # storage_gc 按 .part 后缀识别：上传中不会被当作孤儿，崩溃遗留的超过 GC_PART_MAX_AGE_SECONDS 后删除
+    return os.path.join(UPLOAD_DIR, f"{uuid.uuid4()}.part")
+
+
+def _discard(path: str):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+async def _ingest(tmp: str, ext: str) -> str:
+    """校验临时文件并改名为正式上传文件，返回文件名"""
+    try:
+        _, width, height = await asyncio.to_thread(imaging.probe, tmp)
+        if imaging.needs_downscale(width, height):
+            await imaging.run_in_worker(imaging.downscale_original, tmp)
+    except imaging.ImageRejected as e:
+        _discard(tmp)
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception:
+        _discard(tmp)
+        raise
+    fn = f"{uuid.uuid4()}{ext}"
+    os.replace(tmp, os.path.join(UPLOAD_DIR, fn))
+    return fn
+
+
+async def save_upload(f: UploadFile) -> str:
+    """保存表单上传的图片，返回 UPLOAD_DIR 中的文件名"""
+    ext = Path(f.filename or "").suffix
+    tmp = _tmp_path()
+    size = 0
+    try:
+        with tracing.span("upload.write", filename=f.filename or ""), open(tmp, "wb") as buf:
+            while True:
+                chunk = await f.read(CHUNK_SIZE)
+                if not chunk:
+                    break
+                size += len(chunk)
+                if size > IMAGE_MAX_BYTES:
+                    raise HTTPException(status_code=413, detail=f"图片不能超过 {IMAGE_MAX_BYTES // (1024 * 1024)}MB")
+                buf.write(chunk)
+    except Exception:
+        _discard(tmp)
+        raise
+    return await _ingest(tmp, ext)
+
+
+async def save_image_bytes(content: bytes, ext: str) -> str:
+    """保存已下载到内存的图片（如封面 URL），返回 UPLOAD_DIR 中的文件名"""
+    if len(content) > IMAGE_MAX_BYTES:
+        raise HTTPException(status_code=413, detail=f"图片不能超过 {IMAGE_MAX_BYTES // (1024 * 1024)}MB")
+    tmp = _tmp_path()
+    try:
+        with open(tmp, "wb") as buf:
+            buf.write(content)
+    except Exception:
+        _discard(tmp)
+        raise
+    return await _ingest(tmp, ext)
+
+
+async def save_staged(path: str, ext: str) -> str:
+    """把分片上传写完的暂存文件入库，返回 UPLOAD_DIR 中的文件名。
+    暂存文件保持不变（硬链接为临时文件后再校验、缩小），入库之后的步骤失败时会话仍可重新提交"""
+    if os.path.getsize(path) > IMAGE_MAX_BYTES:
+        raise HTTPException(status_code=413, detail=f"图片不能超过 {IMAGE_MAX_BYTES // (1024 * 1024)}MB")
+    tmp = _tmp_path()
+    try:
+        os.link(path, tmp)
+    except OSError:
+        # 不支持硬链接的文件系统退回复制
+        try:
+            await asyncio.to_thread(shutil.copyfile, path, tmp)
+        except Exception:
+            _discard(tmp)
+            raise
+    return await _ingest(tmp, ext)
+
+
+def remove_upload(filename: str):
+    """删除已入库、但未能写入数据库的上传文件"""
+    _discard(os.path.join(UPLOAD_DIR, filename))
+
+
+async def make_placeholder(filename: str) -> Optional[str]:
+    """为已入库的图片生成低清占位图 data URI；失败时返回 None，不影响上传"""
+    try:
+        return await imaging.run_in_worker(imaging.render_placeholder, os.path.join(UPLOAD_DIR, filename))
+    except Exception as e:
+        logger.warning("生成占位图失败 %s: %s", filename, e)
+        return None
+
+
+async def backfill_placeholders(batch_size: int = 200) -> int:
+    """给 placeholder 为空的图片补齐占位图，返回补齐条数；源文件缺失或无法解码的跳过"""
+    from database import SessionLocal
+    from models import ItemImage, YearSnapshot
+    from storage_gc import upload_filename
+
+    db = SessionLocal()
+    done = 0
+    last_id = 0
+    try:
+        while True:
+            rows = (
+                db.query(ItemImage)
+                .filter(ItemImage.placeholder.is_(None), ItemImage.id > last_id)
+                .order_by(ItemImage.id)
+                .limit(batch_size)
+                .all()
+            )
+            if not rows:
+                break
+            last_id = rows[-1].id
+            names = [upload_filename(r.image_url) for r in rows]
+            results = await asyncio.gather(*(make_placeholder(n) if n else asyncio.sleep(0) for n in names))
+            for row, ph in zip(rows, results):
+                if ph:
+                    # updated_at 显式写回原值，不触发 onupdate：占位图不算内容变化，避免所有记录都进入增量同步
+                    db.query(ItemImage).filter(ItemImage.id == row.id).update(
+                        {ItemImage.placeholder: ph, ItemImage.updated_at: ItemImage.updated_at},
+                        synchronize_session=False,
+                    )
+                    done += 1
+            db.commit()
+        if done:
+            # 年度回顾快照里带有占位图，补齐后全部重建
+            db.query(YearSnapshot).delete(synchronize_session=False)
+            db.commit()
+    finally:
+        db.close()
+        imaging.shutdown_workers()
+    return done
+
+
+def main():
+    parser = argparse.ArgumentParser(description="上传图片维护")
+    parser.add_argument("--backfill-placeholders", action="store_true", help="为已有图片补齐低清占位图")
+    parser.add_argument("--batch-size", type=int, default=200, help="每批处理的图片数")
+    args = parser.parse_args()
+    if not args.backfill_placeholders:
+        parser.print_help()
+        return
+    n = asyncio.run(backfill_placeholders(args.batch_size))
+    print(f"已补齐占位图: {n}")
+
+
+if __name__ == "__main__":
+    main()
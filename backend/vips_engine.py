@@ -0,0 +1,136 @@
+"""
+libvips 图片引擎（IMAGE_ENGINE=vips 或 auto 时启用）：pip install pyvips，并安装系统 libvips 8.12+
+（HEIC/AVIF 需 libvips 编译时带 libheif）。
+
+与 PillowEngine 输出一致（同样的档位、格式和质量参数，输出宽高都由 imaging.variant_size / fit_size 计算），
+区别在解码方式：
+- thumbnail 在加载时缩小（JPEG 按 DCT 缩放、WebP/HEIC 按缩放解码），不解码全尺寸像素，并自动按 EXIF 旋转；
+- 流水线按条带流式处理，峰值内存与输出尺寸相关而不是与原图像素数相关，手机原图也只占几十 MB；
+- 缩放在 libvips 线程池中并行，线程数由 libvips 自身的 VIPS_CONCURRENCY 环境变量控制。
+
+只接受 LOADER_FORMATS 中的格式（与 Pillow 能识别的范围一致），SVG、PDF 等交给 libvips 也能打开的格式一律拒绝。
+"""
+import os
+from contextlib import contextmanager
+from typing import Optional
+
+import pyvips
+
+import imaging
+from imaging import SAVE_OPTIONS, ImageRejected
+
+# vips-loader 前缀 -> 与 Pillow img.format 相同的格式名
+LOADER_FORMATS = {"jpeg": "JPEG", "png": "PNG", "webp": "WEBP", "heif": "HEIF", "gif": "GIF", "tiff": "TIFF"}
+
+# 与 SAVE_OPTIONS 对应的 libvips 保存参数；strip 去掉 EXIF 等元数据（方向已在加载时应用）
+VIPS_SAVE = {
+    "avif": ("heifsave_buffer", {"Q": SAVE_OPTIONS["avif"]["quality"], "compression": "av1", "strip": True}),
+    "webp": ("webpsave_buffer", {"Q": SAVE_OPTIONS["webp"]["quality"], "effort": SAVE_OPTIONS["webp"]["method"], "strip": True}),
+    "jpeg": ("jpegsave_buffer", {"Q": SAVE_OPTIONS["jpeg"]["quality"], "optimize_coding": True, "interlace": True, "strip": True}),
+}
+# 入库缩小时按原格式写回，无法写回的格式（如 HEIF）改存 JPEG，与 PillowEngine 相同
+INGEST_SAVE = {
+    "JPEG": ".jpg[Q=90,strip]", "PNG": ".png[strip]", "WEBP": ".webp[Q=90,strip]", "GIF": ".gif", "TIFF": ".tif",
+}
+
+
+@contextmanager
+def _vips_errors():
+    """把 pyvips.Error 转成 ImageRejected（子进程异常需能 pickle 回 API 进程）"""
+    try:
+        yield
+    except pyvips.Error as e:
+        detail = (str(e).strip().splitlines() or [""])[0]
+        raise ImageRejected(f"图片解码失败: {detail}")
+
+
+def _to_srgb(img, flatten: bool):
+    """统一为 8 位 sRGB；flatten 时把透明部分铺白底（JPEG / 占位图）"""
+    if flatten and img.hasalpha():
+        img = img.flatten(background=[255, 255, 255])
+    if img.interpretation != "srgb":
+        img = img.colourspace("srgb")
+    return img
+
+
+def _oriented_size(img) -> tuple:
+    orientation = img.get("orientation") if img.get_typeof("orientation") else 1
+    return imaging.oriented_size(img.width, img.height, orientation)
+
+
+def _thumbnail(file_path: str, size: tuple):
+    """缩放到精确的 size（旋转后尺寸），加载时缩小并按 EXIF 旋转"""
+    return pyvips.Image.thumbnail(file_path, size[0], height=size[1], size="force")
+
+
+class VipsEngine:
+    name = "vips"
+
+    def __init__(self):
+        # 关闭操作缓存：downscale_original 原地替换文件后，同一路径不能命中旧的解码结果；也避免子进程缓存占内存
+        pyvips.cache_set_max(0)
+        self._avif = None
+
+    def avif_supported(self) -> bool:
+        """libvips 能否编码 AVIF（需 heifsave 且 libheif 带 AV1 编码器），首次调用时试编码一张小图"""
+        if self._avif is None:
+            try:
+                method, opts = VIPS_SAVE["avif"]
+                getattr(pyvips.Image.black(16, 16, bands=3), method)(**opts)
+                self._avif = True
+            except pyvips.Error:
+                self._avif = False
+        return self._avif
+
+    def _open(self, file_path: str):
+        """打开图片头并校验格式和像素数，返回 (vips 图片, 格式名)"""
+        with _vips_errors():
+            try:
+                img = pyvips.Image.new_from_file(file_path)
+            except pyvips.Error:
+                raise ImageRejected("无法识别的图片格式")
+            loader = img.get("vips-loader")
+        fmt = LOADER_FORMATS.get(loader.split("load")[0])
+        if fmt is None:
+            raise ImageRejected("无法识别的图片格式")
+        imaging.check_pixels(img.width, img.height)
+        return img, fmt
+
+    def probe(self, file_path: str):
+        img, fmt = self._open(file_path)
+        return fmt, img.width, img.height
+
+    def render_variant(self, file_path: str, width: Optional[int], fmt: str) -> bytes:
+        head, _ = self._open(file_path)
+        with _vips_errors():
+            size = imaging.variant_size(*_oriented_size(head), width)
+            if size != _oriented_size(head):
+                img = _thumbnail(file_path, size)
+            else:
+                img = head.autorot()
+            img = _to_srgb(img, flatten=fmt == "jpeg")
+            method, opts = VIPS_SAVE[fmt]
+            return getattr(img, method)(**opts)
+
+    def render_placeholder(self, file_path: str) -> bytes:
+        head, _ = self._open(file_path)
+        with _vips_errors():
+            img = _thumbnail(file_path, imaging.fit_size(*_oriented_size(head), imaging.PLACEHOLDER_SIZE))
+            return _to_srgb(img, flatten=True).webpsave_buffer(Q=imaging.PLACEHOLDER_QUALITY, strip=True)
+
+    def downscale_original(self, file_path: str):
+        head, fmt = self._open(file_path)
+        with _vips_errors():
+            if head.get_typeof("n-pages") and head.get("n-pages") > 1:
+                # 动图逐帧缩放代价高且容易丢帧，保留原文件
+                return
+            img = _thumbnail(file_path, imaging.fit_size(*_oriented_size(head), imaging.IMAGE_INGEST_MAX_SIDE))
+            suffix = INGEST_SAVE.get(fmt)
+            if suffix is None or suffix.startswith(".jpg"):
+                suffix = INGEST_SAVE["JPEG"]
+                img = _to_srgb(img, flatten=True)
+            data = img.write_to_buffer(suffix)
+        tmp = file_path + ".resize"
+        with open(tmp, "wb") as f:
+            f.write(data)
+        os.replace(tmp, file_path)
@@ -0,0 +1,124 @@
+"""
+成就墙雪碧图与整墙导出。
+
+雪碧图：把某分类成就墙的封面裁成 ATLAS_TILE 正方形，每 ATLAS_SHEET_TILES 张拼成一张 WebP，
+另生成 JSON 坐标表（记录 id -> 第几张图、行列），前端用一次请求加载几百张封面。
+整墙导出：服务端直接生成整墙 JPEG，代替前端 html2canvas 逐格重绘。
+
+缓存文件在 UPLOAD_DIR/.atlas_cache，文件名 = 用户+分类的 key + 条目摘要；成就墙的条目（记录 id 与封面地址）
+变化后摘要随之变化，下次请求重新生成并删除该分类的旧文件。所有解码都在 imaging 的限内存子进程中执行。
+"""
+import asyncio
+import hashlib
+import json
+import os
+
+from config import UPLOAD_DIR
+import imaging
+from storage_gc import upload_path
+
+ATLAS_DIR = os.path.join(UPLOAD_DIR, ".atlas_cache")
+ATLAS_TILE = int(os.environ.get("ATLAS_TILE", 200))
+ATLAS_COLS = int(os.environ.get("ATLAS_COLS", 16))
+ATLAS_SHEET_TILES = ATLAS_COLS * int(os.environ.get("ATLAS_ROWS", 16))
+# 整墙导出画布的像素上限：画布整张在解码子进程内存中（RGB 每像素 3 字节），需低于 IMAGE_WORKER_MAX_MEMORY
+WALL_EXPORT_MAX_PIXELS = int(os.environ.get("WALL_EXPORT_MAX_PIXELS", 40_000_000))
+# JPEG 单边上限
+WALL_EXPORT_MAX_SIDE = 65000
+
+# 同一用户+分类同时只生成一次
+_locks = {}
+
+
+def _owner_key(user_id: str, category_id: int) -> str:
+    return hashlib.sha1(f"{user_id}\0{category_id}".encode("utf-8")).hexdigest()[:16]
+
+
+def _digest(entries: list, *extra) -> str:
+    h = hashlib.sha1(repr(extra).encode("utf-8"))
+    for e in entries:
+        h.update(f"{e['id']}\0{e['image']}\n".encode("utf-8"))
+    return h.hexdigest()[:16]
+
+
+def _cleanup(owner: str, keep_prefix: str, suffix: str):
+    """删除同一用户+分类下摘要已过期的缓存文件"""
+    if not os.path.isdir(ATLAS_DIR):
+        return
+    for name in os.listdir(ATLAS_DIR):
+        if name.startswith(owner + "_") and name.endswith(suffix) and not name.startswith(keep_prefix):
+            try:
+                os.remove(os.path.join(ATLAS_DIR, name))
+            except OSError:
+                pass
+
+
+def _lock_for(key: str) -> asyncio.Lock:
+    lock = _locks.get(key)
+    if lock is None:
+        lock = _locks[key] = asyncio.Lock()
+    return lock
+
+
+def sheet_path(name: str):
+    """雪碧图文件名对应的路径；名称不合法返回 None"""
+    if not name.endswith(".webp") or not all(c.isalnum() or c in "_." for c in name) or ".." in name:
+        return None
+    return os.path.join(ATLAS_DIR, name)
+
+
+async def build_atlas(user_id: str, category_id: int, entries: list) -> dict:
+    """返回成就墙坐标表；缓存不存在时生成雪碧图"""
+    owner = _owner_key(user_id, category_id)
+    digest = _digest(entries, ATLAS_TILE, ATLAS_COLS, ATLAS_SHEET_TILES)
+    prefix = f"{owner}_{digest}"
+    map_path = os.path.join(ATLAS_DIR, f"{prefix}.json")
+    async with _lock_for(owner):
+        try:
+            with open(map_path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            pass
+        os.makedirs(ATLAS_DIR, exist_ok=True)
+        sheets, tiles, jobs = [], {}, []
+        for start in range(0, len(entries), ATLAS_SHEET_TILES):
+            chunk = entries[start:start + ATLAS_SHEET_TILES]
+            n = len(sheets)
+            name = f"{prefix}_{n}.webp"
+            rows = -(-len(chunk) // ATLAS_COLS)
+            sheets.append({"url": f"/api/wall/atlas/{name}", "width": ATLAS_COLS * ATLAS_TILE, "height": rows * ATLAS_TILE})
+            for i, e in enumerate(chunk):
+                tiles[str(e["id"])] = [n, i % ATLAS_COLS, i // ATLAS_COLS]
+            paths = [upload_path(e["image"]) for e in chunk]
+            jobs.append(imaging.run_in_worker(imaging.render_atlas, paths, ATLAS_TILE, ATLAS_COLS, os.path.join(ATLAS_DIR, name)))
+        await asyncio.gather(*jobs)
+        data = {"digest": digest, "tile": ATLAS_TILE, "cols": ATLAS_COLS, "sheets": sheets, "tiles": tiles}
+        tmp = map_path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(data, f)
+        os.replace(tmp, map_path)
+        _cleanup(owner, prefix, ".json")
+        _cleanup(owner, prefix, ".webp")
+        return data
+
+
+def export_size(count: int, cols: int, tile: int, gap: int) -> tuple:
+    """整墙导出画布的 (宽, 高)，与 imaging.render_wall_export 一致"""
+    rows = max(1, -(-count // cols))
+    return cols * tile + (cols + 1) * gap, rows * tile + (rows + 1) * gap
+
+
+async def build_export(user_id: str, category_id: int, entries: list, cols: int, tile: int, gap: int, bg: str) -> str:
+    """返回整墙导出 JPEG 的路径；缓存不存在时生成"""
+    owner = _owner_key(user_id, category_id)
+    digest = _digest(entries, "export", cols, tile, gap, bg)
+    prefix = f"{owner}_{digest}"
+    out_path = os.path.join(ATLAS_DIR, f"{prefix}_export.jpg")
+    async with _lock_for(owner):
+        if os.path.isfile(out_path):
+            return out_path
+        os.makedirs(ATLAS_DIR, exist_ok=True)
+        paths = [upload_path(e["image"]) for e in entries]
+        await imaging.run_in_worker(imaging.render_wall_export, paths, tile, cols, gap, bg, out_path)
+        _cleanup(owner, prefix, "_export.jpg")
+        return out_path
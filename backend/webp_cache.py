@@ -0,0 +1,320 @@
+"""
+派生图缓存：上传原图首次转 WebP（或其它尺寸/格式，见 imaging.py）后写入 UPLOAD_DIR/.webp_cache，后续直接读文件。
+
+缓存由内存索引管理（缓存文件名 -> 大小、mtime、最近访问时间），命中时直接打开文件，不对源文件和缓存文件逐个 stat。
+上传文件名为 uuid，原图不会被覆盖，删除记录/图片时调用 discard 即可保证不返回过期缓存。
+总大小超过 WEBP_CACHE_MAX_BYTES 时按 LRU 淘汰。
+
+多个 uvicorn worker 共用同一个缓存目录，各自的内存索引只是本进程的视图，以目录和 .index.json 为准：
+- 索引中没有的文件仍会尝试打开（可能由其它 worker 或命令行预热写入），打开成功即加入索引；
+- sync_index（启动时、每 WEBP_CACHE_PERSIST_SECONDS 秒、退出时）在 .index.lock 文件锁内扫描目录得到全部缓存文件，
+  与 .index.json 中其它进程保存的访问时间合并，按全部文件的总大小淘汰，再写回 .index.json；
+- 两次同步之间每个 worker 只按自己的视图淘汰，总大小最多超出这段时间内其它 worker 新写入的字节数。
+"""
+import asyncio
+import fcntl
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Optional
+
+from config import UPLOAD_DIR
+
+logger = logging.getLogger("uvicorn.error")
+
+# WebP 缓存目录：首次转换后写入，后续直接读文件，避免重复转换
+WEBP_CACHE_DIR = os.path.join(UPLOAD_DIR, ".webp_cache")
+# 缓存总大小预算（字节），0 表示不限制
+WEBP_CACHE_MAX_BYTES = int(os.environ.get("WEBP_CACHE_MAX_BYTES", 2 * 1024 ** 3))
+# 索引与其它 worker 同步并保存的间隔（秒）
+WEBP_CACHE_PERSIST_SECONDS = int(os.environ.get("WEBP_CACHE_PERSIST_SECONDS", 60))
+WEBP_CACHE_INDEX_FILE = os.path.join(WEBP_CACHE_DIR, ".index.json")
+WEBP_CACHE_LOCK_FILE = os.path.join(WEBP_CACHE_DIR, ".index.lock")
+
+_lock = threading.Lock()
+# 缓存文件名 -> [size, mtime, last_access]，顺序即 LRU 顺序（最久未访问在前）
+_index = OrderedDict()
+_total_bytes = 0
+_loaded = False
+_stats = {"hits": 0, "misses": 0, "writes": 0, "evictions": 0, "evicted_bytes": 0}
+
+
+def source_key(source_path: str) -> str:
+    """源文件对应的缓存 key（缓存文件名去掉尺寸/格式后缀的部分）"""
+    name = os.path.basename(source_path)
+    base, ext = os.path.splitext(name)
+    ext = (ext or "").lstrip(".")
+    safe_base = "".join(c if c.isalnum() or c in "-_." else "_" for c in base).strip(".") or "img"
+    safe_ext = "".join(c if c.isalnum() else "_" for c in ext) or "img"
+    return f"{safe_base}_{safe_ext}"
+
+
+def webp_cache_path(source_path: str, width: Optional[int] = None, fmt: str = "webp") -> str:
+    """源文件路径对应的缓存文件路径（含扩展名区分 a.jpg / a.png）；
+    原尺寸 WebP 为 a_jpg.webp，其它尺寸/格式为 a_jpg__w320.avif 等"""
+    suffix = f"__w{width}" if width else ""
+    return os.path.join(WEBP_CACHE_DIR, f"{source_key(source_path)}{suffix}.{fmt}")
+
+
+def cache_source_key(cache_name: str) -> str:
+    """缓存文件名对应的源文件 key，用于判断缓存是否还有对应原图"""
+    return os.path.splitext(cache_name)[0].split("__w", 1)[0]
+
+
+@contextmanager
+def _file_lock():
+    """跨进程排它锁：同一时刻只有一个 worker 在同步索引和淘汰"""
+    os.makedirs(WEBP_CACHE_DIR, exist_ok=True)
+    with open(WEBP_CACHE_LOCK_FILE, "a") as f:
+        fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+
+def _read_persisted() -> dict:
+    try:
+        with open(WEBP_CACHE_INDEX_FILE, "r", encoding="utf-8") as f:
+            return json.load(f).get("entries") or {}
+    except (OSError, ValueError):
+        return {}
+
+
+def _scan_dir() -> list:
+    """缓存目录中的全部缓存文件 [(文件名, 大小, mtime, atime)]，跳过索引、锁和写入中的临时文件"""
+    files = []
+    if not os.path.isdir(WEBP_CACHE_DIR):
+        return files
+    with os.scandir(WEBP_CACHE_DIR) as it:
+        for entry in it:
+            if entry.name.startswith(".") or entry.name.endswith(".tmp"):
+                continue
+            try:
+                if not entry.is_file(follow_symlinks=False):
+                    continue
+                st = entry.stat(follow_symlinks=False)
+            except OSError:
+                continue
+            files.append((entry.name, st.st_size, st.st_mtime, st.st_atime))
+    return files
+
+
+def sync_index() -> int:
+    """与其它 worker 同步：扫描目录重建索引（访问时间取本进程、.index.json 和文件 atime 中最新的），
+    按全部缓存文件的总大小淘汰，再写回 .index.json；返回条目数"""
+    global _total_bytes, _loaded
+    with _file_lock():
+        persisted = _read_persisted()
+        with _lock:
+            local = {name: meta[2] for name, meta in _index.items()}
+        entries = []
+        for name, size, mtime, atime in _scan_dir():
+            saved = persisted.get(name)
+            last_access = max(local.get(name, 0), saved[2] if saved and len(saved) > 2 else 0) or max(atime, mtime)
+            entries.append((last_access, name, size, mtime))
+        entries.sort()
+        with _lock:
+            _index.clear()
+            for last_access, name, size, mtime in entries:
+                _index[name] = [size, mtime, last_access]
+            _total_bytes = sum(v[0] for v in _index.values())
+            _loaded = True
+        enforce_budget()
+        _write_persisted()
+    return len(entries)
+
+
+def _write_persisted():
+    """把索引写入 .index.json（先写临时文件再替换，避免写一半）；调用方持有文件锁"""
+    with _lock:
+        data = {"saved_at": time.time(), "entries": dict(_index)}
+    try:
+        tmp = f"{WEBP_CACHE_INDEX_FILE}.{uuid.uuid4().hex}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(data, f)
+        os.replace(tmp, WEBP_CACHE_INDEX_FILE)
+    except OSError as e:
+        logger.warning("webp_cache save index failed: %s", e)
+
+
+def build_index():
+    """启动时建立索引（与其它 worker 同步）"""
+    n = sync_index()
+    logger.info("webp_cache index built: %d entries, %d bytes", n, _total_bytes)
+
+
+def ensure_index():
+    """索引尚未建立时（如命令行工具中）先建立"""
+    if not _loaded:
+        build_index()
+
+
+def save_index():
+    """与其它 worker 合并后保存索引"""
+    if not _loaded:
+        return
+    try:
+        sync_index()
+    except OSError as e:
+        logger.warning("webp_cache sync index failed: %s", e)
+
+
+def get(cache_path: str):
+    """命中返回缓存内容，未命中返回 None；索引中没有的文件也尝试打开（可能由其它 worker 写入）"""
+    global _total_bytes
+    name = os.path.basename(cache_path)
+    try:
+        with open(cache_path, "rb") as f:
+            data = f.read()
+    except OSError:
+        # 不存在，或已被其它 worker / 命令行回收
+        _drop(name)
+        with _lock:
+            _stats["misses"] += 1
+        return None
+    now = time.time()
+    with _lock:
+        meta = _index.get(name)
+        if meta is not None:
+            meta[2] = now
+            _index.move_to_end(name)
+        else:
+            _index[name] = [len(data), now, now]
+            _total_bytes += len(data)
+        _stats["hits"] += 1
+    return data
+
+
+def contains(cache_path: str) -> bool:
+    """是否已有该缓存（不计入命中统计，也不更新访问顺序）"""
+    with _lock:
+        if os.path.basename(cache_path) in _index:
+            return True
+    return os.path.isfile(cache_path)
+
+
+def recent_sources(since: float) -> dict:
+    """since（时间戳）之后被访问过的源文件 key -> 被访问的缓存条目数，用于挑选近期活跃用户"""
+    counts = {}
+    with _lock:
+        for name, meta in _index.items():
+            if meta[2] >= since:
+                key = cache_source_key(name)
+                counts[key] = counts.get(key, 0) + 1
+    return counts
+
+
+def put(cache_path: str, data: bytes):
+    """写入缓存文件并登记到索引，超出预算时淘汰最久未访问的条目"""
+    global _total_bytes
+    name = os.path.basename(cache_path)
+    os.makedirs(WEBP_CACHE_DIR, exist_ok=True)
+    tmp = f"{cache_path}.{uuid.uuid4().hex}.tmp"
+    try:
+        with open(tmp, "wb") as f:
+            f.write(data)
+        os.replace(tmp, cache_path)
+    except OSError as e:
+        logger.warning("webp_cache write failed for %s: %s", name, e)
+        try:
+            os.remove(tmp)
+        except OSError:
+            pass
+        return
+    now = time.time()
+    with _lock:
+        old = _index.pop(name, None)
+        if old:
+            _total_bytes -= old[0]
+        _index[name] = [len(data), now, now]
+        _total_bytes += len(data)
+        _stats["writes"] += 1
+    enforce_budget()
+
+
+def _drop(name: str) -> int:
+    global _total_bytes
+    with _lock:
+        meta = _index.pop(name, None)
+        if meta is None:
+            return 0
+        _total_bytes -= meta[0]
+        return meta[0]
+
+
+def discard(source_path: str) -> int:
+    """删除某个源文件对应的所有尺寸/格式缓存，返回释放的字节数"""
+    from imaging import WIDTH_BUCKETS, MEDIA_TYPES
+
+    freed = 0
+    for width in (None,) + WIDTH_BUCKETS:
+        for fmt in MEDIA_TYPES:
+            freed += discard_entry(webp_cache_path(source_path, width, fmt))
+    return freed
+
+
+def discard_entry(cache_path: str) -> int:
+    """删除单个缓存文件并移出索引，返回释放的字节数"""
+    name = os.path.basename(cache_path)
+    size = _drop(name)
+    try:
+        if not size:
+            size = os.path.getsize(cache_path)
+        os.remove(cache_path)
+    except OSError:
+        pass
+    return size
+
+
+def enforce_budget(dry_run: bool = False):
+    """总大小超出 WEBP_CACHE_MAX_BYTES 时按 LRU 淘汰（以本进程索引为准），返回 (淘汰条数, 释放字节数)"""
+    global _total_bytes
+    if WEBP_CACHE_MAX_BYTES <= 0:
+        return 0, 0
+    victims = []
+    with _lock:
+        total = _total_bytes
+        for name, meta in _index.items():
+            if total <= WEBP_CACHE_MAX_BYTES:
+                break
+            victims.append((name, meta[0]))
+            total -= meta[0]
+        if not dry_run:
+            for name, size in victims:
+                del _index[name]
+                _total_bytes -= size
+                _stats["evictions"] += 1
+                _stats["evicted_bytes"] += size
+    if not dry_run:
+        for name, _ in victims:
+            try:
+                os.remove(os.path.join(WEBP_CACHE_DIR, name))
+            except OSError:
+                pass
+    return len(victims), sum(size for _, size in victims)
+
+
+def stats() -> dict:
+    """缓存指标：命中/未命中/写入/淘汰次数、条目数和占用字节"""
+    with _lock:
+        lookups = _stats["hits"] + _stats["misses"]
+        return {
+            **_stats,
+            "hit_ratio": round(_stats["hits"] / lookups, 4) if lookups else None,
+            "entries": len(_index),
+            "bytes": _total_bytes,
+            "max_bytes": WEBP_CACHE_MAX_BYTES,
+        }
+
+
+async def persist_loop():
+    """定期与其它 worker 同步索引、按全部缓存文件执行预算并保存"""
+    while True:
+        await asyncio.sleep(WEBP_CACHE_PERSIST_SECONDS)
+        await asyncio.to_thread(save_index)
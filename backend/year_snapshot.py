@@ -0,0 +1,188 @@
+"""
+年度回顾快照：已结束的年份（早于今年）很少再变化，把统计、按月分布和年度墙条目合成一份文档，
+gzip 压缩后存入 year_snapshots 表，/statistics/year、/annual-gallery 和 /year-review 直接读快照。
+
+失效：监听 Session 的 flush，记录、图片写入时清空该记录 finish_time 所在年份（含修改前的年份）的快照，
+分类改名/删除时清空该用户的全部快照；清空与业务写入在同一事务中提交，同时把行上的 generation 加一。
+提交后把失效的 (用户, 年份) 放入待重建队列，由后台 rebuild_loop 重新生成，下次访问直接命中。
+
+生成：先在主库占住快照行并读出 generation，生成后只在 generation 未变时写入（UPDATE ... WHERE generation = ?）。
+生成期间任何 worker 提交的写入都会让 generation 变化，旧数据生成的快照因此不会覆盖失效结果。
+"""
+import asyncio
+import gzip
+import hashlib
+import json
+import logging
+import os
+import threading
+from datetime import datetime
+
+from sqlalchemy import event, inspect, select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from database import SessionLocal
+from models import Category, Item, ItemImage, YearSnapshot
+
+logger = logging.getLogger("uvicorn.error")
+
+# 失效后多久（秒）在后台重建，期间的多次写入只重建一次
+YEAR_SNAPSHOT_REBUILD_DELAY = float(os.environ.get("YEAR_SNAPSHOT_REBUILD_DELAY", 5))
+
+_lock = threading.Lock()
+# 待重建的 (user_id, year)（只是提示，其它 worker 的失效由访问时按需生成）
+_pending = set()
+
+
+def is_closed(year: int) -> bool:
+    """是否为已结束的年份（只有这些年份使用快照）"""
+    return year < datetime.now().year
+
+
+def build_document(db: Session, user_id: str, year: int) -> dict:
+    """实时计算年度回顾文档"""
+    from routers.items import year_statistics, annual_gallery_entries
+
+    return {
+        "year": year,
+        "stats": year_statistics(db, user_id, year),
+        "gallery": annual_gallery_entries(db, user_id, year),
+    }
+
+
+def encode(doc: dict) -> tuple:
+    """文档压缩为 gzip（mtime 固定，内容相同则字节相同），返回 (payload, etag)"""
+    raw = json.dumps(doc, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    payload = gzip.compress(raw, compresslevel=6, mtime=0)
+    return payload, hashlib.sha1(raw).hexdigest()
+
+
+def _current(db: Session, user_id: str, year: int):
+    return db.query(YearSnapshot).filter(
+        YearSnapshot.user_id == user_id, YearSnapshot.year == year, YearSnapshot.payload.isnot(None)
+    ).first()
+
+
+def get_snapshot(db: Session, user_id: str, year: int) -> tuple:
+    """返回已结束年份的 (payload, etag)；快照不存在或已失效时当场生成并保存"""
+    row = _current(db, user_id, year)
+    if row:
+        return row.payload, row.etag
+    return rebuild(user_id, year)
+
+
+def load(db: Session, user_id: str, year: int) -> dict:
+    """已结束年份的年度回顾文档（解压快照）"""
+    payload, _ = get_snapshot(db, user_id, year)
+    return json.loads(gzip.decompress(payload))
+
+
+def _claim(db: Session, user_id: str, year: int) -> int:
+    """取快照行当前的 generation；行不存在时先插入一行空快照，之后的失效都会改变它"""
+    where = (YearSnapshot.user_id == user_id, YearSnapshot.year == year)
+    gen = db.execute(select(YearSnapshot.generation).where(*where)).scalar()
+    if gen is None:
+        try:
+            db.add(YearSnapshot(user_id=user_id, year=year, generation=0))
+            db.commit()
+        except IntegrityError:
+            # 并发请求已插入同一行
+            db.rollback()
+        gen = db.execute(select(YearSnapshot.generation).where(*where)).scalar()
+    db.commit()
+    return gen
+
+
+def _save(db: Session, user_id: str, year: int, payload: bytes, etag: str, gen: int) -> bool:
+    """generation 仍为 gen 时写入快照，返回是否写入；生成期间数据已变化则丢弃，等后台重建"""
+    saved = db.execute(
+        update(YearSnapshot)
+        .where(YearSnapshot.user_id == user_id, YearSnapshot.year == year, YearSnapshot.generation == gen)
+        .values(payload=payload, etag=etag, built_at=datetime.utcnow())
+    ).rowcount
+    db.commit()
+    return saved > 0
+
+
+def rebuild(user_id: str, year: int) -> tuple:
+    """在主库生成一份快照并保存（读请求可能用的是只读副本，生成与保存总是在主库），返回 (payload, etag)"""
+    db = SessionLocal()
+    try:
+        row = _current(db, user_id, year)
+        if row:
+            return row.payload, row.etag
+        gen = _claim(db, user_id, year)
+        payload, etag = encode(build_document(db, user_id, year))
+        _save(db, user_id, year, payload, etag, gen)
+        return payload, etag
+    finally:
+        db.close()
+
+
+async def rebuild_loop():
+    """定期重建已失效的快照"""
+    while True:
+        await asyncio.sleep(YEAR_SNAPSHOT_REBUILD_DELAY)
+        with _lock:
+            batch = list(_pending)
+            _pending.clear()
+        for user_id, year in batch:
+            try:
+                await asyncio.to_thread(rebuild, user_id, year)
+            except Exception as e:
+                logger.warning("year_snapshot rebuild failed for %s/%s: %s", user_id, year, e)
+
+
+def _item_years(item: Item) -> set:
+    """记录当前及修改前的 finish_time 所在年份"""
+    years = {item.finish_time.year} if item.finish_time else set()
+    for old in inspect(item).attrs.finish_time.history.deleted:
+        if old:
+            years.add(old.year)
+    return years
+
+
+@event.listens_for(SessionLocal, "after_flush")
+def _invalidate_on_flush(session: Session, flush_context):
+    stale = set()
+    stale_users = set()
+    image_item_ids = set()
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        if isinstance(obj, Item):
+            stale.update((obj.user_id, y) for y in _item_years(obj))
+        elif isinstance(obj, ItemImage):
+            image_item_ids.add(obj.item_id)
+        elif isinstance(obj, Category) and obj not in session.new:
+            stale_users.add(obj.user_id)
+    if image_item_ids:
+        rows = session.connection().execute(
+            select(Item.user_id, Item.finish_time).where(Item.id.in_(image_item_ids), Item.finish_time.isnot(None))
+        )
+        stale.update((user_id, ft.year) for user_id, ft in rows)
+    stale = {(u, y) for u, y in stale if is_closed(y) and u not in stale_users}
+    if not stale and not stale_users:
+        return
+    conn = session.connection()
+    invalidate = update(YearSnapshot).values(payload=None, etag=None, generation=YearSnapshot.generation + 1)
+    for user_id in stale_users:
+        conn.execute(invalidate.where(YearSnapshot.user_id == user_id))
+    for user_id, year in stale:
+        conn.execute(invalidate.where(YearSnapshot.user_id == user_id, YearSnapshot.year == year))
+    info = session.info.setdefault("year_snapshot_stale", (set(), set()))
+    info[0].update(stale)
+    info[1].update(stale_users)
+
+
+@event.listens_for(SessionLocal, "after_commit")
+def _queue_rebuild(session: Session):
+    stale, stale_users = session.info.pop("year_snapshot_stale", (set(), set()))
+    if not stale and not stale_users:
+        return
+    with _lock:
+        _pending.update(stale)
+
+
+@event.listens_for(SessionLocal, "after_rollback")
+def _discard_stale(session: Session):
+    session.info.pop("year_snapshot_stale", None)
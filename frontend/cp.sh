@@ -1,7 +1,10 @@
 #!/bin/bash
 
 # 前端文件部署脚本
-# 将 frontend/ 目录下的 static/ 和 templates/ 复制到目标目录
+# 先构建到临时目录：js/css 生成带内容哈希的文件名（如 app.3f9c2a1b0d.js）并改写模板中的引用，
+# 文本文件生成 .gz（及 .br，需安装 brotli 命令）预压缩副本，供 nginx gzip_static / brotli_static 直接发送；
+# 再把 static/ 和 templates/ 复制到目标目录。带哈希的文件内容不变，可设置一年缓存（见 openresty-logfolio.conf.example）。
+# 未带哈希的原文件同样保留，旧页面和脚本中直接引用的路径仍然可用。
 
 TARGET_DIR="/opt/1panel/www/sites/logfolio/index"
 
@@ -11,28 +14,61 @@ if [ ! -d "$TARGET_DIR" ]; then
     exit 1
 fi
 
+BUILD_DIR="$(mktemp -d)"
+trap 'rm -rf "$BUILD_DIR"' EXIT
+
+# 构建：内容哈希文件名 + 预压缩
+build() {
+    cp -r static "$BUILD_DIR/static"
+    mkdir -p "$BUILD_DIR/templates"
+    cp -r templates/* "$BUILD_DIR/templates/"
+
+    for f in "$BUILD_DIR"/static/js/*.js "$BUILD_DIR"/static/css/*.css; do
+        [ -f "$f" ] || continue
+        dir="$(dirname "$f")"
+        base="$(basename "$f")"
+        name="${base%.*}"
+        ext="${base##*.}"
+        hash="$(sha256sum "$f" | cut -c1-10)"
+        url_dir="${dir#"$BUILD_DIR"}"
+        cp -p "$f" "$dir/$name.$hash.$ext"
+        # /static/js/app.js?v=20260127 -> /static/js/app.<hash>.js
+        sed -i -E "s#${url_dir}/${name}\\.${ext}(\\?v=[^\"']*)?([\"'])#${url_dir}/${name}.${hash}.${ext}\\2#g" "$BUILD_DIR"/templates/*.html
+    done
+
+    find "$BUILD_DIR" -type f \( -name '*.js' -o -name '*.css' -o -name '*.html' -o -name '*.svg' \) | while read -r f; do
+        gzip -9 -k -n -f "$f"
+        if command -v brotli >/dev/null 2>&1; then
+            brotli -q 11 -k -f "$f"
+        fi
+    done
+    if ! command -v brotli >/dev/null 2>&1; then
+        echo "提示: 未安装 brotli 命令，只生成 .gz 预压缩文件"
+    fi
+}
+
+echo "构建前端文件..."
+if [ ! -d "static" ] || [ ! -d "templates" ]; then
+    echo "错误: 请在 frontend/ 目录下运行（需要 static/ 和 templates/）"
+    exit 1
+fi
+build
+echo "✓ 构建完成"
+
 echo "开始复制前端文件到 $TARGET_DIR ..."
 
 # 复制 static/ 目录
-if [ -d "static" ]; then
-    echo "复制 static/ 目录..."
-    sudo cp -r static/ "$TARGET_DIR/"
-    sudo chown -R ubuntu:ubuntu "$TARGET_DIR/static/"
-    echo "✓ static/ 复制完成"
-else
-    echo "警告: static/ 目录不存在"
-fi
+echo "复制 static/ 目录..."
+sudo cp -r "$BUILD_DIR/static/" "$TARGET_DIR/"
+sudo chown -R ubuntu:ubuntu "$TARGET_DIR/static/"
+echo "✓ static/ 复制完成"
 
-# 复制 templates/ 目录下的文件
-if [ -d "templates" ]; then
-    echo "复制 templates/ 文件..."
-    sudo cp -r templates/* "$TARGET_DIR/"
-    sudo chown -R ubuntu:ubuntu "$TARGET_DIR"/*.html 2>/dev/null || true
-    echo "✓ templates/ 复制完成"
-else
-    echo "警告: templates/ 目录不存在"
-fi
+# 复制 templates/ 目录下的文件（含预压缩的 .html.gz / .html.br）
+echo "复制 templates/ 文件..."
+sudo cp -r "$BUILD_DIR"/templates/* "$TARGET_DIR/"
+sudo chown -R ubuntu:ubuntu "$TARGET_DIR"/*.html* 2>/dev/null || true
+echo "✓ templates/ 复制完成"
 
 echo ""
 echo "✅ 前端文件复制完成！"
-echo "目标目录: $TARGET_DIR"
\ No newline at end of file
+echo "目标目录: $TARGET_DIR"
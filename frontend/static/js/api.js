@@ -122,6 +122,22 @@ const CategoriesAPI = {
         categoryCache.data = null;
         return data;
     }),
+
+    // 用 /bootstrap 返回的分类填充缓存，之后的 getAll 不再单独请求
+    prime: (data) => {
+        categoryCache.data = data;
+        categoryCache.timestamp = Date.now();
+    },
+};
+
+/**
+ * 首页一次性加载：分类、年份、分类数量、第一页记录（/api/bootstrap）
+ */
+const BootstrapAPI = {
+    get: (params = {}) => {
+        const queryString = new URLSearchParams(params).toString();
+        return apiRequest(`/bootstrap/${queryString ? '?' + queryString : ''}`, {}, false);
+    },
 };
 
 /**
@@ -134,6 +150,115 @@ const CoverSearchAPI = {
     },
 };
 
+/**
+ * 增量同步：本地保存全部分类/记录，之后每次只拉取 token 之后的变化（/api/sync）
+ * 变更操作后无需重新拉整个列表，流量与变化量成正比
+ */
+const SYNC_STORAGE_KEY = 'logfolio_sync_v1';
+
+const SyncAPI = {
+    state: null,
+    _pulling: null,
+
+    _load() {
+        if (this.state) return this.state;
+        try {
+            const raw = localStorage.getItem(SYNC_STORAGE_KEY);
+            if (raw) this.state = JSON.parse(raw);
+        } catch (e) {
+            this.state = null;
+        }
+        if (!this.state) this.state = { token: null, user_id: null, items: {}, categories: {} };
+        return this.state;
+    },
+
+    _save() {
+        try {
+            localStorage.setItem(SYNC_STORAGE_KEY, JSON.stringify(this.state));
+        } catch (e) {
+            // 超出 localStorage 配额时仅保留内存中的数据，下次打开页面重新全量同步
+        }
+    },
+
+    // 应用一页同步结果：只有第一页会清空本地；token 在最后一页（next_cursor 为空）之后才保存，
+    // 中途中断时下次从旧 token 重新拉取（按 id 覆盖写入，重复无副作用）
+    _apply(data, first) {
+        const state = this._load();
+        if (first && (data.full || (state.user_id && state.user_id !== data.user_id))) {
+            state.items = {};
+            state.categories = {};
+            state.token = null;
+        }
+        state.user_id = data.user_id;
+        if (!data.next_cursor) state.token = data.token;
+        (data.categories || []).forEach(c => { state.categories[c.id] = c; });
+        (data.items || []).forEach(i => { state.items[i.id] = i; });
+        const deleted = data.deleted || {};
+        (deleted.items || []).forEach(id => { delete state.items[id]; });
+        (deleted.categories || []).forEach(id => { delete state.categories[id]; });
+        this._save();
+    },
+
+    _fetch(token, cursor) {
+        const params = new URLSearchParams();
+        if (token) params.set('since', token);
+        if (cursor) params.set('cursor', cursor);
+        const query = params.toString();
+        return apiRequest(`/sync/${query ? '?' + query : ''}`, {}, false);
+    },
+
+    // 拉取第一页，再按 next_cursor 逐页拉取直到最后一页
+    async _pullPages() {
+        const state = this._load();
+        let token = state.token;
+        let data = await this._fetch(token);
+        // 本地数据属于之前登录的用户：增量只是当前用户在该 token 之后的变化，丢弃 token 重新全量拉取
+        if (!data.full && state.user_id && state.user_id !== data.user_id) {
+            token = null;
+            data = await this._fetch(null);
+        }
+        this._apply(data, true);
+        while (data.next_cursor) {
+            data = await this._fetch(token, data.next_cursor);
+            this._apply(data, false);
+        }
+        return this.state;
+    },
+
+    // 拉取自上次同步以来的变化；并发调用共用同一个请求
+    pull() {
+        if (this._pulling) return this._pulling;
+        this._pulling = this._pullPages().finally(() => { this._pulling = null; });
+        return this._pulling;
+    },
+
+    // 待办：无截止日期在前，再按截止日期升序，最后按创建时间降序（与 /items/todos 一致）
+    getTodos: async () => {
+        const state = await SyncAPI.pull();
+        return Object.values(state.items)
+            .filter(i => !i.is_completed)
+            .sort((a, b) => {
+                if (!a.due_time !== !b.due_time) return a.due_time ? 1 : -1;
+                if (a.due_time !== b.due_time) return a.due_time < b.due_time ? -1 : 1;
+                return a.created_at < b.created_at ? 1 : a.created_at > b.created_at ? -1 : 0;
+            });
+    },
+
+    // 各分类已完成数量（与 /items/category-counts 一致）
+    getCategoryCounts: async (year) => {
+        const state = await SyncAPI.pull();
+        const byCategory = {};
+        let total = 0;
+        Object.values(state.items).forEach(i => {
+            if (!i.is_completed) return;
+            if (year != null && year !== '' && (!i.finish_time || Number(i.finish_time.slice(0, 4)) !== Number(year))) return;
+            byCategory[i.category_name] = (byCategory[i.category_name] || 0) + 1;
+            total++;
+        });
+        return { total, by_category: byCategory };
+    },
+};
+
 /**
  * 记录相关API
  */
@@ -184,10 +309,7 @@ const ItemsAPI = {
     getAvailableYears: () => apiRequest('/items/years'),
 
     // 按年份获取各分类数量（不传 year 为全部年份），用于首页分类胶囊数字
-    getCategoryCounts: (year) => {
-        const params = year != null && year !== '' ? new URLSearchParams({ year }) : '';
-        return apiRequest(`/items/category-counts${params ? '?' + params : ''}`);
-    },
+    getCategoryCounts: (year) => SyncAPI.getCategoryCounts(year),
     
     // 添加图片
     addImages: async (itemId, formData) => {
@@ -225,13 +347,19 @@ const ItemsAPI = {
     deleteImage: (imageId) => apiRequest(`/items/images/${imageId}`, {
         method: 'DELETE',
     }),
+
+    // 调整图片顺序：把 imageId 移到 afterId 之后（afterId 为 null 时移到最前），返回排序后的图片
+    moveImage: (itemId, imageId, afterId = null) => apiRequest(`/items/${itemId}/images/order`, {
+        method: 'PATCH',
+        body: JSON.stringify({ image_id: imageId, after_id: afterId }),
+    }),
     
     // 获取年度墙数据
     getAnnualGallery: (year) => apiRequest(`/items/annual-gallery/${year}`),
     getAchievementWall: (categoryId) => apiRequest(`/items/achievement-wall${categoryId != null ? '?category_id=' + encodeURIComponent(categoryId) : ''}`),
     
     // 获取待办列表
-    getTodos: () => apiRequest('/items/todos'),
+    getTodos: () => SyncAPI.getTodos(),
     
     // 完成待办
     completeTodo: (itemId) => apiRequest(`/items/${itemId}/complete`, {
@@ -261,7 +389,93 @@ const ItemsAPI = {
     },
 };
 
+// 成就墙雪碧图与服务端整墙导出
+const WallAPI = {
+    getAtlas: (categoryId) => apiRequest(`/wall/atlas?category_id=${encodeURIComponent(categoryId)}`, {}, false),
+    exportUrl: (categoryId, bg) => `${API_BASE}/wall/export?category_id=${encodeURIComponent(categoryId)}` +
+        (/^#[0-9a-fA-F]{6}$/.test(bg || '') ? `&bg=${encodeURIComponent(bg)}` : ''),
+};
+
+// 图片断点续传：按服务端给出的分片大小 PATCH 上传，网络中断后从服务端已收到的偏移量继续
+const UPLOAD_MAX_RETRIES = 5;
+
+const UploadAPI = {
+    // 同时上传的文件数，创建会话后以服务端返回的 parallelism 为准
+    parallelism: 3,
+
+    // 上传一个文件并添加到记录，返回 { id, image_url, upload_time }；onProgress(已上传字节, 总字节)
+    uploadFile: async (itemId, file, onProgress) => {
+        const session = await apiRequest('/upload-sessions/', {
+            method: 'POST',
+            body: JSON.stringify({ item_id: itemId, filename: file.name, length: file.size }),
+        }, false);
+        UploadAPI.parallelism = session.parallelism || UploadAPI.parallelism;
+        const sessionUrl = `${API_BASE}/upload-sessions/${session.id}`;
+        let offset = session.offset;
+        let failures = 0;
+        while (offset < session.length) {
+            try {
+                const response = await fetch(sessionUrl, {
+                    method: 'PATCH',
+                    headers: { 'Upload-Offset': String(offset), 'Content-Type': 'application/offset+octet-stream' },
+                    body: file.slice(offset, offset + session.chunk_size),
+                    credentials: 'same-origin',
+                });
+                const serverOffset = response.headers.get('Upload-Offset');
+                // 204 成功；409 偏移量不一致时以服务端为准继续
+                if ((response.status === 204 || response.status === 409) && serverOffset !== null) {
+                    offset = parseInt(serverOffset, 10);
+                    failures = 0;
+                    if (onProgress) onProgress(offset, session.length);
+                    continue;
+                }
+                if (response.status !== 409 && response.status !== 429 && response.status < 500) {
+                    const error = await response.json().catch(() => ({ detail: response.statusText }));
+                    const fatal = new Error(error.detail || `HTTP error! status: ${response.status}`);
+                    fatal.fatal = true;
+                    throw fatal;
+                }
+                throw new Error(`HTTP error! status: ${response.status}`);
+            } catch (error) {
+                if (error.fatal || ++failures > UPLOAD_MAX_RETRIES) throw error;
+                await new Promise(r => setTimeout(r, 1000 * failures));
+                try {
+                    offset = (await apiRequest(`/upload-sessions/${session.id}`, {}, false)).offset;
+                } catch (_) {}
+            }
+        }
+        return apiRequest(`/upload-sessions/${session.id}/finalize`, { method: 'POST' }, false);
+    },
+
+    // 上传多个文件到同一条记录（同时进行 parallelism 个），按原顺序返回图片列表
+    uploadFiles: async (itemId, files, onProgress) => {
+        const list = Array.from(files);
+        const results = new Array(list.length);
+        const loaded = new Array(list.length).fill(0);
+        const total = list.reduce((sum, f) => sum + f.size, 0);
+        const uploadOne = async (i) => {
+            results[i] = await UploadAPI.uploadFile(itemId, list[i], (done) => {
+                loaded[i] = done;
+                if (onProgress) onProgress(loaded.reduce((a, b) => a + b, 0), total);
+            });
+        };
+        if (!list.length) return results;
+        // 先传第一个文件，拿到服务端的 parallelism 后再并发其余文件
+        let next = 0;
+        await uploadOne(next++);
+        const worker = async () => {
+            while (next < list.length) await uploadOne(next++);
+        };
+        await Promise.all(Array.from({ length: Math.min(UploadAPI.parallelism, list.length - 1) }, worker));
+        return results;
+    },
+};
+
 // 导出API对象
 window.CategoriesAPI = CategoriesAPI;
+window.BootstrapAPI = BootstrapAPI;
 window.CoverSearchAPI = CoverSearchAPI;
 window.ItemsAPI = ItemsAPI;
+window.SyncAPI = SyncAPI;
+window.WallAPI = WallAPI;
+window.UploadAPI = UploadAPI;
@@ -10,7 +10,9 @@
     var currentOnAdd = null;
     var currentCategories = [];
     var currentCategoryId = '';
-    var searchState = { q: '', page: 1, loading: false, loadingMore: false, hasNextPage: false, searchType: 'both' };
+    var searchState = { q: '', page: 1, loading: false, loadingMore: false, hasNextPage: false, searchType: 'both', source: 'local', seen: {} };
+    // 本地条目库结果少于此数时直接接着请求在线结果（MAL/Bangumi）
+    var LOCAL_MIN_RESULTS = 6;
     var apiBase = function () { return window.API_BASE_URL || '/api'; };
 
     function getOverlay() {
@@ -65,6 +67,11 @@
         return active ? active.dataset.categoryId : currentCategoryId;
     }
 
+    // 缩略图经后端封面代理加载（本地缓存、缩到选择器尺寸），选中后仍传原始链接
+    function coverThumbUrl(url) {
+        return (window.API_BASE_URL || '/api') + '/cover-proxy?url=' + encodeURIComponent(url);
+    }
+
     function appendResultCard(container, item) {
         if (!item.url) return;
         var title = displayTitle(item);
@@ -72,7 +79,7 @@
             var card = document.createElement('div');
             card.className = 'cover-result-item cover-result-item-quickadd';
             card.innerHTML = '<div class="cover-result-image-wrap">' +
-                '<img src="' + item.url + '" alt="" loading="lazy">' +
+                '<img src="' + coverThumbUrl(item.url) + '" alt="" loading="lazy">' +
                 '</div>' +
                 '<div class="cover-result-footer">' +
                 '<span class="cover-result-title">' + (title || '') + '</span>' +
@@ -94,7 +101,7 @@
         card.dataset.url = item.url;
         card.dataset.title = title;
         card.innerHTML = '<div class="cover-result-image-wrap">' +
-            '<img src="' + item.url + '" alt="" loading="lazy">' +
+            '<img src="' + coverThumbUrl(item.url) + '" alt="" loading="lazy">' +
             '</div>' +
             '<div class="cover-result-footer">' +
             '<span class="cover-result-title">' + (title || '') + '</span>' +
@@ -122,6 +129,35 @@
         document.body.style.overflow = '';
     }
 
+    function searchUrl(page) {
+        return apiBase() + '/anime-search?q=' + encodeURIComponent(searchState.q) + '&type=' + encodeURIComponent(searchState.searchType || 'both') + '&page=' + page + '&source=' + searchState.source;
+    }
+
+    /** 追加结果卡片，按封面地址去重（本地与在线结果可能重复）；返回实际追加数 */
+    function appendResults(resultsEl, items) {
+        var added = 0;
+        items.forEach(function (item) {
+            if (item.url && searchState.seen[item.url]) return;
+            if (item.url) searchState.seen[item.url] = true;
+            appendResultCard(resultsEl, item);
+            added++;
+        });
+        return added;
+    }
+
+    /** 记录一页结果的分页状态；本地条目库翻完后，后续页改为在线搜索（从第 1 页开始） */
+    function applyPage(json, page) {
+        // 本地无结果时后端已改查上游，返回中不带 source: 'local'
+        if (json.source !== 'local') searchState.source = 'both';
+        searchState.page = page;
+        searchState.hasNextPage = !!json.has_next_page;
+        if (searchState.source === 'local' && !searchState.hasNextPage) {
+            searchState.source = 'both';
+            searchState.page = 0;
+            searchState.hasNextPage = true;
+        }
+    }
+
     async function doSearch() {
         var input = overlay.querySelector('#cover-picker-search-input');
         var resultsEl = overlay.querySelector('#cover-picker-results');
@@ -132,20 +168,21 @@
             return;
         }
         var searchType = searchState.searchType || 'both';
-        searchState = { q: q, page: 1, loading: true, loadingMore: false, hasNextPage: false, searchType: searchType };
+        searchState = { q: q, page: 1, loading: true, loadingMore: false, hasNextPage: false, searchType: searchType, source: 'local', seen: {} };
         resultsEl.innerHTML = '';
         loadingEl.style.display = 'flex';
+        var shown = 0;
         try {
-            var r = await fetch(apiBase() + '/anime-search?q=' + encodeURIComponent(q) + '&type=' + encodeURIComponent(searchType) + '&page=1&source=both');
+            var r = await fetch(searchUrl(1));
             if (!r.ok) throw new Error(r.statusText || '请求失败');
             var json = await r.json();
             var items = json.data || [];
-            searchState.hasNextPage = !!json.has_next_page;
+            applyPage(json, 1);
             searchState.loading = false;
             if (items.length === 0) {
                 resultsEl.innerHTML = '<p class="cover-search-empty">未找到结果，换一个关键词试试</p>';
             } else {
-                items.forEach(function (item) { appendResultCard(resultsEl, item); });
+                shown = appendResults(resultsEl, items);
             }
         } catch (err) {
             searchState.loading = false;
@@ -153,6 +190,8 @@
             if (typeof window.showMessage === 'function') window.showMessage('搜索失败: ' + (err.message || '网络错误'), 'error');
         }
         loadingEl.style.display = 'none';
+        // 本地结果太少（不够滚动触发加载）时，立即补上在线结果
+        if (shown > 0 && shown < LOCAL_MIN_RESULTS && searchState.source === 'both' && searchState.page === 0) await loadMore();
     }
 
     async function loadMore() {
@@ -162,19 +201,19 @@
         searchState.loadingMore = true;
         var loadMoreNode = document.createElement('p');
         loadMoreNode.className = 'cover-picker-load-more';
-        loadMoreNode.textContent = '加载中...';
+        loadMoreNode.textContent = searchState.page === 0 ? '正在在线搜索...' : '加载中...';
         resultsEl.appendChild(loadMoreNode);
+        var q = searchState.q;
         var nextPage = searchState.page + 1;
         try {
-            var searchType = searchState.searchType || 'both';
-            var r = await fetch(apiBase() + '/anime-search?q=' + encodeURIComponent(searchState.q) + '&type=' + encodeURIComponent(searchType) + '&page=' + nextPage + '&source=both');
+            var r = await fetch(searchUrl(nextPage));
             if (!r.ok) throw new Error(r.statusText || '请求失败');
             var json = await r.json();
-            var items = json.data || [];
-            searchState.page = nextPage;
-            searchState.hasNextPage = !!json.has_next_page;
             loadMoreNode.remove();
-            items.forEach(function (item) { appendResultCard(resultsEl, item); });
+            // 等待期间用户已发起新的搜索
+            if (searchState.q !== q) return;
+            applyPage(json, nextPage);
+            appendResults(resultsEl, json.data || []);
         } catch (err) {
             loadMoreNode.remove();
             if (typeof window.showMessage === 'function') window.showMessage('加载更多失败: ' + (err.message || '网络错误'), 'error');
@@ -165,9 +165,15 @@ function createPhotoCard(photo, index) {
     
     // 延迟显示，实现错落有致的入场效果
     card.style.transitionDelay = `${index * 0.05}s`;
+    // 低清占位图先铺满卡片，真实图片懒加载完成后覆盖
+    if (photo.placeholder) {
+        card.style.backgroundImage = `url("${photo.placeholder}")`;
+        card.style.backgroundSize = 'cover';
+        card.style.backgroundPosition = 'center';
+    }
     
     card.innerHTML = `
-        <img src="${photo.image}" loading="lazy" alt="${photo.title}" onerror="this.src='/static/images/placeholder.svg'">
+        <img src="${photo.image_thumb || photo.image}"${photo.image_srcset ? ` srcset="${photo.image_srcset}" sizes="(max-width: 768px) 50vw, 320px"` : ''} loading="lazy" alt="${photo.title}" onerror="this.removeAttribute('srcset');this.src='/static/images/placeholder.svg'">
         <div class="card-overlay">
             <strong>${photo.date}</strong>
             <span>${photo.title}</span>
@@ -7,6 +7,8 @@
     let currentCategoryName = '';
     var wallItems = [];
     var _wallLoading = false;
+    // 条目多于该数量时 1x1 格子改用服务端雪碧图、保存图片改用服务端导出
+    var ATLAS_MIN_ITEMS = 60;
 
     var defaultSettings = {
         bg: 'default',
@@ -391,7 +393,20 @@
         }
     }
 
-    function renderWall(items) {
+    function atlasSprite(atlas, itemId) {
+        var pos = atlas && atlas.tiles ? atlas.tiles[itemId] : null;
+        if (!pos) return '';
+        var sheet = atlas.sheets[pos[0]];
+        var cols = atlas.cols;
+        var rows = Math.round(sheet.height / atlas.tile);
+        var x = cols > 1 ? pos[1] / (cols - 1) * 100 : 0;
+        var y = rows > 1 ? pos[2] / (rows - 1) * 100 : 0;
+        return '<div class="wall-cell-sprite" style="background-image:url(\'' + sheet.url + '\');' +
+            'background-size:' + (cols * 100) + '% ' + (rows * 100) + '%;' +
+            'background-position:' + x + '% ' + y + '%"></div>';
+    }
+
+    function renderWall(items, atlas) {
         wallItems = items || [];
         const grid = document.getElementById('wall-grid');
         const empty = document.getElementById('wall-empty');
@@ -416,14 +431,24 @@
         items.forEach(function (item, index) {
             const cell = document.createElement('div');
             cell.className = 'wall-cell ' + getGridSizeClass(item);
-            const imgUrl = (item.image_webp || item.image) || '/static/images/placeholder.svg';
-            cell.innerHTML =
-                '<img src="' + imgUrl + '" loading="lazy" alt="' + (item.title || '').replace(/"/g, '&quot;') + '" onerror="this.src=\'/static/images/placeholder.svg\'">' +
+            const imgUrl = (item.image_thumb || item.image_webp || item.image) || '/static/images/placeholder.svg';
+            // 按格子实际显示尺寸选择小图档位，避免手机下载原图
+            const sizes = getGridSizeClass(item) === 'wall-cell-size-2' ? '300px' : '150px';
+            const srcset = item.image_srcset ? ' srcset="' + item.image_srcset + '" sizes="' + sizes + '"' : '';
+            const sprite = getGridSizeClass(item) === 'wall-cell-size-1' ? atlasSprite(atlas, item.id) : '';
+            cell.innerHTML = (sprite ||
+                '<img src="' + imgUrl + '"' + srcset + ' loading="lazy" alt="' + (item.title || '').replace(/"/g, '&quot;') + '" onerror="this.removeAttribute(\'srcset\');this.src=\'/static/images/placeholder.svg\'">') +
                 '<div class="wall-cell-overlay"><span class="wall-cell-title">' + (item.title || '').replace(/</g, '&lt;').replace(/>/g, '&gt;') + '</span></div>';
             cell.addEventListener('click', function () {
                 openFullscreen(item);
             });
             cell.style.borderRadius = settings.radius + 'px';
+            if (item.placeholder && !sprite) {
+                // 低清占位图先铺满格子，真实图片懒加载完成后覆盖
+                cell.style.backgroundImage = 'url("' + item.placeholder + '")';
+                cell.style.backgroundSize = 'cover';
+                cell.style.backgroundPosition = 'center';
+            }
             fragment.appendChild(cell);
         });
         grid.appendChild(fragment);
@@ -619,6 +644,17 @@
             if (typeof showMessage === 'function') showMessage('当前没有可导出的内容', 'error');
             return;
         }
+        if (wallItems.length >= ATLAS_MIN_ITEMS && currentCategoryId != null && typeof WallAPI !== 'undefined') {
+            // 大墙由服务端直接生成 JPEG，避免 html2canvas 逐格重绘
+            if (typeof showMessage === 'function') showMessage('正在生成图片…', 'info');
+            var link = document.createElement('a');
+            link.href = WallAPI.exportUrl(currentCategoryId, settings.bg);
+            link.download = 'logfolio-achievement-wall.jpg';
+            document.body.appendChild(link);
+            link.click();
+            document.body.removeChild(link);
+            return;
+        }
         if (typeof showMessage === 'function') showMessage('正在生成图片…', 'info');
         if (btn) { btn.disabled = true; btn.textContent = '生成中…'; }
 
@@ -776,8 +812,17 @@
         ItemsAPI.getAchievementWall(currentCategoryId)
             .then(function (res) {
                 const items = (res && res.items) ? res.items : [];
-                renderWall(items);
-                _wallLoading = false;
+                if (items.length < ATLAS_MIN_ITEMS || currentCategoryId == null || typeof WallAPI === 'undefined') {
+                    renderWall(items);
+                    _wallLoading = false;
+                    return;
+                }
+                return WallAPI.getAtlas(currentCategoryId)
+                    .catch(function () { return null; })
+                    .then(function (atlas) {
+                        renderWall(items, atlas);
+                        _wallLoading = false;
+                    });
             })
             .catch(function (err) {
                 if (typeof showMessage === 'function') showMessage('加载成就墙失败: ' + (err.message || ''), 'error');
@@ -7,10 +7,17 @@
   - 含「序号/标题/日文名/条目ID」：直接用条目ID 拉取封面（更准）。
 
 需先在 Logfolio 建好「动漫」分类。请求会带 X-User-ID，与前端登录用户一致。
+
+加 --catalog 时先查本地 Bangumi 条目库（backend/bangumi_catalog.py 导入的 SQLite 文件），
+中文名、原名或别名与标题归一化后相同的条目直接使用，不再请求 Bangumi API；没有同名条目的标题才在线搜索。
+
+导入前按归一化标题（忽略大小写、全角/半角、标点和空白）批量查询「动漫」分类下已有的记录并跳过，
+重复运行不会重复创建；Excel 内重复的标题也只导入一次。需要强制导入时加 --allow-duplicates。
 """
 import argparse
 import json
 import os
+import sys
 import time
 import urllib.request
 import urllib.parse
@@ -97,6 +104,29 @@ def get_bangumi_cover_url(subject_id: int) -> str | None:
         return None
 
 
+def load_catalog(path: str):
+    """加载本地 Bangumi 条目库模块（backend/bangumi_catalog.py）"""
+    if not os.path.isfile(path):
+        raise SystemExit(f"本地条目库不存在: {path}")
+    os.environ["BANGUMI_CATALOG_PATH"] = os.path.abspath(path)
+    sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "backend"))
+    import bangumi_catalog
+    return bangumi_catalog
+
+
+def urlopen_retry(req, timeout: int, retries: int = 5):
+    """请求 Logfolio API；被限流（429）时按 Retry-After 等待后重试"""
+    for attempt in range(retries + 1):
+        try:
+            return urllib.request.urlopen(req, timeout=timeout)
+        except urllib.error.HTTPError as e:
+            if e.code != 429 or attempt == retries:
+                raise
+            wait = int(e.headers.get("Retry-After") or 1)
+            print(f"  请求过于频繁，{wait}s 后重试")
+            time.sleep(wait)
+
+
 def get_categories(api_base: str, user_id: str, auth: tuple | None) -> list:
     """获取分类列表"""
     url = api_base.rstrip("/") + "/categories/"
@@ -104,11 +134,37 @@ def get_categories(api_base: str, user_id: str, auth: tuple | None) -> list:
     if auth:
         import base64
         req.add_header("Authorization", "Basic " + base64.b64encode(f"{auth[0]}:{auth[1]}".encode()).decode())
-    with urllib.request.urlopen(req, timeout=15) as r:
+    with urlopen_retry(req, timeout=15) as r:
         data = json.loads(r.read().decode())
     return data if isinstance(data, list) else []
 
 
+LOOKUP_BATCH = 500
+
+
+def lookup_keys(api_base: str, user_id: str, auth: tuple | None, category_id: int, titles: list) -> tuple:
+    """批量查询已有同名记录，返回 (每个标题的归一化键, 已存在的键集合)"""
+    url = api_base.rstrip("/") + "/items/lookup"
+    keys, existing = [], set()
+    for start in range(0, len(titles), LOOKUP_BATCH):
+        body = json.dumps({"titles": titles[start:start + LOOKUP_BATCH], "category_id": category_id}).encode("utf-8")
+        req = urllib.request.Request(url, data=body, method="POST", headers={
+            "Content-Type": "application/json",
+            "Accept": "application/json",
+            "X-User-ID": user_id,
+        })
+        if auth:
+            import base64
+            req.add_header("Authorization", "Basic " + base64.b64encode(f"{auth[0]}:{auth[1]}".encode()).decode())
+        with urlopen_retry(req, timeout=30) as r:
+            data = json.loads(r.read().decode())
+        for res in data.get("results") or []:
+            keys.append(res["key"])
+            if res["items"]:
+                existing.add(res["key"])
+    return keys, existing
+
+
 def create_item(api_base: str, user_id: str, auth: tuple | None, category_id: int, title: str, cover_url: str | None) -> dict | None:
     """创建一条历史记录（skip_finish_time=1），带封面"""
     url = api_base.rstrip("/") + "/items/"
@@ -130,7 +186,7 @@ def create_item(api_base: str, user_id: str, auth: tuple | None, category_id: in
         import base64
         req.add_header("Authorization", "Basic " + base64.b64encode(f"{auth[0]}:{auth[1]}".encode()).decode())
     try:
-        with urllib.request.urlopen(req, timeout=30) as r:
+        with urlopen_retry(req, timeout=30) as r:
             return json.loads(r.read().decode())
     except urllib.error.HTTPError as e:
         try:
@@ -152,6 +208,8 @@ def main():
     parser.add_argument("--dry-run", action="store_true", help="只列出将要导入的条目，不请求 API")
     parser.add_argument("--limit", "-n", type=int, default=0, help="最多导入条数，0 表示全部")
     parser.add_argument("--skip-cover", action="store_true", help="不拉取封面，仅创建标题")
+    parser.add_argument("--catalog", help="本地 Bangumi 条目库 SQLite 文件，先查本地、未命中再请求 API")
+    parser.add_argument("--allow-duplicates", action="store_true", help="不检查已有同名记录，全部导入")
     args = parser.parse_args()
 
     excel_path = os.path.abspath(args.excel)
@@ -167,6 +225,7 @@ def main():
     print(f"共 {len(rows)} 条待导入（Excel: {excel_path}）")
 
     auth = (args.user, args.password) if args.user and args.password else None
+    catalog = load_catalog(args.catalog) if args.catalog else None
     api_base = args.api.rstrip("/")
     if not api_base.endswith("/api"):
         api_base = api_base + "/api"
@@ -179,15 +238,34 @@ def main():
     category_id = anime_cat["id"]
     print(f"使用分类: 动漫 (id={category_id})")
 
+    if args.allow_duplicates:
+        keys, seen = [None] * len(rows), set()
+    else:
+        keys, seen = lookup_keys(api_base, args.user_id, auth, category_id, [t for t, _ in rows])
+        print(f"已有同名记录 {sum(1 for k in keys if k in seen)} 条，将跳过")
+
     if args.dry_run:
         for i, (title, sid) in enumerate(rows, 1):
-            print(f"  {i}. {title} (subject_id={sid})")
+            print(f"  {i}. {title} (subject_id={sid})" + (" (已存在，跳过)" if keys[i - 1] in seen else ""))
         return
 
-    ok, fail = 0, 0
+    ok, fail, skipped = 0, 0, 0
     for i, (title, sid) in enumerate(rows, 1):
+        key = keys[i - 1]
+        if key in seen:
+            skipped += 1
+            print(f"[{i}/{len(rows)}] 已存在，跳过: {title[:36]}{'…' if len(title) > 36 else ''}")
+            continue
         cover_url = None
-        if not args.skip_cover:
+        if not args.skip_cover and catalog:
+            if sid:
+                cover_url = catalog.COVER_URL.format(id=sid)
+            else:
+                # 只接受同名条目：检索排第一的不一定是同一部作品，未找到同名时走在线搜索
+                hit = catalog.match(title, types=(2,))
+                if hit:
+                    cover_url = hit["url"]
+        if not args.skip_cover and not cover_url:
             if sid:
                 cover_url = get_bangumi_cover_url(sid)
                 time.sleep(0.2)
@@ -200,12 +278,14 @@ def main():
         try:
             create_item(api_base, args.user_id, auth, category_id, title, cover_url)
             ok += 1
+            if key:
+                seen.add(key)
             print(f"[{i}/{len(rows)}] 已创建: {title[:36]}{'…' if len(title) > 36 else ''}" + (" (含封面)" if cover_url else ""))
         except Exception as e:
             fail += 1
             print(f"[{i}/{len(rows)}] 失败: {title[:36]} — {e}")
         time.sleep(0.3)
-    print(f"\n完成: 成功 {ok}, 失败 {fail}")
+    print(f"\n完成: 成功 {ok}, 跳过 {skipped}, 失败 {fail}")
 
 
 if __name__ == "__main__":